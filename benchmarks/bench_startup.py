@@ -0,0 +1,72 @@
+"""
+Cold-start benchmark: time a fresh interpreter importing tvx.main and
+resolving one plugin, for every registered command.
+
+    python benchmarks/bench_startup.py [--runs 10] [--threshold-ms 100]
+
+Exits non-zero if the median cold start of any command exceeds the
+threshold.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SNIPPET = (
+    "import sys; sys.path.insert(0, {root!r}); "
+    "import tvx.main; "
+    "from tvx.plugin_loader import get_plugin; "
+    "get_plugin({command!r})"
+)
+
+
+def _time_cmd(args, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(args, check=True, stdout=subprocess.DEVNULL)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def run(runs=10):
+    sys.path.insert(0, ROOT)
+    from tvx.plugin_loader import get_manifest
+
+    # Warm the manifest cache; cold start assumes it exists
+    commands = sorted(get_manifest(refresh=True)["plugins"])
+
+    results = {
+        "python_ms": round(_time_cmd([sys.executable, "-c", "pass"], runs), 1),
+        "commands": {},
+    }
+
+    for command in commands:
+        code = SNIPPET.format(root=ROOT, command=command)
+        results["commands"][command] = round(_time_cmd([sys.executable, "-c", code], runs), 1)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="tvx cold-start benchmark")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--threshold-ms", type=float, default=100.0)
+    args = parser.parse_args()
+
+    results = run(args.runs)
+    print(json.dumps(results, indent=2))
+
+    slow = {c: ms for c, ms in results["commands"].items() if ms > args.threshold_ms}
+    if slow:
+        print(f"[!] Cold start over {args.threshold_ms} ms: {slow}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
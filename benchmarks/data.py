@@ -0,0 +1,58 @@
+"""
+Synthetic data generators for the benchmark suite. All generators are
+seeded so runs are reproducible.
+"""
+import random
+
+from tvx.scoring import SIGNALS
+
+
+def emails(n, domains=2000, seed=1):
+    """
+    n email addresses over a skewed domain distribution: most addresses
+    share a small set of popular domains, like real signup traffic.
+    """
+    rng = random.Random(seed)
+    pool = [f"domain{i}.example" for i in range(domains)]
+    weights = [1.0 / (i + 1) for i in range(domains)]
+
+    for i, domain in enumerate(rng.choices(pool, weights, k=n)):
+        yield f"user{i}@{domain}"
+
+
+def ips(n, networks=500, seed=2):
+    """
+    n IPv4 addresses clustered in a limited number of /24 networks.
+    """
+    rng = random.Random(seed)
+    nets = [(rng.randrange(1, 223), rng.randrange(256), rng.randrange(256)) for _ in range(networks)]
+
+    for _ in range(n):
+        a, b, c = rng.choice(nets)
+        yield f"{a}.{b}.{c}.{rng.randrange(1, 255)}"
+
+
+def scan_result(target, rng):
+    result = {
+        "target": target,
+        "metadata": {"mx_records": ["mx1.mail.example.", "mx2.mail.example."], "provider": "Unknown"},
+        "risk": {"score": rng.choice([0, 30, 40, 70]), "level": "low"},
+        "sources": ["DNS"],
+        "notes": [],
+    }
+    for key, _, _ in SIGNALS:
+        if rng.random() < 0.1:
+            result[key] = True
+    return result
+
+
+def evidence(n, seed=3):
+    """
+    n (plugin, target, result, risk) tuples ready for add_evidence_many().
+    """
+    from tvx.scoring import calculate_risk
+
+    rng = random.Random(seed)
+    for target in emails(n, seed=seed):
+        result = scan_result(target, rng)
+        yield ("email", target, result, calculate_risk(result))
@@ -0,0 +1,434 @@
+"""
+tvx benchmark suite.
+
+    python -m benchmarks.run [--quick] [--only storage,scoring]
+                             [--sizes 10000,100000,1000000]
+                             [--out results.json]
+                             [--compare baseline.json] [--threshold 0.2]
+
+Every benchmark runs in a throwaway HOME, so caches, config and the case
+database never touch the user's files. DNS and RDAP are served by the
+local stand-ins in benchmarks.stubs.
+
+Metrics ending in _per_sec are higher-is-better; all others (times,
+sizes, query counts) are lower-is-better. With --compare, any metric that
+moved the wrong way by more than --threshold (fraction) is reported as a
+regression and the exit status is 1.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+
+def _timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    value = fn(*args, **kwargs)
+    return time.perf_counter() - started, value
+
+
+def _best(fn, repeat=5):
+    # Best of several runs for timings small enough to be noisy
+    return min(_timed(fn)[0] for _ in range(repeat))
+
+
+# =====================================
+# Benchmarks
+# =====================================
+@benchmark("startup")
+def bench_startup(ctx):
+    from benchmarks import bench_startup as startup
+
+    results = startup.run(runs=3 if ctx.quick else 10)
+    metrics = {"startup.python_ms": results["python_ms"]}
+    for command, ms in results["commands"].items():
+        metrics[f"startup.{command}_ms"] = ms
+    return metrics
+
+
+@benchmark("scoring")
+def bench_scoring(ctx):
+    import random
+
+    from benchmarks.data import scan_result
+    from tvx.scoring import calculate_risk
+
+    rng = random.Random(7)
+    n = 20000 if ctx.quick else 200000
+    results = [scan_result(f"u{i}@x.example", rng) for i in range(n)]
+
+    elapsed = _best(lambda: [calculate_risk(r) for r in results], repeat=3)
+    metrics = {"scoring.per_call_us": round(elapsed / n * 1e6, 3)}
+
+    # Nested paths and every operator, as a configured rule set would use
+    from tvx.scoring import DEFAULT_RULES, PLUGIN_RISK, Ruleset
+
+    ruleset = Ruleset({
+        "rules": DEFAULT_RULES["rules"] + [
+            PLUGIN_RISK,
+            {"name": "plugin_high", "path": "risk.score", "op": "gte", "value": 70, "weight": 10},
+            {"name": "provider", "path": "metadata.provider", "op": "in", "value": ["Gmail", "Outlook"], "weight": -10},
+        ],
+        "max_score": 100,
+    })
+    elapsed = _best(lambda: [ruleset.evaluate(r) for r in results], repeat=3)
+    metrics["scoring.rules_per_call_us"] = round(elapsed / n * 1e6, 3)
+
+    try:
+        import numpy as np
+        from tvx.rescore import score_matrix
+        from tvx.scoring import SIGNALS
+    except ImportError:
+        return metrics
+
+    signals = np.array([[bool(r.get(k)) for k, _, _ in SIGNALS] for r in results])
+    elapsed = _best(lambda: score_matrix(signals), repeat=3)
+    metrics["scoring.batch_per_row_us"] = round(elapsed / n * 1e6, 4)
+    return metrics
+
+
+@benchmark("email_osint")
+def bench_email(ctx):
+    from benchmarks.data import emails
+    from benchmarks.stubs import StubDNSServer
+    from tvx.config import set_key
+
+    server = StubDNSServer(latency=0.005).start()
+    set_key("dns_nameservers", "127.0.0.1")
+    set_key("dns_port", server.port)
+
+    from tvx.cache import get_cache
+    from tvx.plugins.email_osint import Plugin
+
+    plugin = Plugin()
+    n = 5000 if ctx.quick else 50000
+    # Plugin.run_many takes argv lists, as run() does
+    batch = [[e] for e in emails(n)]
+    get_cache().purge("mx")
+
+    cold, _ = _timed(plugin.run_many, batch)
+    cold_queries = server.queries
+    warm, _ = _timed(plugin.run_many, batch)
+
+    get_cache().purge("mx")
+    single = batch[:2000]
+    with ThreadPoolExecutor(16) as pool:
+        threaded, _ = _timed(lambda: list(pool.map(plugin.run, single)))
+
+    server.stop()
+
+    return {
+        "email_osint.batch_cold_per_sec": round(n / cold, 1),
+        "email_osint.batch_warm_per_sec": round(n / warm, 1),
+        "email_osint.dns_queries": cold_queries,
+        "email_osint.threaded_per_sec": round(len(single) / threaded, 1),
+    }
+
+
+@benchmark("ip_osint")
+def bench_ip(ctx):
+    from benchmarks.data import ips
+    from benchmarks.stubs import StubRDAP
+    from tvx.cache import get_cache
+    from tvx.netcache import get_network_cache
+    from tvx.config import set_key
+    from tvx.plugins import ip_osint
+
+    stub = StubRDAP(latency=0.02)
+    ip_osint.rdap_query = stub
+    # The stub has no quota: measure the plugin, not the rdap limiter
+    set_key("rdap_rate", 0)
+
+    plugin = ip_osint.Plugin()
+    n = 2000 if ctx.quick else 20000
+    targets = list(ips(n, networks=100))
+
+    get_cache().purge("rdap")
+    get_network_cache().purge()
+
+    with ThreadPoolExecutor(16) as pool:
+        cold, _ = _timed(lambda: list(pool.map(lambda ip: plugin.run([ip]), targets)))
+    cold_queries = stub.queries
+    warm, _ = _timed(lambda: [plugin.run([ip]) for ip in targets])
+
+    return {
+        "ip_osint.cold_per_sec": round(n / cold, 1),
+        "ip_osint.warm_per_sec": round(n / warm, 1),
+        "ip_osint.rdap_queries": cold_queries,
+    }
+
+
+@benchmark("ratelimit")
+def bench_ratelimit(ctx):
+    from benchmarks.stubs import StubRateLimitedAPI
+    from tvx.config import set_key
+
+    # Upstream allows 50/s; the limiter is set just under it
+    server = StubRateLimitedAPI(rate=50, burst=10).start()
+    set_key("ipapi_url", server.url)
+    set_key("ipapi_rate", 45)
+    set_key("ipapi_burst", 10)
+    set_key("ipapi_concurrency", 8)
+    set_key("ipapi_backoff", 0.1)
+
+    from tvx.ip import query_ipapi
+    from tvx.ratelimit import BULK, get_limiter, priority
+
+    limiter = get_limiter("ipapi")
+    n = 100 if ctx.quick else 400
+
+    def bulk(i):
+        with priority(BULK):
+            return limiter.call(query_ipapi, f"10.0.{i // 256}.{i % 256}")
+
+    latencies = []
+
+    def interactive():
+        # One interactive lookup every 100ms while the bulk job runs
+        while not done.is_set():
+            started = time.perf_counter()
+            limiter.call(query_ipapi, "192.0.2.1")
+            latencies.append(time.perf_counter() - started)
+            time.sleep(0.1)
+
+    done = threading.Event()
+    watcher = threading.Thread(target=interactive, daemon=True)
+    watcher.start()
+
+    with ThreadPoolExecutor(16) as pool:
+        elapsed, _ = _timed(lambda: list(pool.map(bulk, range(n))))
+
+    done.set()
+    watcher.join()
+    server.stop()
+
+    latencies.sort()
+    stats = limiter.stats()
+    return {
+        "ratelimit.bulk_per_sec": round(n / elapsed, 1),
+        "ratelimit.upstream_429s": server.rejected,
+        "ratelimit.throttled": stats["throttled"],
+        "ratelimit.interactive_p50_sec": round(latencies[len(latencies) // 2], 4),
+        "ratelimit.interactive_max_sec": round(latencies[-1], 4),
+    }
+
+
+@benchmark("storage")
+def bench_storage(ctx):
+    from benchmarks.data import evidence
+    from tvx.storage.manager import Storage
+
+    metrics = {}
+
+    for size in ctx.sizes:
+        path = os.path.join(ctx.home, f"bench_{size}.db")
+        storage = Storage(path)
+        storage.create_case("bench")
+
+        elapsed, _ = _timed(storage.add_evidence_many, "bench", evidence(size))
+        metrics[f"storage.{size}.add_many_per_sec"] = round(size / elapsed, 1)
+
+        singles = min(size, 2000)
+        rows = list(evidence(singles, seed=9))
+        elapsed, _ = _timed(lambda: [storage.add_evidence("single", *r) for r in rows])
+        metrics[f"storage.{size}.add_single_per_sec"] = round(singles / elapsed, 1)
+
+        elapsed, case = _timed(storage.get_case, "bench")
+        metrics[f"storage.{size}.get_case_sec"] = round(elapsed, 3)
+        middle = case["evidence"][len(case["evidence"]) // 2]["id"]
+        del case
+
+        elapsed = _best(lambda: list(storage.iter_evidence("bench", after_id=middle, limit=100)))
+        metrics[f"storage.{size}.page_ms"] = round(elapsed * 1000, 3)
+
+        if size == min(ctx.sizes):
+            elapsed, stats = _timed(storage.compact)
+            metrics[f"storage.{size}.compact_sec"] = round(elapsed, 3)
+            metrics[f"storage.{size}.compressed_bytes"] = stats["bytes_after"]
+            elapsed, _ = _timed(storage.get_case, "bench")
+            metrics[f"storage.{size}.get_case_compressed_sec"] = round(elapsed, 3)
+
+        storage.close()
+        os.remove(path)
+
+    return metrics
+
+
+@benchmark("segment")
+def bench_segment(ctx):
+    from benchmarks.data import evidence
+    from tvx.storage.manager import Storage
+    from tvx.storage.segment import SegmentStorage
+
+    n = 20000 if ctx.quick else 200000
+    rows = list(evidence(n))
+    writers = 8
+
+    def ingest(storage):
+        # Many writers committing small batches, as serve does under load
+        def write(part):
+            for i in range(0, len(part), 50):
+                storage.add_evidence_many("bench", part[i:i + 50])
+
+        with ThreadPoolExecutor(writers) as pool:
+            return _timed(lambda: list(pool.map(write, [rows[k::writers] for k in range(writers)])))[0]
+
+    metrics = {}
+
+    path = os.path.join(ctx.home, "bench_sqlite.db")
+    storage = Storage(path)
+    metrics["segment.sqlite_ingest_per_sec"] = round(n / ingest(storage), 1)
+    storage.close()
+
+    path = os.path.join(ctx.home, "bench_segment.db")
+    storage = SegmentStorage(Storage(path))
+    metrics["segment.ingest_per_sec"] = round(n / ingest(storage), 1)
+
+    elapsed, _ = _timed(lambda: sum(1 for _ in storage.iter_evidence("bench")))
+    metrics["segment.merged_read_sec"] = round(elapsed, 3)
+
+    elapsed, _ = _timed(storage.flush)
+    metrics["segment.compact_per_sec"] = round(n / elapsed, 1)
+    storage.close()
+
+    return metrics
+
+
+@benchmark("reporting")
+def bench_reporting(ctx):
+    import random
+
+    from benchmarks.data import evidence, scan_result
+    from tvx.reporting import generate_case_html, generate_html
+    from tvx.scoring import calculate_risk
+    from tvx.storage.manager import Storage
+
+    result = scan_result("user@domain.example", random.Random(1))
+    path = os.path.join(ctx.home, "scan.html")
+    elapsed = _best(lambda: generate_html({"scan": result}, calculate_risk(result), path))
+
+    metrics = {
+        "reporting.scan_ms": round(elapsed * 1000, 3),
+        "reporting.scan_bytes": os.path.getsize(path),
+    }
+
+    size = min(ctx.sizes)
+    storage = Storage(os.path.join(ctx.home, "report.db"))
+    storage.create_case("report")
+    storage.add_evidence_many("report", evidence(size))
+
+    path = os.path.join(ctx.home, "case.html")
+    elapsed, _ = _timed(generate_case_html, storage, "report", path)
+    metrics[f"reporting.case_{size}_sec"] = round(elapsed, 3)
+    metrics[f"reporting.case_{size}_bytes"] = os.path.getsize(path)
+
+    storage.close()
+    return metrics
+
+
+# =====================================
+# Comparison
+# =====================================
+def compare(current, baseline, threshold):
+    """
+    (metric, baseline, current, change) for every metric that regressed
+    by more than threshold.
+    """
+    regressions = []
+
+    for name, value in current.items():
+        old = baseline.get(name)
+        if not old or not isinstance(value, (int, float)):
+            continue
+
+        change = (value - old) / old
+        worse = -change if name.endswith("_per_sec") else change
+        if worse > threshold:
+            regressions.append((name, old, value, round(change, 3)))
+
+    return regressions
+
+
+class Context:
+
+    def __init__(self, home, sizes, quick):
+        self.home = home
+        self.sizes = sizes
+        self.quick = quick
+
+
+def main():
+    parser = argparse.ArgumentParser(description="tvx benchmark suite")
+    parser.add_argument("--quick", action="store_true", help="Small sizes for a fast run")
+    parser.add_argument("--only", help="Comma-separated benchmarks: " + ", ".join(BENCHMARKS))
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Storage row counts")
+    parser.add_argument("--out", help="Write results JSON here")
+    parser.add_argument("--compare", help="Baseline results JSON")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed regression fraction")
+    args = parser.parse_args()
+
+    # Isolate before any tvx module computes its ~/ paths
+    home = tempfile.mkdtemp(prefix="tvx-bench-")
+    os.environ["HOME"] = home
+
+    sizes = [10000] if args.quick else [int(s) for s in args.sizes.split(",")]
+    selected = args.only.split(",") if args.only else list(BENCHMARKS)
+    ctx = Context(home, sizes, args.quick)
+
+    metrics = {}
+    errors = {}
+
+    try:
+        for name in selected:
+            print(f"[*] {name}", file=sys.stderr)
+            try:
+                metrics.update(BENCHMARKS[name](ctx))
+            except Exception as e:
+                errors[name] = f"{type(e).__name__}: {e}"
+                print(f"[!] {name} failed: {errors[name]}", file=sys.stderr)
+    finally:
+        shutil.rmtree(home, ignore_errors=True)
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "sizes": sizes,
+        "metrics": metrics,
+        "errors": errors,
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["metrics"]
+
+        regressions = compare(metrics, baseline, args.threshold)
+        for name, old, new, change in regressions:
+            print(f"[!] Regression {name}: {old} -> {new} ({change:+.1%})", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
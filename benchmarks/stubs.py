@@ -0,0 +1,165 @@
+"""
+Local stand-ins for the network services tvx talks to: a UDP DNS server
+answering MX/A queries, an RDAP replacement for ip_osint.rdap_query and a
+rate-limited HTTP API shaped like ip-api.com.
+"""
+import ipaddress
+import socket
+import threading
+import time
+
+
+class StubDNSServer:
+    """
+    Minimal UDP DNS server on 127.0.0.1. Every name gets one MX and one A
+    answer after `latency` seconds; names starting with "nx" get NXDOMAIN.
+    """
+
+    def __init__(self, latency=0.005, port=0):
+        import dns.message  # noqa: F401 (fail early without dnspython)
+
+        self.latency = latency
+        self.queries = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", port))
+        self.port = self.sock.getsockname()[1]
+        self._lock = threading.Lock()
+        self._running = True
+
+    def _answer(self, data, addr):
+        import dns.message
+        import dns.rrset
+
+        query = dns.message.from_wire(data)
+        with self._lock:
+            self.queries += 1
+
+        time.sleep(self.latency)
+
+        response = dns.message.make_response(query)
+        question = query.question[0]
+        name = question.name.to_text()
+
+        if name.startswith("nx"):
+            response.set_rcode(3)
+        elif question.rdtype == 15:
+            response.answer.append(dns.rrset.from_text(question.name, 300, "IN", "MX", f"10 mx.{name}"))
+        else:
+            response.answer.append(dns.rrset.from_text(question.name, 300, "IN", "A", "192.0.2.1"))
+
+        self.sock.sendto(response.to_wire(), addr)
+
+    def _serve(self):
+        while self._running:
+            try:
+                data, addr = self.sock.recvfrom(4096)
+            except OSError:
+                return
+            threading.Thread(target=self._answer, args=(data, addr), daemon=True).start()
+
+    def start(self):
+        threading.Thread(target=self._serve, name="stub-dns", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._running = False
+        self.sock.close()
+
+
+class StubRDAP:
+    """
+    Callable stand-in for ip_osint.rdap_query: answers every IP with its
+    /24 network after `latency` seconds.
+    """
+
+    def __init__(self, latency=0.05):
+        self.latency = latency
+        self.queries = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, ip):
+        with self._lock:
+            self.queries += 1
+        time.sleep(self.latency)
+
+        net = ipaddress.ip_network(f"{ip}/24", strict=False)
+        return {
+            "asn": str(64512 + int(net.network_address) % 1000),
+            "asn_cidr": str(net),
+            "asn_country_code": "ZZ",
+            "asn_description": "STUB-AS",
+            "network": {
+                "name": f"STUB-HOSTING-{net.network_address}",
+                "cidr": str(net),
+                "start_address": str(net.network_address),
+                "end_address": str(net.broadcast_address),
+            },
+        }
+
+
+class StubRateLimitedAPI:
+    """
+    ip-api.com stand-in on 127.0.0.1 that allows `rate` requests per second
+    (burst `burst`) and answers anything beyond that with HTTP 429 and a
+    Retry-After header. Point the ipapi_url config key at `url`.
+    """
+
+    def __init__(self, rate=50.0, burst=10, latency=0.002):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        self.rate = rate
+        self.burst = burst
+        self.latency = latency
+        self.requests = 0
+        self.rejected = 0
+        self._tokens = float(burst)
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                allowed = stub._take()
+                time.sleep(stub.latency)
+
+                if not allowed:
+                    body = b'{"status": "fail", "message": "rate limited"}'
+                    self.send_response(429)
+                    self.send_header("Retry-After", "1")
+                else:
+                    ip = self.path.rsplit("/", 1)[-1]
+                    body = ('{"status": "success", "query": "%s", "isp": "STUB"}' % ip).encode()
+                    self.send_response(200)
+
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}/json/{{ip}}"
+
+    def _take(self):
+        with self._lock:
+            self.requests += 1
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            if self._tokens < 1:
+                self.rejected += 1
+                return False
+            self._tokens -= 1
+            return True
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="stub-http", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
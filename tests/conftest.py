@@ -0,0 +1,6 @@
+import os
+import tempfile
+
+# tvx resolves ~/.tracevector_* paths at import time: give the whole run
+# a scratch home before any test imports it
+os.environ["HOME"] = tempfile.mkdtemp(prefix="tvx-tests-")
@@ -0,0 +1,28 @@
+from tvx.cache import LookupCache
+
+
+def test_hits_touch_accessed_at_at_flush(tmp_path):
+    cache = LookupCache(str(tmp_path / "cache.db"))
+    cache.put_many("mx", {"a.com": ["mx.a.com"], "b.com": ["mx.b.com"]})
+    writes = cache.conn.total_changes
+
+    assert set(cache.get_many("mx", ["a.com", "b.com", "c.com"])) == {"a.com", "b.com"}
+    assert cache.conn.total_changes == writes
+
+    before = dict(cache.conn.execute("SELECT key, accessed_at FROM lookups"))
+    cache.flush_counters()
+    after = dict(cache.conn.execute("SELECT key, accessed_at FROM lookups"))
+    assert all(after[key] > before[key] for key in before)
+    assert cache.stats()["sources"]["mx"]["hits"] == 2
+
+
+def test_eviction_sees_unflushed_hits(tmp_path):
+    cache = LookupCache(str(tmp_path / "cache.db"), max_entries=1000)
+    cache.put_many("mx", {f"d{i}.com": [] for i in range(600)})
+    cache.get("mx", "d0.com")
+
+    # The second write crosses 1000 writes and evicts the oldest 200
+    cache.put_many("mx", {f"e{i}.com": [] for i in range(600)})
+
+    assert cache.get("mx", "d0.com") is not None
+    assert cache.get("mx", "d1.com") is None
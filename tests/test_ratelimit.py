@@ -0,0 +1,126 @@
+import threading
+import time
+
+import pytest
+
+from benchmarks.stubs import StubRateLimitedAPI
+from tvx import ratelimit
+from tvx.config import set_key
+from tvx.ip import query_ipapi
+from tvx.ratelimit import BULK, INTERACTIVE, Limiter, Throttled, priority
+
+
+@pytest.fixture
+def api():
+    """
+    Stub ip-api that answers one request, then 429 with Retry-After: 1
+    until a token comes back (rate is set per test).
+    """
+    stubs = []
+
+    def make(rate):
+        stub = StubRateLimitedAPI(rate=rate, burst=1, latency=0).start()
+        set_key("ipapi_url", stub.url)
+        stubs.append(stub)
+        return stub
+
+    yield make
+    for stub in stubs:
+        stub.stop()
+
+
+def _wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting"
+        time.sleep(0.005)
+
+
+def test_retry_waits_for_retry_after(api):
+    stub = api(rate=1.0)
+    limiter = Limiter("test", retries=2, backoff=0.01)
+
+    assert limiter.call(query_ipapi, "192.0.2.1")["status"] == "success"
+
+    started = time.monotonic()
+    data = limiter.call(query_ipapi, "192.0.2.2")
+    elapsed = time.monotonic() - started
+
+    # The 429 said Retry-After: 1, far above the 0.01s backoff
+    assert data["query"] == "192.0.2.2"
+    assert elapsed >= 1.0
+    assert stub.rejected == 1
+    stats = limiter.stats()
+    assert (stats["rate_limited"], stats["retries"], stats["ok"]) == (1, 1, 2)
+
+
+def test_backoff_delay_honors_retry_after():
+    limiter = Limiter("test", backoff=0.01)
+
+    assert all(limiter.backoff_delay(attempt, retry_after="3") >= 3.0 for attempt in range(5))
+    assert all(limiter.backoff_delay(attempt) <= 0.01 * 2 ** attempt for attempt in range(5))
+
+
+def test_throttled_after_retries_and_not_cached(api, monkeypatch):
+    from tvx.cache import get_cache
+    from tvx.plugins import ip_osint
+
+    api(rate=0.001)
+    query_ipapi("192.0.2.9")  # spends the stub's only token
+
+    # RDAP stand-in that goes through the rate-limited stub
+    monkeypatch.setattr(ip_osint, "rdap_query", query_ipapi)
+    limiter = Limiter("rdap", retries=1, backoff=0.01)
+    monkeypatch.setitem(ratelimit._limiters, "rdap", limiter)
+
+    with pytest.raises(Throttled):
+        ip_osint.lookup_rdap("198.51.100.7")
+
+    stats = limiter.stats()
+    assert (stats["calls"], stats["rate_limited"], stats["throttled"]) == (2, 2, 1)
+    assert get_cache().get("rdap", "198.51.100.7") is None
+
+
+def test_interactive_waiters_go_before_bulk():
+    limiter = Limiter("test", concurrency=1)
+    limiter.acquire()
+    order = []
+
+    def waiter(level, name):
+        with priority(level):
+            limiter.acquire()
+        order.append(name)
+        limiter.release()
+
+    bulk = threading.Thread(target=waiter, args=(BULK, "bulk"))
+    bulk.start()
+    _wait_for(lambda: limiter.stats()["waiting"] == 1)
+    interactive = threading.Thread(target=waiter, args=(INTERACTIVE, "interactive"))
+    interactive.start()
+    _wait_for(lambda: limiter.stats()["waiting"] == 2)
+
+    limiter.release()
+    bulk.join()
+    interactive.join()
+
+    assert order == ["interactive", "bulk"]
+
+
+def test_penalize_holds_back_other_callers():
+    limiter = Limiter("test", rate=100, burst=5)
+    limiter.penalize(0.5)
+    waited = []
+
+    def caller():
+        started = time.monotonic()
+        limiter.acquire()
+        waited.append(time.monotonic() - started)
+        limiter.release()
+
+    threads = [threading.Thread(target=caller) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert min(waited) >= 0.45
@@ -0,0 +1,98 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from benchmarks.stubs import StubDNSServer
+from tvx.ratelimit import Throttled
+from tvx.resolver import DNSEngine
+
+
+@pytest.fixture
+def stub():
+    server = StubDNSServer(latency=0.2).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def engines():
+    made = []
+
+    def make(port, **kwargs):
+        engine = DNSEngine(nameservers=["127.0.0.1"], port=port, **kwargs)
+        made.append(engine)
+        return engine
+
+    yield make
+    for engine in made:
+        engine.close()
+
+
+def test_batch_queries_each_name_once(stub, engines):
+    engine = engines(stub.port)
+
+    answers = engine.resolve_many(["a.example", "A.Example.", "a.example", "b.example"])
+
+    assert answers == {"a.example": ["mx.a.example."], "b.example": ["mx.b.example."]}
+    assert stub.queries == 2
+
+
+def test_concurrent_callers_share_one_query(stub, engines):
+    engine = engines(stub.port)
+    results = []
+
+    threads = [
+        threading.Thread(target=lambda: results.append(engine.resolve("shared.example")))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [["mx.shared.example."]] * 8
+    assert stub.queries == 1
+    assert engine.stats["coalesced"] == 7
+
+
+def test_concurrency_cap_limits_queries_in_flight(stub, engines):
+    names = [f"n{i}.example" for i in range(6)]
+
+    started = time.perf_counter()
+    engines(stub.port, concurrency=6).resolve_many(names)
+    uncapped = time.perf_counter() - started
+
+    started = time.perf_counter()
+    engines(stub.port, concurrency=2).resolve_many([f"c{i}.example" for i in range(6)])
+    capped = time.perf_counter() - started
+
+    # 6 queries of 0.2s: one wave without the cap, three with it
+    assert uncapped < 0.4
+    assert capped >= 0.55
+
+
+def test_nxdomain_comes_back_as_exception(stub, engines):
+    answers = engines(stub.port).resolve_many(["nxdomain.example", "ok.example"])
+
+    assert isinstance(answers["nxdomain.example"], Exception)
+    assert answers["ok.example"] == ["mx.ok.example."]
+
+
+def test_timeout_raises_throttled():
+    # Bound but never read: every query times out
+    silent = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    silent.bind(("127.0.0.1", 0))
+    engine = DNSEngine(nameservers=["127.0.0.1"], port=silent.getsockname()[1], timeout=0.2)
+
+    try:
+        started = time.perf_counter()
+        with pytest.raises(Throttled):
+            engine.resolve("slow.example")
+        assert time.perf_counter() - started < 2.0
+
+        assert isinstance(engine.resolve_many(["slow2.example"])["slow2.example"], Throttled)
+    finally:
+        engine.close()
+        silent.close()
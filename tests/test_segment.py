@@ -0,0 +1,59 @@
+import pytest
+
+from tvx.storage.manager import Storage
+from tvx.storage.segment import SegmentStorage
+
+RISK = {"score": 0, "level": "LOW", "flags": []}
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = SegmentStorage(Storage(str(tmp_path / "cases.db")))
+    storage.create_case("c1")
+    yield storage
+    storage.close()
+
+
+def _add(storage, n, start=0):
+    items = [("ip", f"10.0.0.{i}", {"i": i}, RISK) for i in range(start, start + n)]
+    storage.add_evidence_many("c1", items)
+
+
+def test_pages_cover_stored_and_pending_rows_once(storage):
+    _add(storage, 8)
+    storage.flush()
+    _add(storage, 5, start=8)
+
+    seen, after = [], None
+    while True:
+        page = list(storage.iter_evidence("c1", after_id=after, limit=10))
+        assert all(row["id"] is not None for row in page)
+        seen += [row["target"] for row in page]
+        if len(page) < 10:
+            break
+        after = page[-1]["id"]
+
+    assert seen == [f"10.0.0.{i}" for i in range(13)]
+
+
+def test_unpaged_reads_include_pending_rows(storage):
+    _add(storage, 3)
+    storage.flush()
+    _add(storage, 2, start=3)
+
+    rows = list(storage.iter_evidence("c1"))
+    assert [row["id"] is None for row in rows] == [False] * 3 + [True] * 2
+    assert len(list(storage.query_evidence(case_id="c1"))) == 5
+
+
+def test_recovery_leaves_live_segments_alone(storage, tmp_path):
+    _add(storage, 1)
+    stale = tmp_path / "cases.db.segments" / "seg-00000000000000000001-1.opening"
+    stale.touch()
+
+    other = SegmentStorage(Storage(str(tmp_path / "cases.db")))
+    try:
+        names = sorted(p.name for p in stale.parent.iterdir() if p.name.startswith("seg-"))
+        assert names == [storage._name + ".active"]
+    finally:
+        other.close()
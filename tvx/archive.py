@@ -0,0 +1,184 @@
+import gzip
+import json
+import os
+import time
+from array import array
+from bisect import bisect_left
+from collections import deque
+from datetime import datetime
+from itertools import islice
+
+from tvx.entities import extract_entities
+from tvx.profiling import span
+from tvx.storage.manager import _risk_values
+
+FORMAT_VERSION = 1
+
+# gzip level for exports: 1 keeps compression ahead of the disk
+EXPORT_LEVEL = 1
+
+# Lines per parse task on import, and rows per import transaction
+CHUNK_LINES = 5000
+COMMIT_ROWS = 100000
+
+
+def _open(path, mode, compressed):
+    if compressed:
+        return gzip.open(path, mode, compresslevel=EXPORT_LEVEL) if "w" in mode else gzip.open(path, mode)
+    return open(path, mode)
+
+
+# =====================================
+# Export
+# =====================================
+def export_case(storage, case_id, path, chunk_size=5000):
+    """
+    Write a case to path as NDJSON (gzip if path ends in .gz): a header
+    line with the case, then one line per evidence row, streamed off one
+    cursor (see Storage.export_lines). Returns the number of evidence
+    rows written.
+    """
+    case = storage.get_case_info(case_id)
+    count = 0
+    tmp = path + ".tmp"
+
+    with _open(tmp, "wb", path.endswith(".gz")) as f:
+        header = {
+            "tvx_export": FORMAT_VERSION,
+            "case": case,
+            "exported_at": datetime.utcnow().isoformat(),
+        }
+        f.write((json.dumps(header) + "\n").encode())
+
+        for lines in storage.export_lines(case_id, chunk_size=chunk_size):
+            # One compressor call per chunk, not per line
+            with span("export.write"):
+                f.write("".join(lines).encode())
+            count += len(lines)
+
+    os.replace(tmp, path)
+    return count
+
+
+# =====================================
+# Import
+# =====================================
+def prepare_rows(lines):
+    """
+    Parse export lines into rows for Storage.import_evidence (risk
+    columns and entities included). Runs in pool workers.
+    """
+    rows = []
+
+    for line in lines:
+        record = json.loads(line)
+        plugin, target = record["plugin"], record["target"]
+        result = record.get("result")
+        risk = record.get("risk") or {}
+
+        rows.append(
+            (plugin, target, json.dumps(result), json.dumps(risk), record["created_at"])
+            + _risk_values(risk, target)
+            + (extract_entities(plugin, target, result),)
+            + (record.get("refreshed_at"), record.get("id"), record.get("prev_id"))
+        )
+
+    return rows
+
+
+def _chunks(f, size):
+    while True:
+        chunk = list(islice(f, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class _IdMap:
+    """
+    Export id -> new row id for an import. Exports list rows in id order,
+    so the ids arrive sorted and two int64 arrays with a binary search
+    hold millions of them in a few bytes each.
+    """
+
+    def __init__(self):
+        self._keys = array("q")
+        self._values = array("q")
+
+    def __setitem__(self, key, value):
+        if self._keys and key <= self._keys[-1]:
+            # Out of order (hand-edited file): keep the sort, slowly
+            i = bisect_left(self._keys, key)
+            if i < len(self._keys) and self._keys[i] == key:
+                self._values[i] = value
+                return
+            self._keys.insert(i, key)
+            self._values.insert(i, value)
+            return
+        self._keys.append(key)
+        self._values.append(value)
+
+    def get(self, key):
+        i = bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            return self._values[i]
+        return None
+
+
+def import_case(storage, path, case_id=None, workers=1, chunk_lines=CHUNK_LINES, commit_rows=COMMIT_ROWS):
+    """
+    Load an export into case_id (default: the exported case id). Chunks of
+    lines are parsed on a process pool while the main process inserts the
+    previous ones, in file order, commit_rows rows per transaction. Rows
+    whose (plugin, target, created_at) the case already has are skipped,
+    so importing the same file twice adds nothing. prev_id links are
+    remapped to the new row ids.
+    """
+    started = time.perf_counter()
+    stats = {"rows": 0, "inserted": 0}
+
+    with _open(path, "rb", path.endswith(".gz")) as f:
+        header = json.loads(f.readline() or b"{}")
+        if header.get("tvx_export") != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a tvx case export (version {FORMAT_VERSION})")
+
+        case = header.get("case") or {}
+        case_id = case_id or case.get("id")
+        if not case_id:
+            raise ValueError("Export has no case id; pass one")
+
+        storage.create_case(case_id, created_at=case.get("created_at"), exist_ok=True)
+        ids = _IdMap()
+
+        pool = None
+        if workers > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            pool = ProcessPoolExecutor(max_workers=workers)
+
+        def insert(rows):
+            with span("import.insert"):
+                stats["inserted"] += storage.import_evidence(case_id, rows, ids)
+            stats["rows"] += len(rows)
+
+        try:
+            with storage.batch(commit_every=commit_rows):
+                if pool is None:
+                    for chunk in _chunks(f, chunk_lines):
+                        insert(prepare_rows(chunk))
+                else:
+                    # Oldest first, so rows keep their file order
+                    pending = deque()
+                    for chunk in _chunks(f, chunk_lines):
+                        if len(pending) >= workers * 2:
+                            insert(pending.popleft().result())
+                        pending.append(pool.submit(prepare_rows, chunk))
+                    while pending:
+                        insert(pending.popleft().result())
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+    stats["case"] = case_id
+    stats["skipped"] = stats["rows"] - stats["inserted"]
+    stats["elapsed_sec"] = round(time.perf_counter() - started, 3)
+    return stats
@@ -0,0 +1,285 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from tvx.config import get_key
+
+CACHE_PATH = os.path.expanduser("~/.tracevector_cache.db")
+
+# Seconds a successful answer stays fresh, per lookup source
+DEFAULT_TTLS = {
+    "mx": 3600,
+    "rdap": 7 * 86400,
+}
+DEFAULT_NEGATIVE_TTL = 300
+DEFAULT_MAX_ENTRIES = 200000
+
+
+class LookupCache:
+    """
+    On-disk TTL cache for network lookups (MX, RDAP), shared across runs.
+
+    Entries are keyed by (source, key). Failures are cached too, with a short
+    negative TTL, so a dead domain is not retried on every target. When the
+    table grows past max_entries the least recently used rows are evicted;
+    hits record their access time in memory, written with the counters.
+    """
+
+    def __init__(self, path=CACHE_PATH, ttls=None, negative_ttl=DEFAULT_NEGATIVE_TTL,
+                 max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+
+        self.hits = {}
+        self.misses = {}
+        # Since this process started; hits/misses reset on every flush
+        self._totals = {}
+        # {(source, key): time} of hits not written to accessed_at yet
+        self._touched = {}
+        self._writes = 0
+        self._lock = threading.Lock()
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self._init()
+
+    def _init(self):
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS lookups (
+                source TEXT,
+                key TEXT,
+                value TEXT,
+                ok INTEGER,
+                expires_at REAL,
+                accessed_at REAL,
+                PRIMARY KEY (source, key)
+            )
+        """)
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_lookups_accessed ON lookups (accessed_at)"
+        )
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS counters (
+                source TEXT PRIMARY KEY,
+                hits INTEGER DEFAULT 0,
+                misses INTEGER DEFAULT 0
+            )
+        """)
+        self.conn.commit()
+
+    # =====================================
+    # Lookups
+    # =====================================
+    def get(self, source, key):
+        """
+        Return {"ok": bool, "value": ...} for a fresh entry, or None.
+        """
+        return self.get_many(source, [key]).get(key)
+
+    def get_many(self, source, keys):
+        keys = list(dict.fromkeys(keys))
+        now = time.time()
+        found = {}
+
+        with self._lock:
+            # Chunked to stay under SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    f"SELECT key, value, ok FROM lookups "
+                    f"WHERE source=? AND key IN ({marks}) AND expires_at > ?",
+                    [source, *chunk, now]
+                ).fetchall()
+
+                for key, value, ok in rows:
+                    found[key] = {"ok": bool(ok), "value": json.loads(value)}
+
+            for key in found:
+                self._touched[source, key] = now
+
+            self.hits[source] = self.hits.get(source, 0) + len(found)
+            self.misses[source] = self.misses.get(source, 0) + len(keys) - len(found)
+
+            totals = self._totals.setdefault(source, [0, 0])
+            totals[0] += len(found)
+            totals[1] += len(keys) - len(found)
+
+        return found
+
+    def put(self, source, key, value, ok=True):
+        self.put_many(source, {key: value}, ok=ok)
+
+    def put_many(self, source, items, ok=True):
+        now = time.time()
+        ttl = self.ttls.get(source, 3600) if ok else self.negative_ttl
+
+        rows = [
+            (source, key, json.dumps(value), int(ok), now + ttl, now)
+            for key, value in items.items()
+        ]
+
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO lookups "
+                "(source, key, value, ok, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self.conn.commit()
+
+            self._writes += len(rows)
+            if self._writes >= 1000:
+                self._writes = 0
+                self._evict()
+
+    def _write_touched(self):
+        # Caller holds _lock and commits
+        if self._touched:
+            self.conn.executemany(
+                "UPDATE lookups SET accessed_at=? WHERE source=? AND key=?",
+                [(at, source, key) for (source, key), at in self._touched.items()]
+            )
+            self._touched.clear()
+
+    def _evict(self):
+        self._write_touched()
+        count = self.conn.execute("SELECT COUNT(*) FROM lookups").fetchone()[0]
+        if count <= self.max_entries:
+            return
+
+        self.conn.execute("DELETE FROM lookups WHERE expires_at <= ?", (time.time(),))
+        count = self.conn.execute("SELECT COUNT(*) FROM lookups").fetchone()[0]
+
+        if count > self.max_entries:
+            self.conn.execute(
+                "DELETE FROM lookups WHERE rowid IN ("
+                "SELECT rowid FROM lookups ORDER BY accessed_at LIMIT ?)",
+                (count - self.max_entries,)
+            )
+        self.conn.commit()
+
+    # =====================================
+    # Maintenance
+    # =====================================
+    def flush_counters(self):
+        """
+        Write hit/miss counters and the access times of cache hits.
+        """
+        with self._lock:
+            self._write_touched()
+            sources = set(self.hits) | set(self.misses)
+            for source in sources:
+                self.conn.execute(
+                    "INSERT INTO counters (source, hits, misses) VALUES (?, ?, ?) "
+                    "ON CONFLICT(source) DO UPDATE SET "
+                    "hits = hits + excluded.hits, misses = misses + excluded.misses",
+                    (source, self.hits.get(source, 0), self.misses.get(source, 0))
+                )
+            self.conn.commit()
+            self.hits.clear()
+            self.misses.clear()
+
+    def counters(self):
+        """
+        {source: (hits, misses)} seen by this process, without touching the
+        database.
+        """
+        with self._lock:
+            return {source: tuple(totals) for source, totals in self._totals.items()}
+
+    def stats(self):
+        self.flush_counters()
+        now = time.time()
+
+        with self._lock:
+            rows = self.conn.execute("""
+                SELECT source,
+                       COUNT(*),
+                       SUM(ok = 0),
+                       SUM(expires_at <= ?)
+                FROM lookups GROUP BY source
+            """, (now,)).fetchall()
+
+            counters = {
+                source: (hits, misses)
+                for source, hits, misses in self.conn.execute(
+                    "SELECT source, hits, misses FROM counters"
+                )
+            }
+
+        sources = {}
+        for source, entries, negative, expired in rows:
+            hits, misses = counters.get(source, (0, 0))
+            sources[source] = {
+                "entries": entries,
+                "negative": negative or 0,
+                "expired": expired or 0,
+                "hits": hits,
+                "misses": misses,
+                "hit_ratio": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+                "ttl": self.ttls.get(source),
+            }
+
+        return {
+            "path": self.path,
+            "size_bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+            "max_entries": self.max_entries,
+            "sources": sources,
+        }
+
+    def purge(self, source=None):
+        with self._lock:
+            if source:
+                cur = self.conn.execute("DELETE FROM lookups WHERE source=?", (source,))
+                self.conn.execute("DELETE FROM counters WHERE source=?", (source,))
+            else:
+                cur = self.conn.execute("DELETE FROM lookups")
+                self.conn.execute("DELETE FROM counters")
+            self.conn.commit()
+            removed = cur.rowcount
+            self.conn.execute("VACUUM")
+
+        return removed
+
+
+_cache = None
+_cache_resolved = False
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """
+    Shared lookup cache configured from tvx config keys:
+    cache_path, cache_ttl_<source>, cache_negative_ttl, cache_max_entries.
+    Returns None when cache_enabled is set to 0. The config is read once
+    per process; lookups after that never touch it.
+    """
+    global _cache, _cache_resolved
+
+    if _cache_resolved:
+        return _cache
+
+    with _cache_lock:
+        if not _cache_resolved and str(get_key("cache_enabled", "1")) != "0":
+            ttls = {
+                source: int(get_key(f"cache_ttl_{source}", ttl))
+                for source, ttl in DEFAULT_TTLS.items()
+            }
+            _cache = LookupCache(
+                path=os.path.expanduser(get_key("cache_path", CACHE_PATH)),
+                ttls=ttls,
+                negative_ttl=int(get_key("cache_negative_ttl", DEFAULT_NEGATIVE_TTL)),
+                max_entries=int(get_key("cache_max_entries", DEFAULT_MAX_ENTRIES))
+            )
+            atexit.register(_cache.flush_counters)
+        _cache_resolved = True
+
+    return _cache
@@ -1,9 +1,13 @@
 import re
+
+from tvx.lists import is_disposable
+
+
 class EmailPlugin:
     name = "email"
 
     def run(self, target):
         return {
             "target": target,
-            "disposable_email": False
+            "disposable_email": is_disposable(target.split("@")[-1])
         }
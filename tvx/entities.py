@@ -0,0 +1,62 @@
+from tvx.utils import classify_target
+
+# Entity types extracted from evidence, in the order shown by tvx
+ENTITY_TYPES = ["email", "domain", "mx", "ip", "network", "asn", "org", "phone", "phone_country"]
+
+
+def normalize_entity(value, entity_type=None):
+    """
+    Canonical form of an entity value, so lookups match however the value
+    was written: lowercase hosts without trailing dots, phone numbers as
+    + and digits, ASNs without an "AS" prefix.
+    """
+    value = str(value).strip()
+    entity_type = entity_type or classify_target(value)
+
+    if entity_type == "phone":
+        digits = "".join(c for c in value if c.isdigit())
+        return ("+" if value.startswith("+") else "") + digits
+
+    if entity_type == "asn":
+        value = value.upper()
+        return value[2:] if value.startswith("AS") else value
+
+    if entity_type == "phone_country":
+        return value.upper()
+
+    return value.lower().rstrip(".")
+
+
+def extract_entities(plugin, target, result):
+    """
+    {(type, normalized value)} for one evidence row: the target itself plus
+    what the plugin result links it to (email domain, MX hosts, RDAP ASN,
+    org and network, phone number and country).
+    """
+    found = set()
+
+    def add(entity_type, value):
+        if value not in (None, "", [], {}):
+            found.add((entity_type, normalize_entity(value, entity_type)))
+
+    target_type = classify_target(target)
+    if target_type in ("email", "ip", "phone", "domain"):
+        add(target_type, target)
+    if target_type == "email":
+        add("domain", str(target).rsplit("@", 1)[-1])
+
+    metadata = result.get("metadata") if isinstance(result, dict) else None
+    if not isinstance(metadata, dict):
+        return found
+
+    for host in metadata.get("mx_records") or []:
+        add("mx", host)
+
+    add("asn", metadata.get("asn"))
+    add("org", metadata.get("org"))
+    add("network", metadata.get("cidr"))
+
+    add("phone", metadata.get("e164"))
+    add("phone_country", metadata.get("region"))
+
+    return found
@@ -0,0 +1,193 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tvx.plugin_loader import get_plugin
+from tvx.profiling import span
+from tvx.scoring import SIGNALS, calculate_risk, get_rules
+from tvx.utils import classify_target
+
+# Plugin commands run on the target itself, per target type
+PLUGINS = {
+    "email": ["email"],
+    "ip": ["ip"],
+    "phone": ["phone"],
+    "domain": [],
+}
+
+# Mail/web server addresses enriched per investigation
+MAX_DERIVED_IPS = 8
+
+
+def _timed(timings, name, fn, *args):
+    started = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        timings[name] = round((time.perf_counter() - started) * 1000, 1)
+
+
+def run_plugin(command, target):
+    """
+    Result of one plugin on target, or None if it is not installed.
+    """
+    plugin = get_plugin(command)
+    if plugin is None:
+        return None
+    with span("plugin.run"):
+        return plugin.run(target)
+
+
+def resolve_addresses(hosts):
+    """
+    {address: host} for the A records of hosts; failed lookups are dropped.
+    """
+    from tvx.resolver import get_engine
+
+    addresses = {}
+    with span("dns.a"):
+        answers = get_engine().resolve_many(hosts, "A")
+
+    for host, answer in answers.items():
+        if not isinstance(answer, Exception):
+            for address in answer:
+                addresses.setdefault(address, host)
+
+    return addresses
+
+
+def enrich_domain(domain, include_self=False):
+    """
+    MX hosts of domain and the addresses they (and, with include_self, the
+    domain itself) resolve to. The MX query is shared with the email
+    plugin's, through the lookup cache or the resolver's in-flight
+    coalescing.
+    """
+    from tvx.plugins.email_osint import lookup_mx_many
+
+    answer = lookup_mx_many([domain]).get(domain.lower().rstrip("."))
+    mx_hosts = [] if isinstance(answer, Exception) or answer is None else list(answer)
+
+    hosts = mx_hosts + ([domain] if include_self else [])
+    addresses = resolve_addresses(hosts) if hosts else {}
+
+    return mx_hosts, dict(list(addresses.items())[:MAX_DERIVED_IPS])
+
+
+def investigate(target, workers=16):
+    """
+    Classify target, run every plugin for its type and the derived-entity
+    enrichment (email/domain: MX hosts -> addresses -> IP analysis) all at
+    once, then score the merged signals with one calculate_risk pass.
+
+    Wall time is the slowest branch: the plugins and the MX -> A -> RDAP
+    chain run side by side, and the IP analyses within the chain run in
+    parallel with each other.
+    """
+    started = time.perf_counter()
+    target_type = classify_target(target)
+
+    report = {
+        "target": target,
+        "type": target_type,
+        "results": {},
+        "related": {},
+        "errors": {},
+        "timings_ms": {},
+    }
+    timings = report["timings_ms"]
+
+    def related_ips(domain, include_self):
+        mx_hosts, addresses = _timed(timings, "dns", enrich_domain, domain, include_self)
+        report["related"]["mx_hosts"] = mx_hosts
+
+        with ThreadPoolExecutor(max_workers=max(1, len(addresses))) as inner:
+            futures = {
+                address: inner.submit(_timed, timings, f"ip:{address}", run_plugin, "ip", address)
+                for address in addresses
+            }
+
+        ips = {}
+        for address, future in futures.items():
+            try:
+                ips[address] = {"host": addresses[address], "scan": future.result()}
+            except Exception as e:
+                report["errors"][f"ip:{address}"] = str(e)
+        report["related"]["ips"] = ips
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            command: pool.submit(_timed, timings, command, run_plugin, command, target)
+            for command in PLUGINS.get(target_type, [])
+        }
+
+        if target_type in ("email", "domain"):
+            domain = target.rsplit("@", 1)[-1]
+            futures["related"] = pool.submit(related_ips, domain, target_type == "domain")
+
+        for name, future in futures.items():
+            try:
+                result = future.result()
+            except Exception as e:
+                report["errors"][name] = str(e)
+                continue
+            if name != "related" and result is not None:
+                report["results"][name] = result
+
+    merged, report["signals"] = merge_signals(report)
+
+    with span("scoring"):
+        report["risk"] = calculate_risk(merged)
+
+    timings["total"] = round((time.perf_counter() - started) * 1000, 1)
+    return report
+
+
+def _lookup(result, keys):
+    for key in keys:
+        if not isinstance(result, dict):
+            return None
+        result = result.get(key)
+    return result
+
+
+def merge_signals(report):
+    """
+    (merged result, {rule path: [sources]}) over the target's plugin
+    results and the related IPs' analyses, so calculate_risk sees every
+    rule's value once: the highest number, else the first truthy value.
+
+    Related IPs (MX hosts and the like) only lend their reputation
+    signals; their own risk.score and metadata describe someone else's
+    infrastructure, not the target.
+    """
+    sources = [(name, result) for name, result in report["results"].items()]
+    signal_keys = {key for key, _, _ in SIGNALS}
+    sources += [
+        (f"ip:{address}", {k: v for k, v in entry["scan"].items() if k in signal_keys})
+        for address, entry in report["related"].get("ips", {}).items()
+    ]
+
+    merged = {"target": report["target"]}
+    fired = {}
+
+    for path in dict.fromkeys(rule["path"] for rule in get_rules().rules):
+        keys = path.split(".")
+        best = None
+
+        for source, result in sources:
+            value = _lookup(result, keys)
+            if not value:
+                continue
+            fired.setdefault(path, []).append(source)
+            if best is None or (
+                isinstance(value, (int, float)) and isinstance(best, (int, float)) and value > best
+            ):
+                best = value
+
+        if best is not None:
+            node = merged
+            for key in keys[:-1]:
+                node = node.setdefault(key, {})
+            node[keys[-1]] = best
+
+    return merged, fired
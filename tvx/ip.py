@@ -1,8 +1,40 @@
 import requests
 
+from tvx.config import get_key
+from tvx.ratelimit import RateLimited, Throttled, get_limiter
+
+IPAPI_URL = "http://ip-api.com/json/{ip}"
+IPAPI_TIMEOUT = 10
+
+
+def query_ipapi(ip):
+    """
+    One ip-api.com request. The free endpoint allows 45 requests per
+    minute and reports what is left in X-Rl / X-Ttl headers.
+    """
+    url = get_key("ipapi_url", IPAPI_URL).format(ip=ip)
+    response = requests.get(url, timeout=IPAPI_TIMEOUT)
+
+    if response.status_code == 429:
+        raise RateLimited(
+            f"ip-api rate limited ({url})",
+            retry_after=response.headers.get("Retry-After") or response.headers.get("X-Ttl")
+        )
+    response.raise_for_status()
+
+    # Out of quota: hold other callers back until the window resets
+    if response.headers.get("X-Rl") == "0":
+        get_limiter("ipapi").penalize(float(response.headers.get("X-Ttl") or 60))
+
+    return response.json()
+
+
 def investigate_ip(ip):
-    url = f"http://ip-api.com/json/{ip}"
-    data = requests.get(url).json()
+    try:
+        data = get_limiter("ipapi").call(query_ipapi, ip)
+    except Throttled as e:
+        print(f"[!] {e}")
+        return
 
     for k, v in data.items():
         print(f"[+] {k}: {v}")
@@ -0,0 +1,186 @@
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+
+from tvx.config import get_key
+
+DISPOSABLE_INDEX_PATH = os.path.expanduser("~/.tracevector_disposable.idx")
+
+# Used when no compiled index exists
+BUILTIN_DISPOSABLE = {"mailinator.com", "tempmail.com"}
+
+# magic, format version, entry count; then (count + 1) uint32 offsets
+# (little-endian) into a blob of sorted, concatenated domain names
+_MAGIC = b"TVXD"
+_VERSION = 1
+_HEADER = struct.Struct("<4sII")
+
+
+def normalize_domain(domain):
+    domain = domain.strip().lower().rstrip(".")
+    if domain.startswith("*."):
+        domain = domain[2:]
+    return domain.lstrip(".")
+
+
+def _read_domains(paths):
+    """
+    Encoded domains from list files, and the number of lines skipped
+    because their domain has no IDNA form (bad labels, over-long names).
+    """
+    domains = set()
+    skipped = 0
+
+    for path in paths:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                line = line.split("#", 1)[0].strip()
+                if not line:
+                    continue
+                # Accept "domain", "*.domain" and "user@domain" lines
+                domain = normalize_domain(line.split("@")[-1].split()[0])
+                if not domain:
+                    continue
+                try:
+                    domains.add(domain.encode() if domain.isascii() else domain.encode("idna"))
+                except UnicodeError:
+                    skipped += 1
+
+    return domains, skipped
+
+
+def compile_domains(paths, out=DISPOSABLE_INDEX_PATH):
+    """
+    Compile domain blocklists into a sorted binary index at out.
+    The file is written next to out and renamed into place, so readers
+    never see a partial index. Returns {"domains": n, "skipped": n}.
+    """
+    domains, skipped = _read_domains(paths)
+    domains = sorted(domains)
+
+    offsets = array("I", [0])
+    for d in domains:
+        offsets.append(offsets[-1] + len(d))
+    if sys.byteorder == "big":
+        offsets.byteswap()
+
+    tmp = out + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, len(domains)))
+        f.write(offsets.tobytes())
+        for d in domains:
+            f.write(d)
+    os.replace(tmp, out)
+
+    return {"domains": len(domains), "skipped": skipped}
+
+
+class DomainIndex:
+    """
+    Memory-mapped sorted domain list with exact and parent-domain lookup.
+
+    Only the pages touched by the binary search are read, so opening a
+    150k-domain list costs a stat and an mmap rather than building a set.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.count = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"Not a tvx domain index: {path}")
+
+        start = _HEADER.size
+        end = start + 4 * (self.count + 1)
+
+        if sys.byteorder == "little":
+            self._offsets = memoryview(self._mm)[start:end].cast("I")
+        else:
+            self._offsets = array("I", self._mm[start:end])
+            self._offsets.byteswap()
+
+        self._data = end
+
+    def __len__(self):
+        return self.count
+
+    def _get(self, i):
+        return self._mm[self._data + self._offsets[i]:self._data + self._offsets[i + 1]]
+
+    def contains(self, domain):
+        key = domain.encode() if isinstance(domain, str) else domain
+        lo, hi = 0, self.count
+
+        while lo < hi:
+            mid = (lo + hi) // 2
+            value = self._get(mid)
+            if value < key:
+                lo = mid + 1
+            elif value > key:
+                hi = mid
+            else:
+                return True
+
+        return False
+
+    def match(self, domain):
+        """
+        The listed domain that domain equals or is a subdomain of, or None.
+        """
+        domain = normalize_domain(domain)
+        if not domain.isascii():
+            try:
+                domain = domain.encode("idna").decode()
+            except UnicodeError:
+                return None
+
+        labels = domain.split(".")
+        for i in range(len(labels)):
+            candidate = ".".join(labels[i:])
+            if self.contains(candidate):
+                return candidate
+
+        return None
+
+
+_index = None
+_index_loaded = False
+_index_lock = threading.Lock()
+
+
+def get_disposable_index():
+    """
+    The compiled disposable-domain index (config key disposable_index,
+    default ~/.tracevector_disposable.idx), or None if none was compiled.
+    Opened once per process.
+    """
+    global _index, _index_loaded
+
+    if _index_loaded:
+        return _index
+
+    with _index_lock:
+        if not _index_loaded:
+            path = os.path.expanduser(get_key("disposable_index", DISPOSABLE_INDEX_PATH))
+            _index = DomainIndex(path) if os.path.exists(path) else None
+            _index_loaded = True
+
+    return _index
+
+
+def is_disposable(domain):
+    """
+    True if domain or any parent domain is on the disposable list.
+    """
+    index = get_disposable_index()
+    if index is not None:
+        return index.match(domain) is not None
+
+    labels = normalize_domain(domain).split(".")
+    return any(".".join(labels[i:]) in BUILTIN_DISPOSABLE for i in range(len(labels)))
@@ -1,19 +1,22 @@
 import argparse
 import json
+import os
 import sys
 from datetime import datetime
 
-from tvx.plugin_loader import load_plugins
+from tvx import profiling
+from tvx.plugin_loader import get_plugin, load_plugins
+from tvx.profiling import span
 from tvx.scoring import calculate_risk
 from tvx.reporting import generate_html
-from tvx.config import set_key
+from tvx.config import get_key, set_key
 from tvx.storage.manager import get_storage
 
 
 # =====================================
 # Banner
 # =====================================
-def print_banner():
+def print_banner(stream=sys.stdout):
     print(r"""
 ████████╗██████╗  █████╗  ██████╗███████╗
 ╚══██╔══╝██╔══██╗██╔══██╗██╔════╝██╔════╝
@@ -23,7 +26,61 @@ def print_banner():
    ╚═╝   ╚═╝  ╚═╝╚═╝  ╚═╝ ╚═════╝╚══════╝
 
         TRACEVECTOR FRAUD INTELLIGENCE
-""")
+""", file=stream)
+
+
+def require_plugin(name):
+    try:
+        with span("plugin.load"):
+            plugin = get_plugin(name)
+    except RuntimeError as e:
+        print(f"[!] {e}")
+        sys.exit(1)
+
+    if plugin is None:
+        print(f"[!] Unknown plugin: {name}")
+        print("Available plugins:", ", ".join(load_plugins()))
+        sys.exit(1)
+
+    return plugin
+
+
+def require_sandbox(command, workers, timeout=None):
+    """
+    Pre-fork a sandbox pool for plugin command, or exit if the plugin is
+    unknown or does not match its pin.
+    """
+    from tvx.plugin_loader import plugin_file
+    from tvx.plugin_security import PluginIntegrityError, read_pins, verify_file
+    from tvx.sandbox import SandboxPool
+
+    found = plugin_file(command)
+    if found is None:
+        print(f"[!] Unknown plugin: {command}")
+        print("Available plugins:", ", ".join(load_plugins()))
+        sys.exit(1)
+
+    try:
+        verify_file(*found, read_pins())
+    except PluginIntegrityError as e:
+        print(f"[!] {e}")
+        sys.exit(1)
+
+    return SandboxPool(workers=workers, timeout=timeout)
+
+
+def require_rules():
+    """
+    Compile the configured scoring rules, or exit if they are invalid.
+    """
+    from tvx.scoring import RuleError, load_rules
+
+    try:
+        return load_rules()
+    except RuleError as e:
+        print(f"[!] Invalid scoring rules: {e}")
+        print("Fix them, or reset with: tvx config scoring_rules=")
+        sys.exit(1)
 
 
 # =====================================
@@ -39,14 +96,45 @@ def main():
     parser.add_argument("args", nargs="*", help="Command arguments")
     parser.add_argument("--json", action="store_true", help="Output JSON")
     parser.add_argument("--report", help="Generate HTML report")
+    parser.add_argument("--input", help="Targets file for scan (.txt, .csv, .jsonl)")
+    parser.add_argument("--plugin", help="Plugin to run for scan")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent workers")
+    parser.add_argument("--output", help="Write NDJSON results to file")
+    parser.add_argument("--no-banner", action="store_true", help="Do not print banner")
+    parser.add_argument("--limit", type=int, help="Maximum rows to return")
+    parser.add_argument("--after", type=int, help="Return rows after this evidence id")
+    parser.add_argument("--all", action="store_true", help="Apply to all cases")
+    parser.add_argument("--profile", action="store_true", help="Print a JSON timing trace to stderr")
+    parser.add_argument("--metrics", help="Write Prometheus stage metrics to file")
+    parser.add_argument("--level", help="Filter by risk level (comma-separated)")
+    parser.add_argument("--since", help="Filter by age (24h, 7d) or ISO timestamp")
+    parser.add_argument("--min-score", type=int, help="Filter by minimum risk score")
+    parser.add_argument("--target-type", help="Filter by target type (email, ip, phone, domain)")
+    parser.add_argument("--cases", action="store_true", help="List matching cases instead of evidence")
+    parser.add_argument("--host", default="127.0.0.1", help="Address for serve to listen on")
+    parser.add_argument("--port", type=int, default=8787, help="Port for serve to listen on")
+    parser.add_argument("--socket", help="Unix socket path for serve (instead of TCP)")
+    parser.add_argument("--timeout", type=float, help="Per-request timeout in seconds for serve, or per plugin call with --sandbox")
+    parser.add_argument("--sandbox", action="store_true", help="Run plugins in pre-forked worker processes with time and memory limits")
+    parser.add_argument("--compress", action="store_true", help="With db compact, store new evidence compressed from now on (sets evidence_compression=1)")
+    parser.add_argument("--older-than", default="7d", help="Age (24h, 7d) or ISO timestamp after which case refresh re-runs evidence")
 
     parsed = parser.parse_args()
 
-    print_banner()
-
     command = parsed.command
     arguments = parsed.args
 
+    if parsed.profile:
+        profiling.print_trace_at_exit()
+    if parsed.metrics:
+        profiling.set_metrics_file(parsed.metrics)
+
+    # Keep stdout clean for streamed NDJSON
+    streaming = command in ("scan", "serve") or (command == "case" and arguments[:1] in (["show"], ["query"]))
+
+    if not parsed.no_banner:
+        print_banner(sys.stderr if streaming else sys.stdout)
+
     # =========================
     # CORE: CONFIG
     # =========================
@@ -60,12 +148,275 @@ def main():
         print(f"[✓] Config saved: {key}")
         sys.exit(0)
 
+    # =========================
+    # CORE: RULES
+    # =========================
+    if command == "rules":
+        from tvx.scoring import RuleError, Ruleset, read_rules
+
+        if arguments[:1] == ["check"]:
+            try:
+                ruleset = Ruleset(*read_rules(arguments[1])) if len(arguments) > 1 else require_rules()
+            except RuleError as e:
+                print(f"[!] {e}")
+                sys.exit(1)
+            print(f"[✓] {len(ruleset.rules)} scoring rules OK ({ruleset.source})")
+            sys.exit(0)
+
+        if arguments[:1] == ["show"]:
+            print(json.dumps(require_rules().spec, indent=2))
+            sys.exit(0)
+
+        print("Usage: tvx rules check [RULES_FILE]")
+        print("       tvx rules show")
+        sys.exit(1)
+
+    # =========================
+    # CORE: PLUGINS
+    # =========================
+    if command == "plugins":
+        from tvx.plugin_loader import pin_plugins
+        from tvx.plugin_security import PINS_PATH
+
+        if arguments[:1] != ["pin"]:
+            print("Usage: tvx plugins pin")
+            sys.exit(1)
+
+        pins = pin_plugins()
+        for module, digest in sorted(pins.items()):
+            print(f"  {digest[:16]}  {module}")
+        print(f"[✓] Pinned {len(pins)} plugin files in {PINS_PATH}")
+        sys.exit(0)
+
+    # Compiled once up front: a bad rule set fails here, not mid-scan
+    require_rules()
+
+    # =========================
+    # CORE: SCAN
+    # =========================
+    if command == "scan":
+        from tvx.scan import read_targets, run_scan, print_summary
+
+        if not parsed.input or not parsed.plugin:
+            print("Usage: tvx scan --input targets.txt --plugin PLUGIN [--workers N] [--output FILE] [--sandbox [--timeout S]]")
+            sys.exit(1)
+
+        sandbox = None
+        if parsed.sandbox:
+            sandbox = require_sandbox(parsed.plugin, parsed.workers, parsed.timeout)
+            plugin = sandbox.plugin(parsed.plugin)
+        else:
+            plugin = require_plugin(parsed.plugin)
+
+        out = open(parsed.output, "w", encoding="utf-8") if parsed.output else sys.stdout
+
+        try:
+            stats = run_scan(
+                plugin,
+                read_targets(parsed.input),
+                out,
+                workers=parsed.workers
+            )
+        finally:
+            if out is not sys.stdout:
+                out.close()
+            if sandbox is not None:
+                sandbox_stats = sandbox.stats()
+                sandbox.close()
+
+        if sandbox is not None:
+            stats["sandbox"] = sandbox_stats
+
+        print_summary(stats)
+        sys.exit(1 if stats["errors"] and not stats["ok"] else 0)
+
+    # =========================
+    # CORE: INVESTIGATE
+    # =========================
+    if command == "investigate":
+        from tvx.investigate import investigate
+
+        if not arguments:
+            print("Usage: tvx investigate TARGET [--json] [--report FILE]")
+            sys.exit(1)
+
+        report = investigate(arguments[0], workers=parsed.workers)
+
+        if report["type"] == "unknown":
+            print(f"[!] Cannot tell what kind of target this is: {arguments[0]}")
+            sys.exit(1)
+
+        if parsed.json:
+            print(json.dumps(report, indent=2, default=str))
+        else:
+            print(f"\n=== Investigation: {report['target']} ({report['type']}) ===")
+            print(json.dumps({k: report[k] for k in ("results", "related", "errors")}, indent=2, default=str))
+            print("\n=== Risk Assessment ===")
+            print(json.dumps(report["risk"], indent=2))
+            print(f"Signals: {json.dumps(report['signals'])}")
+            print(f"Timings (ms): {json.dumps(report['timings_ms'])}")
+
+        if parsed.report:
+            file_path = generate_html(report, report["risk"], parsed.report)
+            print(f"\n[✓] HTML report generated: {file_path}")
+        sys.exit(0)
+
+    # =========================
+    # CORE: CACHE
+    # =========================
+    if command == "cache":
+        from tvx.cache import get_cache
+        from tvx.netcache import get_network_cache
+
+        action = arguments[0] if arguments else None
+        cache = get_cache()
+
+        if cache is None:
+            print("[!] Lookup cache is disabled (cache_enabled=0)")
+            sys.exit(1)
+
+        if action == "stats":
+            stats = cache.stats()
+            stats["networks"] = get_network_cache().stats()
+            print(json.dumps(stats, indent=2))
+            sys.exit(0)
+
+        if action == "purge":
+            source = arguments[1] if len(arguments) > 1 else None
+            removed = 0
+            if source in (None, "networks"):
+                removed += get_network_cache().purge()
+            if source != "networks":
+                removed += cache.purge(source)
+            print(f"[✓] Purged {removed} cache entries" + (f" ({source})" if source else ""))
+            sys.exit(0)
+
+        print("Usage: tvx cache <stats|purge [SOURCE]>")
+        sys.exit(1)
+
+    # =========================
+    # CORE: SERVE
+    # =========================
+    if command == "serve":
+        from tvx.server import DEFAULT_TIMEOUT, serve
+
+        try:
+            serve(
+                host=parsed.host,
+                port=parsed.port,
+                socket_path=parsed.socket,
+                workers=parsed.workers,
+                timeout=parsed.timeout or DEFAULT_TIMEOUT,
+                plugins=parsed.plugin.split(",") if parsed.plugin else None,
+                sandbox=parsed.sandbox,
+            )
+        except OSError as e:
+            print(f"[!] Cannot serve: {e}")
+            sys.exit(1)
+        sys.exit(0)
+
+    # =========================
+    # CORE: DB
+    # =========================
+    if command == "db":
+        if arguments[:1] != ["compact"]:
+            print("Usage: tvx db compact [--compress]")
+            sys.exit(1)
+
+        storage = get_storage()
+        stats = storage.compact()
+        if parsed.compress:
+            set_key("evidence_compression", "1")
+
+        mb = 1024 * 1024
+        print(f"[✓] Compacted {stats['rows']} evidence rows")
+        print(f"    payload: {stats['bytes_before'] / mb:.1f} MB -> {stats['bytes_after'] / mb:.1f} MB (ratio {stats['ratio']})")
+        print(f"    database: {stats['file_before'] / mb:.1f} MB -> {stats['file_after'] / mb:.1f} MB")
+        print(f"    elapsed: {stats['elapsed_sec']}s")
+        if parsed.compress:
+            print("[i] Set evidence_compression=1: new evidence will be stored compressed")
+        else:
+            print("[i] New evidence is stored uncompressed; run with --compress to change that")
+        sys.exit(0)
+
+    # =========================
+    # CORE: ENTITY
+    # =========================
+    if command == "entity":
+        storage = get_storage()
+
+        if arguments[:1] == ["lookup"] and len(arguments) >= 2:
+            found = storage.lookup_entity(arguments[1], limit=parsed.limit or 20)
+            print(json.dumps(found, indent=2))
+            sys.exit(0 if found["cases"] else 1)
+
+        if arguments[:1] == ["reindex"]:
+            rows = storage.reindex_entities()
+            print(f"[✓] Indexed entities for {rows} evidence rows")
+            sys.exit(0)
+
+        print("Usage: tvx entity lookup VALUE [--limit N]")
+        print("       tvx entity reindex")
+        sys.exit(1)
+
+    # =========================
+    # CORE: LISTS
+    # =========================
+    if command == "lists":
+        usage = (
+            "Usage: tvx lists compile LIST_FILE... [--output INDEX]\n"
+            "       tvx lists reputation CATEGORY=FEED_FILE... [--output INDEX]\n"
+            "       (categories: tor_exit, vpn, blacklisted)"
+        )
+
+        if arguments[:1] == ["reputation"] and len(arguments) >= 2:
+            from tvx.reputation import REPUTATION_INDEX_PATH, compile_feeds
+
+            feeds = {}
+            for spec in arguments[1:]:
+                if "=" not in spec:
+                    print(usage)
+                    sys.exit(1)
+                category, path = spec.split("=", 1)
+                feeds.setdefault(category, []).append(path)
+
+            out = parsed.output or os.path.expanduser(get_key("reputation_index", REPUTATION_INDEX_PATH))
+            try:
+                counts = compile_feeds(feeds, out)
+            except (OSError, ValueError) as e:
+                print(f"[!] {e}")
+                sys.exit(1)
+
+            print(f"[✓] Compiled {counts['v4']} IPv4 and {counts['v6']} IPv6 ranges into {out}")
+            if counts["skipped"]:
+                print(f"[!] Skipped {counts['skipped']} unparseable lines")
+            sys.exit(0)
+
+        from tvx.lists import DISPOSABLE_INDEX_PATH, compile_domains
+
+        if arguments[:1] != ["compile"] or len(arguments) < 2:
+            print(usage)
+            sys.exit(1)
+
+        # Default to the index is_disposable() reads
+        out = parsed.output or os.path.expanduser(get_key("disposable_index", DISPOSABLE_INDEX_PATH))
+        try:
+            counts = compile_domains(arguments[1:], out)
+        except OSError as e:
+            print(f"[!] {e}")
+            sys.exit(1)
+
+        print(f"[✓] Compiled {counts['domains']} domains into {out} ({os.path.getsize(out)} bytes)")
+        if counts["skipped"]:
+            print(f"[!] Skipped {counts['skipped']} lines with invalid domain names")
+        sys.exit(0)
+
     # =========================
     # CORE: CASE
     # =========================
     if command == "case":
         if not arguments:
-            print("Usage: tvx case <create|add|show>")
+            print("Usage: tvx case <create|add|show|query|related|report|rescore|refresh|export|import>")
             sys.exit(1)
 
         action = arguments[0]
@@ -92,15 +443,12 @@ def main():
             plugin_name = arguments[2]
             target = arguments[3]
 
-            plugins = load_plugins()
-
-            if plugin_name not in plugins:
-                print("[!] Unknown plugin")
-                sys.exit(1)
+            plugin = require_plugin(plugin_name)
 
-            plugin = plugins[plugin_name]
-            result = plugin.run(target)
-            risk = calculate_risk(result)
+            with span("plugin.run"):
+                result = plugin.run(target)
+            with span("scoring"):
+                risk = calculate_risk(result)
 
             storage.add_evidence(case_id, plugin_name, target, result, risk)
 
@@ -108,20 +456,197 @@ def main():
             print(f"Risk Level: {risk['level']} (Score: {risk['score']})")
             sys.exit(0)
 
-        # SHOW
+        # SHOW (NDJSON, one evidence row per line)
         if action == "show":
             if len(arguments) < 2:
-                print("Usage: tvx case show CASE_ID")
+                print("Usage: tvx case show CASE_ID [--limit N] [--after ID]")
                 sys.exit(1)
 
             case_id = arguments[1]
-            case_data = storage.get_case(case_id)
 
-            if not case_data["case"]:
+            if not storage.get_case_info(case_id):
+                print("[!] Case not found.", file=sys.stderr)
+                sys.exit(1)
+
+            last_id = None
+            count = 0
+
+            for row in storage.iter_evidence(case_id, after_id=parsed.after, limit=parsed.limit):
+                row["result"] = json.loads(row["result"])
+                row["risk"] = json.loads(row["risk"])
+                sys.stdout.write(json.dumps(row) + "\n")
+                last_id = row["id"]
+                count += 1
+
+            sys.stdout.flush()
+
+            if parsed.limit and count == parsed.limit and last_id is not None:
+                print(f"[i] More rows may follow: --after {last_id}", file=sys.stderr)
+            sys.exit(0)
+
+        # QUERY (NDJSON; filters run in SQL on indexed columns)
+        if action == "query":
+            from tvx.utils import parse_since
+
+            def _split(value):
+                values = [v.strip() for v in value.split(",")] if value else None
+                return values[0] if values and len(values) == 1 else values
+
+            try:
+                since = parse_since(parsed.since) if parsed.since else None
+            except ValueError:
+                print(f"[!] Invalid --since: {parsed.since}", file=sys.stderr)
+                sys.exit(1)
+
+            filters = {
+                "case_id": arguments[1] if len(arguments) > 1 else None,
+                "level": _split(parsed.level.upper() if parsed.level else None),
+                "plugin": _split(parsed.plugin),
+                "target_type": _split(parsed.target_type),
+                "since": since,
+                "min_score": parsed.min_score,
+            }
+
+            if parsed.cases:
+                for row in storage.query_cases(limit=parsed.limit, **filters):
+                    sys.stdout.write(json.dumps(row) + "\n")
+                sys.exit(0)
+
+            last_id = None
+            count = 0
+
+            for row in storage.query_evidence(after_id=parsed.after, limit=parsed.limit, **filters):
+                row["result"] = json.loads(row["result"])
+                row["risk"] = json.loads(row["risk"])
+                sys.stdout.write(json.dumps(row) + "\n")
+                last_id = row["id"]
+                count += 1
+
+            sys.stdout.flush()
+
+            if parsed.limit and count == parsed.limit and last_id is not None:
+                print(f"[i] More rows may follow: --after {last_id}", file=sys.stderr)
+            sys.exit(0)
+
+        # RELATED (other cases sharing entities)
+        if action == "related":
+            if len(arguments) < 2:
+                print("Usage: tvx case related CASE_ID [--limit N]")
+                sys.exit(1)
+
+            related = storage.related_cases(arguments[1], limit=parsed.limit or 20)
+            print(json.dumps(related, indent=2))
+            sys.exit(0)
+
+        # REPORT
+        if action == "report":
+            from tvx.reporting import generate_case_html
+
+            if len(arguments) < 3:
+                print("Usage: tvx case report CASE_ID out.html")
+                sys.exit(1)
+
+            case_id = arguments[1]
+
+            if not storage.get_case_info(case_id):
                 print("[!] Case not found.")
                 sys.exit(1)
 
-            print(json.dumps(case_data, indent=2))
+            file_path = generate_case_html(storage, case_id, arguments[2])
+            print(f"[✓] Case report generated: {file_path}")
+            sys.exit(0)
+
+        # RESCORE
+        if action == "rescore":
+            from tvx.rescore import rescore
+
+            if len(arguments) < 2 and not parsed.all:
+                print("Usage: tvx case rescore <CASE_ID|--all>")
+                sys.exit(1)
+
+            case_id = None if parsed.all else arguments[1]
+
+            if case_id is not None and not storage.get_case_info(case_id):
+                print("[!] Case not found.")
+                sys.exit(1)
+
+            try:
+                stats = rescore(storage, case_id)
+            except RuntimeError as e:
+                print(f"[!] {e}")
+                sys.exit(1)
+
+            print(f"[✓] Rescored {stats['rows']} evidence rows in {stats['elapsed_sec']}s "
+                  f"({stats['rows_per_sec']} rows/s)")
+            for level, count in sorted(stats["levels"].items()):
+                print(f"  {level}: {count}")
+            sys.exit(0)
+
+        # REFRESH (re-run stale evidence, store what changed)
+        if action == "refresh":
+            from tvx.refresh import refresh, print_summary
+            from tvx.utils import parse_since
+
+            if len(arguments) < 2:
+                print("Usage: tvx case refresh CASE_ID [--older-than 7d] [--workers N]")
+                sys.exit(1)
+
+            case_id = arguments[1]
+
+            if not storage.get_case_info(case_id):
+                print("[!] Case not found.")
+                sys.exit(1)
+
+            try:
+                before = parse_since(parsed.older_than)
+            except ValueError:
+                print(f"[!] Invalid --older-than: {parsed.older_than}")
+                sys.exit(1)
+
+            stats = refresh(storage, case_id, before, workers=parsed.workers)
+            print_summary(stats)
+            sys.exit(1 if stats["errors"] and not (stats["changed"] or stats["unchanged"]) else 0)
+
+        # EXPORT (gzip NDJSON, streamed)
+        if action == "export":
+            from tvx.archive import export_case
+
+            if len(arguments) < 2 or not parsed.output:
+                print("Usage: tvx case export CASE_ID --output case.ndjson.gz")
+                sys.exit(1)
+
+            case_id = arguments[1]
+
+            if not storage.get_case_info(case_id):
+                print("[!] Case not found.")
+                sys.exit(1)
+
+            count = export_case(storage, case_id, parsed.output)
+            print(f"[✓] Exported {count} evidence rows to {parsed.output} "
+                  f"({os.path.getsize(parsed.output)} bytes)")
+            sys.exit(0)
+
+        # IMPORT
+        if action == "import":
+            from tvx.archive import import_case
+
+            if len(arguments) < 2:
+                print("Usage: tvx case import FILE [CASE_ID] [--workers N]")
+                sys.exit(1)
+
+            try:
+                stats = import_case(
+                    storage,
+                    arguments[1],
+                    case_id=arguments[2] if len(arguments) > 2 else None,
+                    workers=min(parsed.workers, os.cpu_count() or 1)
+                )
+            except (OSError, ValueError) as e:
+                print(f"[!] Import failed: {e}")
+                sys.exit(1)
+
+            print(f"[✓] Imported {stats['inserted']} evidence rows into case {stats['case']} "
+                  f"({stats['skipped']} duplicates skipped) in {stats['elapsed_sec']}s")
             sys.exit(0)
 
         print("Unknown case action.")
@@ -130,11 +655,9 @@ def main():
     # =========================
     # PLUGIN EXECUTION
     # =========================
-    plugins = load_plugins()
-
-    if command not in plugins:
+    if command not in load_plugins():
         print(f"[!] Unknown command: {command}")
-        print("Available plugins:", ", ".join(plugins.keys()))
+        print("Available plugins:", ", ".join(load_plugins()))
         sys.exit(1)
 
     if not arguments:
@@ -142,15 +665,35 @@ def main():
         sys.exit(1)
 
     target = arguments[0]
-    plugin = plugins[command]
 
-    try:
-        result = plugin.run(target)
-    except Exception as e:
-        print(f"[!] Plugin execution failed: {e}")
-        sys.exit(1)
+    if parsed.sandbox:
+        from tvx.sandbox import SandboxError
+
+        with require_sandbox(command, 1, parsed.timeout) as sandbox:
+            try:
+                result = sandbox.run(command, target)
+            except SandboxError as e:
+                if parsed.json:
+                    print(json.dumps(e.record(target), indent=2))
+                else:
+                    print(f"[!] Plugin execution failed ({e.status}): {e}")
+                sys.exit(1)
+    else:
+        plugin = require_plugin(command)
+
+        try:
+            with span("plugin.run"):
+                result = plugin.run(target)
+        except Exception as e:
+            print(f"[!] Plugin execution failed: {e}")
+            sys.exit(1)
+
+    # Print-only plugins have nothing to score
+    if result is None:
+        sys.exit(0)
 
-    risk = calculate_risk(result)
+    with span("scoring"):
+        risk = calculate_risk(result)
 
     output = {
         "scan": result,
@@ -0,0 +1,265 @@
+import atexit
+import bisect
+import ipaddress
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from tvx.cache import CACHE_PATH, DEFAULT_TTLS
+from tvx.config import get_key
+
+# How far back from the bisect point to look for an enclosing range.
+# RDAP networks nest (allocation > assignment > sub-assignment), so the
+# first enclosing range found walking back is the most specific one.
+MAX_WALK_BACK = 64
+
+# Blocks wider than this (/16 for IPv4, /48 for IPv6) are not indexed:
+# a large allocation usually contains more specific assignments that
+# RDAP would answer differently.
+MAX_RANGE_BITS = {4: 16, 6: 80}
+
+
+def _key(addr):
+    # Fixed-width hex sorts like the integer and fits in SQLite TEXT
+    return format(int(addr), "032x")
+
+
+class NetworkCache:
+    """
+    Interval index of RDAP network ranges (IPv4 and IPv6).
+
+    Every RDAP answer describes a whole network block; storing its
+    start/end addresses lets any later IP inside that block be enriched
+    locally without another WHOIS call.
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl=DEFAULT_TTLS["rdap"]):
+        self.path = path
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+        self._range_hits = {}
+        self._lock = threading.Lock()
+
+        # version -> sorted starts, parallel [(start, end, id, expires_at, record)]
+        self._starts = {4: [], 6: []}
+        self._ranges = {4: [], 6: []}
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self._init()
+        self._load()
+
+    def _init(self):
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS networks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                version INTEGER,
+                start TEXT,
+                end TEXT,
+                cidr TEXT,
+                record TEXT,
+                expires_at REAL,
+                hits INTEGER DEFAULT 0,
+                UNIQUE (version, start, end)
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS network_counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER DEFAULT 0
+            )
+        """)
+        self.conn.commit()
+
+    def _load(self):
+        rows = self.conn.execute(
+            "SELECT id, version, start, end, record, expires_at FROM networks "
+            "WHERE expires_at > ? ORDER BY version, start",
+            (time.time(),)
+        )
+        for row_id, version, start, end, record, expires_at in rows:
+            self._ranges[version].append(
+                (int(start, 16), int(end, 16), row_id, expires_at, json.loads(record))
+            )
+
+        for version, ranges in self._ranges.items():
+            self._starts[version] = [r[0] for r in ranges]
+
+    # =====================================
+    # Lookups
+    # =====================================
+    def lookup(self, ip):
+        """
+        Return the cached RDAP record of the most specific known network
+        containing ip, or None.
+        """
+        addr = ipaddress.ip_address(ip)
+        value = int(addr)
+        now = time.time()
+
+        with self._lock:
+            starts = self._starts[addr.version]
+            ranges = self._ranges[addr.version]
+
+            i = bisect.bisect_right(starts, value) - 1
+            stop = max(-1, i - MAX_WALK_BACK)
+
+            while i > stop:
+                start, end, row_id, expires_at, record = ranges[i]
+                if start <= value <= end and expires_at > now:
+                    self.hits += 1
+                    self._range_hits[row_id] = self._range_hits.get(row_id, 0) + 1
+                    return record
+                i -= 1
+
+            self.misses += 1
+            return None
+
+    def add(self, record):
+        """
+        Index the network block described by an RDAP record.
+        Returns False when the record carries no usable range.
+        """
+        network = record.get("network") or {}
+
+        try:
+            start = ipaddress.ip_address(network["start_address"])
+            end = ipaddress.ip_address(network["end_address"])
+        except (KeyError, TypeError, ValueError):
+            return False
+
+        if start.version != end.version or int(end) < int(start):
+            return False
+
+        if int(end) - int(start) >= 2 ** MAX_RANGE_BITS[start.version]:
+            return False
+
+        expires_at = time.time() + self.ttl
+
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO networks (version, start, end, cidr, record, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(version, start, end) DO UPDATE SET "
+                "record = excluded.record, expires_at = excluded.expires_at, "
+                "cidr = excluded.cidr",
+                (start.version, _key(start), _key(end), network.get("cidr"),
+                 json.dumps(record), expires_at)
+            )
+            self.conn.commit()
+
+            row_id = self.conn.execute(
+                "SELECT id FROM networks WHERE version=? AND start=? AND end=?",
+                (start.version, _key(start), _key(end))
+            ).fetchone()[0]
+
+            entry = (int(start), int(end), row_id, expires_at, record)
+            starts = self._starts[start.version]
+            ranges = self._ranges[start.version]
+
+            # Replace an existing identical range instead of duplicating it
+            i = bisect.bisect_left(starts, entry[0])
+            while i < len(ranges) and ranges[i][0] == entry[0]:
+                if ranges[i][1] == entry[1]:
+                    ranges[i] = entry
+                    return True
+                i += 1
+
+            starts.insert(i, entry[0])
+            ranges.insert(i, entry)
+
+        return True
+
+    # =====================================
+    # Maintenance
+    # =====================================
+    def flush_counters(self):
+        with self._lock:
+            self.conn.executemany(
+                "UPDATE networks SET hits = hits + ? WHERE id = ?",
+                [(n, row_id) for row_id, n in self._range_hits.items()]
+            )
+            for name, value in (("hits", self.hits), ("misses", self.misses)):
+                self.conn.execute(
+                    "INSERT INTO network_counters (name, value) VALUES (?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                    (name, value)
+                )
+            self.conn.commit()
+
+            self._range_hits.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self, top=10):
+        self.flush_counters()
+
+        counters = dict(self.conn.execute("SELECT name, value FROM network_counters"))
+        hits = counters.get("hits", 0)
+        misses = counters.get("misses", 0)
+
+        ranges = self.conn.execute(
+            "SELECT version, COUNT(*) FROM networks GROUP BY version"
+        ).fetchall()
+
+        top_ranges = [
+            {"cidr": cidr, "org": (json.loads(record).get("network") or {}).get("name"), "hits": n}
+            for cidr, record, n in self.conn.execute(
+                "SELECT cidr, record, hits FROM networks WHERE hits > 0 "
+                "ORDER BY hits DESC LIMIT ?",
+                (top,)
+            )
+        ]
+
+        return {
+            "ranges": {f"ipv{v}": n for v, n in ranges},
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            "top_ranges": top_ranges,
+        }
+
+    def purge(self):
+        with self._lock:
+            cur = self.conn.execute("DELETE FROM networks")
+            self.conn.execute("DELETE FROM network_counters")
+            self.conn.commit()
+
+            self._range_hits.clear()
+            self._starts = {4: [], 6: []}
+            self._ranges = {4: [], 6: []}
+
+        return cur.rowcount
+
+
+_netcache = None
+_netcache_resolved = False
+_netcache_lock = threading.Lock()
+
+
+def get_network_cache():
+    """
+    Shared network range cache, stored next to the lookup cache.
+    Returns None when cache_enabled is set to 0; like get_cache(), the
+    config is read once per process.
+    """
+    global _netcache, _netcache_resolved
+
+    if _netcache_resolved:
+        return _netcache
+
+    with _netcache_lock:
+        if not _netcache_resolved and str(get_key("cache_enabled", "1")) != "0":
+            _netcache = NetworkCache(
+                path=os.path.expanduser(get_key("cache_path", CACHE_PATH)),
+                ttl=int(get_key("cache_ttl_rdap", DEFAULT_TTLS["rdap"]))
+            )
+            atexit.register(_netcache.flush_counters)
+        _netcache_resolved = True
+
+    return _netcache
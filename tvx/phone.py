@@ -1,16 +1,26 @@
 try:
     import phonenumbers
-    from phonenumbers import geocoder, carrier
 except ImportError:
-    print("[!] Missing dependency: phonenumbers")
-    print("Run: pip install phonenumbers")
-    exit(1)
+    phonenumbers = None
 
 def investigate_phone(number):
-    try:
-        parsed = phonenumbers.parse(number)
-        print("[+] Valid Number:", phonenumbers.is_valid_number(parsed))
-        print("[+] Country:", geocoder.description_for_number(parsed, "en"))
-        print("[+] Carrier:", carrier.name_for_number(parsed, "en"))
-    except Exception as e:
-        print("[!] Error:", e)
+    if phonenumbers is None:
+        print("[!] Missing dependency: phonenumbers")
+        print("Run: pip install phonenumbers")
+        return
+
+    from tvx.plugins.phone_osint import analyze, default_region
+
+    result = analyze(number, default_region())
+    metadata = result["metadata"]
+
+    if not metadata:
+        print("[!] Error:", "; ".join(result["notes"]))
+        return
+
+    print("[+] Valid Number:", metadata["valid"])
+    print("[+] Country:", metadata["location"] or metadata["region"])
+    print("[+] Carrier:", metadata["carrier"] or "")
+    print("[+] Line Type:", metadata["line_type"])
+
+    return result
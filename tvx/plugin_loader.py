@@ -1,31 +1,346 @@
 import importlib
-import inspect
+import json
+import os
+import threading
+from collections.abc import Mapping
 
+from tvx.plugin_security import sha256_file, write_pins
+from tvx.profiling import span
+
+# Legacy top-level plugin modules, scanned before tvx/plugins/*
 PLUGIN_MODULES = [
     "tvx.email",
     "tvx.phone",
     "tvx.ip",
 ]
 
+PLUGIN_PACKAGE = "tvx.plugins"
 
-def load_plugins():
-    plugins = {}
+MANIFEST_PATH = os.path.expanduser("~/.tracevector_plugins.json")
+MANIFEST_VERSION = 1
+
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_instances = {}
+_instances_lock = threading.Lock()
+_manifest = None
+
+
+# =====================================
+# Discovery (no imports)
+# =====================================
+def _plugin_files():
+    """
+    (module_path, file_path) for every candidate plugin module, in
+    registration order: later modules override earlier ones for a command.
+    """
+    files = []
 
     for module_path in PLUGIN_MODULES:
+        path = os.path.join(_PACKAGE_DIR, module_path.split(".")[-1] + ".py")
+        if os.path.exists(path):
+            files.append((module_path, path))
+
+    plugin_dir = os.path.join(_PACKAGE_DIR, PLUGIN_PACKAGE.split(".")[-1])
+    if os.path.isdir(plugin_dir):
+        for filename in sorted(os.listdir(plugin_dir)):
+            if filename.endswith(".py") and not filename.startswith("_"):
+                files.append((f"{PLUGIN_PACKAGE}.{filename[:-3]}", os.path.join(plugin_dir, filename)))
+
+    return files
+
+
+def _constant(node):
+    import ast
+
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    return None
+
+
+def _scan_module(module_path, file_path):
+    """
+    Read plugin metadata from a module's source with ast, without importing.
+
+    tvx/plugins modules declare COMMAND (and optionally NAME) and expose
+    either a class with run(args) or a module-level run(args); args is the
+    argv-style list. Legacy modules expose a class whose run(target) takes
+    the bare target and whose `name` is the command.
+    """
+    import ast
+
+    with open(file_path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=file_path)
+
+    constants = {}
+    classes = []
+    functions = set()
+
+    for node in tree.body:
+        if isinstance(node, ast.Assign):
+            for t in node.targets:
+                if isinstance(t, ast.Name) and _constant(node.value) is not None:
+                    constants[t.id] = _constant(node.value)
+
+        elif isinstance(node, ast.ClassDef):
+            methods = {n.name for n in node.body if isinstance(n, ast.FunctionDef)}
+            attrs = {}
+            for n in node.body:
+                if isinstance(n, ast.Assign):
+                    for t in n.targets:
+                        if isinstance(t, ast.Name) and _constant(n.value) is not None:
+                            attrs[t.id] = _constant(n.value)
+            if "run" in methods:
+                classes.append((node.name, attrs, methods))
+
+        elif isinstance(node, ast.FunctionDef):
+            functions.add(node.name)
+
+    basename = module_path.split(".")[-1]
+    is_package_plugin = module_path.startswith(PLUGIN_PACKAGE + ".")
+    entries = []
+
+    for class_name, attrs, methods in classes:
+        if is_package_plugin:
+            command = constants.get("COMMAND", basename)
+            name = attrs.get("name", constants.get("NAME", class_name))
+        else:
+            command = attrs.get("name", basename)
+            name = attrs.get("name", class_name)
+
+        entries.append({
+            "command": command,
+            "name": name,
+            "module": module_path,
+            "attr": class_name,
+            "kind": "class",
+            "call": "argv" if is_package_plugin else "target",
+            "batch": "run_many" in methods,
+        })
+
+    if not classes and "run" in functions and "COMMAND" in constants:
+        entries.append({
+            "command": constants["COMMAND"],
+            "name": constants.get("NAME", basename),
+            "module": module_path,
+            "attr": "run",
+            "kind": "function",
+            "call": "argv" if is_package_plugin else "target",
+            "batch": "run_many" in functions,
+        })
+
+    return entries
+
+
+def build_manifest():
+    files = {}
+    plugins = {}
+    aliases = {}
+
+    for module_path, file_path in _plugin_files():
+        stat = os.stat(file_path)
+        files[file_path] = {
+            "sha256": sha256_file(file_path),
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+        }
+
         try:
-            module = importlib.import_module(module_path)
+            entries = _scan_module(module_path, file_path)
+        except (SyntaxError, UnicodeDecodeError):
+            continue
+
+        for entry in entries:
+            plugins[entry["command"]] = entry
+            # tvx/plugins modules are also addressable by module name
+            if entry["module"].startswith(PLUGIN_PACKAGE + "."):
+                aliases[entry["module"].split(".")[-1]] = entry
+
+    return {
+        "version": MANIFEST_VERSION,
+        "files": files,
+        "plugins": plugins,
+        "aliases": aliases,
+    }
 
-            # Look for a class with a run() method
-            for name, obj in inspect.getmembers(module):
-                if inspect.isclass(obj) and hasattr(obj, "run"):
-                    instance = obj()
 
-                    # Use class attribute if available
-                    plugin_name = getattr(instance, "name", module_path.split(".")[-1])
+def _manifest_valid(manifest):
+    if manifest.get("version") != MANIFEST_VERSION:
+        return False
 
-                    plugins[plugin_name] = instance
+    current = dict((path, module) for module, path in _plugin_files())
+    files = manifest.get("files", {})
 
-        except Exception:
+    if set(current) != set(files):
+        return False
+
+    for path, meta in files.items():
+        stat = os.stat(path)
+        if stat.st_mtime_ns == meta["mtime_ns"] and stat.st_size == meta["size"]:
             continue
+        # Touched but maybe unchanged: the content hash decides
+        if sha256_file(path) != meta["sha256"]:
+            return False
+
+    return True
+
+
+def get_manifest(refresh=False):
+    """
+    Command -> plugin metadata, cached in MANIFEST_PATH and rebuilt when
+    any plugin file is added, removed or changed.
+    """
+    global _manifest
+
+    if _manifest is not None and not refresh:
+        return _manifest
+
+    with span("plugins.manifest"):
+        _manifest = _read_or_build_manifest(refresh)
 
-    return plugins
+    return _manifest
+
+
+def _read_or_build_manifest(refresh):
+    manifest = None
+
+    if not refresh and os.path.exists(MANIFEST_PATH):
+        try:
+            with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if not _manifest_valid(manifest):
+                manifest = None
+        except (OSError, ValueError, KeyError):
+            manifest = None
+
+    if manifest is None:
+        manifest = build_manifest()
+        try:
+            tmp = MANIFEST_PATH + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(tmp, MANIFEST_PATH)
+        except OSError:
+            pass
+
+    return manifest
+
+
+# =====================================
+# Loading (imports one plugin)
+# =====================================
+class PluginHandle:
+    """
+    Uniform wrapper: run(target) and, when the plugin supports it,
+    run_many(targets), whatever calling convention the plugin uses.
+    "argv" plugins take [target] in run() and a list of those in
+    run_many(); "target" plugins take bare targets in both.
+    """
+
+    def __init__(self, entry, obj):
+        self.command = entry["command"]
+        self.name = entry["name"]
+        self.module = entry["module"]
+        self.plugin = obj
+        self._argv = entry["call"] == "argv"
+        self._run = obj.run if entry["kind"] == "class" else obj
+
+        if hasattr(obj, "run_many"):
+            self.run_many = self._run_many_argv if self._argv else obj.run_many
+
+    def run(self, target):
+        return self._run([target] if self._argv else target)
+
+    def _run_many_argv(self, targets):
+        return self.plugin.run_many([[target] for target in targets])
+
+
+def _lookup(command):
+    manifest = get_manifest()
+    return manifest["plugins"].get(command) or manifest["aliases"].get(command)
+
+
+def get_plugin(command):
+    """
+    Import and return the plugin for command, or None if unknown.
+    Raises RuntimeError if the plugin module fails to import.
+    """
+    entry = _lookup(command)
+    if entry is None:
+        return None
+
+    key = (entry["module"], entry["attr"])
+
+    with _instances_lock:
+        if key not in _instances:
+            try:
+                with span("plugins.import"):
+                    module = importlib.import_module(entry["module"])
+            except (ImportError, SystemExit) as e:
+                raise RuntimeError(f"Plugin '{command}' failed to load: {e}")
+
+            obj = getattr(module, entry["attr"])
+            if entry["kind"] == "class":
+                obj = obj()
+
+            _instances[key] = PluginHandle(entry, obj)
+
+        return _instances[key]
+
+
+def plugin_file(command):
+    """
+    (module, file path) of the plugin for command, or None if unknown.
+    Does not import it.
+    """
+    entry = _lookup(command)
+    if entry is None:
+        return None
+    return entry["module"], dict(_plugin_files())[entry["module"]]
+
+
+def pin_plugins():
+    """
+    Pin the sha256 of every plugin file for sandboxed execution.
+    """
+    return write_pins(_plugin_files())
+
+
+def list_plugins():
+    return [
+        {
+            "command": entry["command"],
+            "name": entry["name"],
+            "module": entry["module"],
+            "batch": entry["batch"],
+        }
+        for entry in get_manifest()["plugins"].values()
+    ]
+
+
+class _LazyPlugins(Mapping):
+
+    def __init__(self):
+        self._commands = list(get_manifest()["plugins"])
+
+    def __getitem__(self, command):
+        plugin = get_plugin(command)
+        if plugin is None:
+            raise KeyError(command)
+        return plugin
+
+    def __contains__(self, command):
+        return _lookup(command) is not None
+
+    def __iter__(self):
+        return iter(self._commands)
+
+    def __len__(self):
+        return len(self._commands)
+
+
+def load_plugins():
+    """
+    Mapping of command -> plugin. Plugins are imported on first access.
+    """
+    return _LazyPlugins()
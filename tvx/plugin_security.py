@@ -1,4 +1,17 @@
 import hashlib
+import json
+import os
+
+# Plugin module -> sha256 of its file, written by `tvx plugins pin`
+PINS_PATH = os.path.expanduser("~/.tracevector_plugin_pins.json")
+PINS_VERSION = 1
+
+
+class PluginIntegrityError(RuntimeError):
+    """
+    A plugin file is not pinned, or no longer matches its pinned hash.
+    """
+
 
 def sha256_file(path):
     h = hashlib.sha256()
@@ -6,3 +19,48 @@ def sha256_file(path):
         for chunk in iter(lambda: f.read(4096), b""):
             h.update(chunk)
     return h.hexdigest()
+
+
+def write_pins(files, path=PINS_PATH):
+    """
+    Pin the current hash of each (module, file path); returns {module: sha256}.
+    """
+    pins = {module: sha256_file(file_path) for module, file_path in files}
+
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": PINS_VERSION, "plugins": pins}, f, indent=2)
+    os.replace(tmp, path)
+
+    return pins
+
+
+def read_pins(path=PINS_PATH):
+    """
+    {module: sha256} from the pin file, or None if there is none.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        raise PluginIntegrityError(f"Cannot read plugin pins {path}: {e}")
+
+    if data.get("version") != PINS_VERSION:
+        raise PluginIntegrityError(f"Unsupported plugin pin file {path}; run: tvx plugins pin")
+    return data.get("plugins") or {}
+
+
+def verify_file(module, file_path, pins):
+    """
+    Raise PluginIntegrityError unless file_path hashes to module's pin.
+    """
+    if pins is None:
+        raise PluginIntegrityError("No plugin pins; run: tvx plugins pin")
+
+    expected = pins.get(module)
+    if expected is None:
+        raise PluginIntegrityError(f"Plugin {module} is not pinned; run: tvx plugins pin")
+    if sha256_file(file_path) != expected:
+        raise PluginIntegrityError(f"Plugin {module} does not match its pinned sha256 ({file_path})")
@@ -1,9 +1,16 @@
-import dns.resolver
 import re
-import hashlib
+
+from tvx.cache import get_cache
+from tvx.lists import is_disposable
+from tvx.profiling import count, span
+from tvx.ratelimit import Throttled
+from tvx.scoring import plugin_level
 
 COMMAND = "email"
 
+EMAIL_RE = re.compile(r"[^@]+@[^@]+\.[^@]+")
+
+
 class Plugin:
     name = "Email OSINT Analysis"
 
@@ -11,51 +18,114 @@ class Plugin:
         email = args[0]
         domain = email.split("@")[-1]
 
-        result = {
-            "target": email,
-            "metadata": {},
-            "risk": {"score": 0, "level": "low"},
-            "sources": [],
-            "notes": []
-        }
-
-        # Basic validation
-        if not re.match(r"[^@]+@[^@]+\.[^@]+", email):
-            result["notes"].append("Invalid email format")
-            result["risk"]["score"] += 50
-            return result
-
-        # MX Records
-        try:
-            mx = dns.resolver.resolve(domain, "MX")
-            result["metadata"]["mx_records"] = [r.exchange.to_text() for r in mx]
-        except Exception:
-            result["metadata"]["mx_records"] = []
-            result["risk"]["score"] += 30
-            result["notes"].append("No MX records")
-
-        # Provider detection
-        if "google.com" in str(result["metadata"].get("mx_records", "")):
-            result["metadata"]["provider"] = "Google"
-        else:
-            result["metadata"]["provider"] = "Unknown"
-
-        # Disposable check (basic)
-        disposable_domains = {"mailinator.com", "tempmail.com"}
-        if domain in disposable_domains:
-            result["risk"]["score"] += 40
-            result["notes"].append("Disposable email domain")
-
-        # Risk level
-        result["risk"]["level"] = score_level(result["risk"]["score"])
-        result["sources"].append("DNS")
+        if not EMAIL_RE.match(email):
+            return analyze(email, None)
+
+        return analyze(email, lookup_mx_many([domain])[domain.lower().rstrip(".")])
+
+    def run_many(self, batch):
+        """
+        Analyze a batch of argv lists, one per email as run() takes them,
+        with one MX query per distinct domain.
+        """
+        emails = [args[0] for args in batch]
+        domains = [
+            e.split("@")[-1] for e in emails if EMAIL_RE.match(e)
+        ]
+        answers = lookup_mx_many(domains) if domains else {}
+
+        return [
+            analyze(e, answers.get(e.split("@")[-1].lower().rstrip(".")))
+            if EMAIL_RE.match(e) else analyze(e, None)
+            for e in emails
+        ]
+
+
+def lookup_mx_many(domains):
+    """
+    MX hosts per domain, served from the lookup cache where fresh and
+    resolved concurrently otherwise. Failed lookups come back as exceptions.
+    """
+    domains = list(dict.fromkeys(d.lower().rstrip(".") for d in domains))
+    cache = get_cache()
+    answers = {}
+
+    if cache is not None:
+        with span("cache.mx"):
+            cached = cache.get_many("mx", domains)
+
+        for domain, entry in cached.items():
+            answers[domain] = entry["value"] if entry["ok"] else LookupError(entry["value"])
 
+    missing = [d for d in domains if d not in answers]
+    if missing:
+        # Imported on first miss: asyncio + dnspython are slow to import
+        from tvx.resolver import get_engine
+
+        with span("dns.mx"):
+            resolved = get_engine().resolve_many(missing, "MX")
+        count("dns.mx.queries", len(missing))
+        answers.update(resolved)
+
+        if cache is not None:
+            cache.put_many("mx", {
+                d: v for d, v in resolved.items() if not isinstance(v, Exception)
+            })
+            # Throttled lookups have no answer yet: retry them next time
+            cache.put_many("mx", {
+                d: str(v) or type(v).__name__
+                for d, v in resolved.items()
+                if isinstance(v, Exception) and not isinstance(v, Throttled)
+            }, ok=False)
+
+    return answers
+
+
+def analyze(email, mx):
+    """
+    Build the result for one email. mx is the list of MX hosts, the lookup
+    exception, or None when the address is not well formed.
+    """
+    domain = email.split("@")[-1]
+
+    result = {
+        "target": email,
+        "metadata": {},
+        "risk": {"score": 0, "level": "low"},
+        "sources": [],
+        "notes": []
+    }
+
+    # Basic validation
+    if mx is None:
+        result["notes"].append("Invalid email format")
+        result["risk"]["score"] += 50
         return result
 
+    # MX Records (a throttled lookup says nothing about the domain)
+    if isinstance(mx, Throttled):
+        result["notes"].append("MX lookup throttled (not scored)")
+    elif isinstance(mx, Exception):
+        result["metadata"]["mx_records"] = []
+        result["risk"]["score"] += 30
+        result["notes"].append("No MX records")
+    else:
+        result["metadata"]["mx_records"] = mx
+
+    # Provider detection
+    if "google.com" in str(result["metadata"].get("mx_records", "")):
+        result["metadata"]["provider"] = "Google"
+    else:
+        result["metadata"]["provider"] = "Unknown"
+
+    # Disposable check (compiled blocklist, parent domains included)
+    if is_disposable(domain):
+        result["disposable_email"] = True
+        result["risk"]["score"] += 40
+        result["notes"].append("Disposable email domain")
+
+    # Risk level
+    result["risk"]["level"] = plugin_level(result["risk"]["score"])
+    result["sources"].append("DNS")
 
-def score_level(score):
-    if score >= 70:
-        return "high"
-    if score >= 40:
-        return "medium"
-    return "low"
+    return result
@@ -1,5 +1,11 @@
 import ipaddress
-from ipwhois import IPWhois
+
+from tvx.cache import get_cache
+from tvx.netcache import get_network_cache
+from tvx.profiling import count, span
+from tvx.ratelimit import Throttled, get_limiter
+from tvx.reputation import reputation_signals
+from tvx.scoring import SIGNALS, plugin_level
 
 COMMAND = "ip"
 
@@ -30,11 +36,26 @@ class Plugin:
             result["notes"].append("Private IP address")
             result["risk"]["score"] += 10
 
+        # Local reputation feeds (Tor exits, VPN/hosting ranges, blocklists)
+        listed = reputation_signals(ip)
+        if listed:
+            result["metadata"]["reputation"] = listed
+            result["sources"].append("Reputation feeds")
+            for key, weight, description in SIGNALS:
+                if key in listed:
+                    result[key] = True
+                    result["notes"].append(description)
+                    result["risk"]["score"] += weight
+
         # WHOIS
         try:
-            whois = IPWhois(ip).lookup_rdap()
+            whois = lookup_rdap(ip)
             result["metadata"]["asn"] = whois.get("asn")
             result["metadata"]["org"] = whois.get("network", {}).get("name")
+            result["metadata"]["cidr"] = whois.get("network", {}).get("cidr")
+        except Throttled:
+            # Rate limited upstream: unknown, not suspicious
+            result["notes"].append("WHOIS lookup throttled (not scored)")
         except Exception:
             result["notes"].append("WHOIS lookup failed")
             result["risk"]["score"] += 20
@@ -45,15 +66,79 @@ class Plugin:
             result["notes"].append("Datacenter / hosting IP")
             result["risk"]["score"] += 20
 
-        result["risk"]["level"] = score_level(result["risk"]["score"])
+        result["risk"]["level"] = plugin_level(result["risk"]["score"])
         result["sources"].append("RDAP")
 
         return result
 
 
-def score_level(score):
-    if score >= 70:
-        return "high"
-    if score >= 40:
-        return "medium"
-    return "low"
+def rdap_query(ip):
+    """
+    Raw RDAP query. Kept separate so benchmarks can swap in a local stand-in.
+    """
+    # Imported on first lookup: ipwhois is slow to import
+    from ipwhois import IPWhois
+
+    # No retries or rate-limit sleeps inside ipwhois: the rdap limiter
+    # schedules those
+    return IPWhois(ip).lookup_rdap(retry_count=0, rate_limit_timeout=0)
+
+
+def lookup_rdap(ip):
+    """
+    RDAP lookup for one IP, cached on disk (including failures, except
+    ratelimit.Throttled).
+    Only the fields the plugins use are kept. Any IP inside a network
+    block seen in an earlier answer is served from the range cache.
+    """
+    netcache = get_network_cache()
+
+    if netcache is not None:
+        with span("netcache.lookup"):
+            record = netcache.lookup(ip)
+        if record is not None:
+            return record
+
+    cache = get_cache()
+
+    if cache is not None:
+        with span("cache.rdap"):
+            entry = cache.get("rdap", ip)
+        if entry is not None:
+            if not entry["ok"]:
+                raise LookupError(entry["value"])
+            return entry["value"]
+
+    try:
+        count("rdap.queries")
+        with span("rdap"):
+            whois = get_limiter("rdap").call(rdap_query, ip)
+    except (ImportError, Throttled):
+        raise
+    except Exception as e:
+        if cache is not None:
+            cache.put("rdap", ip, str(e) or type(e).__name__, ok=False)
+        raise
+
+    network = whois.get("network") or {}
+    record = {
+        "asn": whois.get("asn"),
+        "asn_cidr": whois.get("asn_cidr"),
+        "asn_country_code": whois.get("asn_country_code"),
+        "asn_description": whois.get("asn_description"),
+        "network": {
+            "name": network.get("name"),
+            "handle": network.get("handle"),
+            "cidr": network.get("cidr"),
+            "start_address": network.get("start_address"),
+            "end_address": network.get("end_address"),
+            "country": network.get("country"),
+        },
+    }
+
+    if cache is not None:
+        cache.put("rdap", ip, record)
+    if netcache is not None:
+        netcache.add(record)
+
+    return record
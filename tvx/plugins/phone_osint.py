@@ -0,0 +1,232 @@
+import atexit
+import os
+import threading
+
+import phonenumbers
+from phonenumbers import PhoneNumberType
+from phonenumbers.phonemetadata import PhoneMetadata
+
+from tvx.config import get_key
+from tvx.profiling import count, span
+from tvx.scoring import plugin_level
+
+COMMAND = "phone"
+
+# Batches at least this large are analyzed in worker processes
+POOL_MIN_BATCH = 128
+
+# Prefix descriptions kept per process before the memo is reset
+PREFIX_CACHE_SIZE = 200000
+
+LINE_TYPES = {
+    value: name.lower()
+    for name, value in vars(PhoneNumberType).items()
+    if name.isupper() and isinstance(value, int)
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+_prefixes = {}
+_prefix_stats = {"hits": 0, "misses": 0}
+_prefix_digits = None
+
+
+class Plugin:
+    name = "Phone OSINT Analysis"
+
+    def run(self, args):
+        return analyze(args[0], default_region())
+
+    def run_many(self, batch):
+        """
+        Analyze a batch of argv lists, one per number as run() takes them.
+        Large batches are split across a pool of worker processes that
+        each load the phone metadata once.
+        """
+        numbers = [args[0] for args in batch]
+        pool = get_pool() if len(numbers) >= POOL_MIN_BATCH else None
+        region = default_region()
+
+        if pool is None:
+            return analyze_many(numbers, region)
+
+        chunk = max(POOL_MIN_BATCH, len(numbers) // (pool_workers() * 4) + 1)
+        futures = [
+            pool.submit(analyze_many, numbers[i:i + chunk], region)
+            for i in range(0, len(numbers), chunk)
+        ]
+
+        results = []
+        with span("phone.pool"):
+            for future in futures:
+                results.extend(future.result())
+        return results
+
+
+def default_region():
+    """
+    Region assumed for numbers without a +country prefix (config key
+    phone_region, e.g. "US"); None requires the prefix.
+    """
+    region = get_key("phone_region")
+    return region.upper() if region else None
+
+
+# =====================================
+# Worker pool
+# =====================================
+def pool_workers():
+    return int(get_key("phone_workers", os.cpu_count() or 1))
+
+
+def load_metadata():
+    """
+    Load metadata for every region up front (worker initializer), instead
+    of lazily on the first number seen from each region.
+    """
+    PhoneMetadata.load_all()
+    prefix_digits()
+
+
+def get_pool():
+    """
+    The shared process pool, or None when phone_workers is 1 or less.
+    """
+    global _pool
+
+    workers = pool_workers()
+    if workers <= 1:
+        return None
+
+    with _pool_lock:
+        if _pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            # spawn: scan drives this from threads, where fork is unsafe
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=load_metadata,
+            )
+            atexit.register(_pool.shutdown)
+
+    return _pool
+
+
+# =====================================
+# Analysis
+# =====================================
+def prefix_digits():
+    """
+    Numbers sharing this many leading digits (country code included) get
+    the same geocoder/carrier/timezone answers; phonenumbers never looks
+    further. Countries with a mobile token (AR, MX) need its length on
+    top, since geocoding skips the token.
+
+    The geocoder data takes about half a second to import, so it is
+    loaded on first use rather than with the plugin.
+    """
+    global _prefix_digits
+
+    if _prefix_digits is None:
+        from phonenumbers import carrier, geocoder, timezone
+
+        _prefix_digits = max(
+            geocoder.GEOCODE_LONGEST_PREFIX,
+            carrier.CARRIER_LONGEST_PREFIX,
+            timezone.TIMEZONE_LONGEST_PREFIX,
+        )
+    return _prefix_digits
+
+
+def describe_prefix(parsed, line_type, region, prefix):
+    """
+    (location, carrier, timezones) for parsed, memoized per number prefix:
+    the answers only depend on prefix, line type and region.
+    """
+    key = (prefix, line_type, region)
+    cached = _prefixes.get(key)
+    if cached is not None:
+        _prefix_stats["hits"] += 1
+        return cached
+
+    from phonenumbers import carrier, geocoder, timezone
+
+    _prefix_stats["misses"] += 1
+    if len(_prefixes) >= PREFIX_CACHE_SIZE:
+        _prefixes.clear()
+
+    cached = _prefixes[key] = (
+        geocoder.description_for_number(parsed, "en"),
+        carrier.name_for_number(parsed, "en"),
+        list(timezone.time_zones_for_number(parsed)),
+    )
+    return cached
+
+
+def analyze_many(numbers, region=None):
+    with span("phone.analyze"):
+        hits, misses = _prefix_stats["hits"], _prefix_stats["misses"]
+        results = [analyze(n, region) for n in numbers]
+
+    count("phone.prefix_hits", _prefix_stats["hits"] - hits)
+    count("phone.prefix_misses", _prefix_stats["misses"] - misses)
+    return results
+
+
+def analyze(number, region=None):
+    """
+    Build the result for one number. region is the default region for
+    numbers given without +country code.
+    """
+    result = {
+        "target": number,
+        "metadata": {},
+        "risk": {"score": 0, "level": "low"},
+        "sources": ["phonenumbers"],
+        "notes": []
+    }
+
+    try:
+        parsed = phonenumbers.parse(number, region)
+    except phonenumbers.NumberParseException as e:
+        result["notes"].append(f"Unparseable number: {e}")
+        result["risk"]["score"] += 50
+        result["risk"]["level"] = plugin_level(result["risk"]["score"])
+        return result
+
+    line_type = phonenumbers.number_type(parsed)
+    number_region = phonenumbers.region_code_for_number(parsed)
+    valid = phonenumbers.is_valid_number(parsed)
+    e164 = phonenumbers.format_number(parsed, phonenumbers.PhoneNumberFormat.E164)
+
+    digits = prefix_digits() + len(phonenumbers.country_mobile_token(parsed.country_code))
+    location, name, zones = describe_prefix(parsed, line_type, number_region, e164[:1 + digits])
+
+    result["metadata"] = {
+        "valid": valid,
+        "e164": e164,
+        "country_code": parsed.country_code,
+        "region": number_region,
+        "location": location or None,
+        "carrier": name or None,
+        "line_type": LINE_TYPES.get(line_type, "unknown"),
+        "timezones": zones,
+    }
+
+    if not valid:
+        result["notes"].append("Invalid phone number")
+        result["risk"]["score"] += 50
+
+    if line_type == PhoneNumberType.VOIP:
+        result["notes"].append("VOIP number")
+        result["risk"]["score"] += 30
+
+    if line_type == PhoneNumberType.PREMIUM_RATE:
+        result["notes"].append("Premium-rate number")
+        result["risk"]["score"] += 20
+
+    result["risk"]["level"] = plugin_level(result["risk"]["score"])
+
+    return result
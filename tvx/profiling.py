@@ -0,0 +1,244 @@
+import atexit
+import json
+import math
+import os
+import sys
+import threading
+import time
+
+# Off by default: span() then returns a shared no-op context manager
+ENABLED = False
+
+# Histogram buckets: 1µs * 2^(i/4), up to ~3 minutes; quantiles are
+# reported as the upper bound of the bucket they fall in (<19% error).
+_BUCKET_BASE = 1e-6
+_BUCKET_STEP = 4
+_BUCKETS = 110
+
+_lock = threading.Lock()
+_stages = {}
+_counters = {}
+_started = time.perf_counter()
+
+_metrics_path = None
+_metrics_interval = 10.0
+_metrics_written = 0.0
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class _Stage:
+    __slots__ = ("count", "total", "min", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+        self.buckets = [0] * _BUCKETS
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+        if seconds <= _BUCKET_BASE:
+            i = 0
+        else:
+            i = min(_BUCKETS - 1, math.ceil(math.log2(seconds / _BUCKET_BASE) * _BUCKET_STEP))
+        self.buckets[i] += 1
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(self.max, _BUCKET_BASE * 2 ** (i / _BUCKET_STEP))
+        return self.max
+
+
+# =====================================
+# Recording
+# =====================================
+def enable():
+    global ENABLED
+    ENABLED = True
+
+
+def span(name):
+    """
+    Time a block: `with span("dns.mx"): ...`. Free when profiling is off.
+    """
+    if not ENABLED:
+        return _NULL_SPAN
+    return _Span(name)
+
+
+def record(name, seconds):
+    if not ENABLED:
+        return
+
+    with _lock:
+        stage = _stages.get(name)
+        if stage is None:
+            stage = _stages[name] = _Stage()
+        stage.add(seconds)
+
+
+def count(name, n=1):
+    if not ENABLED:
+        return
+
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def reset():
+    global _started
+
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+        _started = time.perf_counter()
+
+
+# =====================================
+# Output
+# =====================================
+def trace():
+    """
+    Per-stage durations (ms) and counters as a JSON-serializable dict.
+    """
+    with _lock:
+        stages = {
+            name: {
+                "count": s.count,
+                "total_ms": round(s.total * 1000, 3),
+                "mean_ms": round(s.total / s.count * 1000, 3),
+                "min_ms": round(s.min * 1000, 3),
+                "max_ms": round(s.max * 1000, 3),
+                "p50_ms": round(s.quantile(0.5) * 1000, 3),
+                "p95_ms": round(s.quantile(0.95) * 1000, 3),
+                "p99_ms": round(s.quantile(0.99) * 1000, 3),
+            }
+            for name, s in sorted(_stages.items())
+        }
+        counters = dict(sorted(_counters.items()))
+
+    return {
+        "wall_ms": round((time.perf_counter() - _started) * 1000, 3),
+        "stages": stages,
+        "counters": counters,
+    }
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus(extra=None):
+    """
+    Stage histograms (p50/p95/p99 summaries) and counters in Prometheus
+    text exposition format. extra maps metric name -> value for gauges
+    owned by the caller.
+    """
+    lines = [
+        "# HELP tvx_stage_duration_seconds Time spent per tvx stage.",
+        "# TYPE tvx_stage_duration_seconds summary",
+    ]
+
+    with _lock:
+        for name, s in sorted(_stages.items()):
+            stage = _label(name)
+            for q in (0.5, 0.95, 0.99):
+                lines.append(
+                    f'tvx_stage_duration_seconds{{stage="{stage}",quantile="{q}"}} {s.quantile(q):.9f}'
+                )
+            lines.append(f'tvx_stage_duration_seconds_sum{{stage="{stage}"}} {s.total:.9f}')
+            lines.append(f'tvx_stage_duration_seconds_count{{stage="{stage}"}} {s.count}')
+
+        lines.append("# HELP tvx_events_total Events counted by tvx stages.")
+        lines.append("# TYPE tvx_events_total counter")
+        for name, n in sorted(_counters.items()):
+            lines.append(f'tvx_events_total{{event="{_label(name)}"}} {n}')
+
+    for name, value in sorted((extra or {}).items()):
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(path=None):
+    path = path or _metrics_path
+    if not path:
+        return
+
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(prometheus())
+    os.replace(tmp, path)
+
+
+def set_metrics_file(path, interval=10.0):
+    """
+    Enable profiling and keep Prometheus text in path: rewritten by
+    maybe_write_metrics() at most every interval seconds and at exit.
+    """
+    global _metrics_path, _metrics_interval
+
+    enable()
+    _metrics_path = path
+    _metrics_interval = interval
+    atexit.register(write_metrics)
+
+
+def maybe_write_metrics():
+    global _metrics_written
+
+    if not _metrics_path:
+        return
+
+    now = time.monotonic()
+    if now - _metrics_written >= _metrics_interval:
+        _metrics_written = now
+        write_metrics()
+
+
+def print_trace_at_exit(stream=None):
+    """
+    Enable profiling and dump the JSON trace to stream (stderr) at exit.
+    """
+    enable()
+    atexit.register(lambda: print(json.dumps(trace(), indent=2), file=stream or sys.stderr))
@@ -0,0 +1,339 @@
+import contextvars
+import heapq
+import itertools
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from tvx.config import get_key
+
+# Waiters with a lower priority value go first
+INTERACTIVE = 0
+BULK = 10
+
+# Per-source defaults, overridden by config keys <source>_rate (requests
+# per second, 0 = unlimited), <source>_burst, <source>_concurrency (0 =
+# unlimited), <source>_retries and <source>_backoff (first retry delay)
+DEFAULTS = {
+    "dns": {"rate": 0, "burst": 100, "concurrency": 0, "retries": 1, "backoff": 0.2},
+    "rdap": {"rate": 10, "burst": 20, "concurrency": 8, "retries": 3, "backoff": 1.0},
+    "ipapi": {"rate": 0.75, "burst": 5, "concurrency": 2, "retries": 3, "backoff": 2.0},
+}
+
+# Longest single backoff, whatever the attempt number
+MAX_BACKOFF = 60.0
+
+# How often an async waiter that is not at the head of the queue rechecks
+ASYNC_POLL = 0.005
+
+_priority = contextvars.ContextVar("tvx_priority", default=INTERACTIVE)
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+class RateLimited(Exception):
+    """
+    Raised by a wrapped call when the upstream answered "slow down" (HTTP
+    429 or equivalent). retry_after is the server's hint in seconds.
+    """
+
+    def __init__(self, message="Rate limited", retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Throttled(Exception):
+    """
+    The upstream kept rate limiting or timing out after every retry. The
+    answer is unknown, not negative: callers must not score it or cache it.
+    """
+
+    def __init__(self, source, cause):
+        super().__init__(f"{source} throttled: {cause}")
+        self.source = source
+        self.cause = cause
+
+
+def _is_rate_limit(exc):
+    return isinstance(exc, RateLimited) or any("RateLimit" in c.__name__ for c in type(exc).__mro__)
+
+
+def _is_timeout(exc):
+    # By class name, so requests/dnspython/ipwhois need not be imported
+    return isinstance(exc, TimeoutError) or any("Timeout" in c.__name__ for c in type(exc).__mro__)
+
+
+@contextmanager
+def priority(level):
+    """
+    Run the enclosed lookups at the given priority (INTERACTIVE or BULK).
+    """
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority():
+    return _priority.get()
+
+
+class Limiter:
+    """
+    Token bucket plus concurrency cap for one upstream source, with a
+    priority queue in front: a waiting interactive call is always served
+    before any waiting bulk call. call() retries rate-limit answers and
+    timeouts with jittered exponential backoff; a rate-limit answer also
+    drains the bucket, so every caller backs off, not just the one hit.
+    """
+
+    def __init__(self, source, rate=0, burst=1, concurrency=0, retries=3, backoff=1.0):
+        self.source = source
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self.concurrency = int(concurrency)
+        self.retries = int(retries)
+        self.backoff = float(backoff)
+
+        self._tokens = self.burst
+        self._stamp = time.monotonic()
+        self._cond = threading.Condition()
+        self._waiters = []
+        self._seq = itertools.count()
+        self._inflight = 0
+
+        self._first = None
+        self._last = None
+        self.counts = {
+            "calls": 0, "ok": 0, "errors": 0, "rate_limited": 0,
+            "timeouts": 0, "retries": 0, "throttled": 0, "wait_sec": 0.0,
+        }
+
+    # =====================================
+    # Admission
+    # =====================================
+    def _grant(self, ticket):
+        """
+        0 if ticket may start now (its token and slot are taken), else the
+        seconds until a token is due, or None to wait for a notify.
+        Caller holds the condition.
+        """
+        if self._waiters[0] != ticket:
+            return None
+        if self.concurrency and self._inflight >= self.concurrency:
+            return None
+
+        if self.rate > 0:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            if self._tokens < 1:
+                return (1 - self._tokens) / self.rate
+            self._tokens -= 1
+
+        heapq.heappop(self._waiters)
+        self._inflight += 1
+        # The next waiter is now at the head
+        self._cond.notify_all()
+        return 0
+
+    def _enqueue(self, level):
+        ticket = (current_priority() if level is None else level, next(self._seq))
+        heapq.heappush(self._waiters, ticket)
+        return ticket
+
+    def _abandon(self, ticket):
+        with self._cond:
+            if ticket in self._waiters:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+    def acquire(self, level=None):
+        """
+        Block until a token and a concurrency slot are available.
+        """
+        started = time.monotonic()
+
+        with self._cond:
+            ticket = self._enqueue(level)
+            try:
+                while True:
+                    delay = self._grant(ticket)
+                    if delay == 0:
+                        break
+                    self._cond.wait(delay)
+            except BaseException:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+                raise
+
+            self.counts["wait_sec"] += time.monotonic() - started
+
+    async def acquire_async(self, level=None):
+        """
+        acquire() for coroutines: waits without blocking the event loop.
+        """
+        import asyncio
+
+        started = time.monotonic()
+
+        with self._cond:
+            ticket = self._enqueue(level)
+
+        try:
+            while True:
+                with self._cond:
+                    delay = self._grant(ticket)
+                    if delay == 0:
+                        self.counts["wait_sec"] += time.monotonic() - started
+                        return
+                await asyncio.sleep(ASYNC_POLL if delay is None else delay)
+        except BaseException:
+            self._abandon(ticket)
+            raise
+
+    def release(self):
+        with self._cond:
+            self._inflight -= 1
+            self._cond.notify_all()
+
+    def penalize(self, seconds):
+        """
+        Hold back new calls for about seconds (the upstream asked us to).
+        """
+        with self._cond:
+            if self.rate > 0:
+                self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+                self._stamp = time.monotonic()
+
+    # =====================================
+    # Calls with retry
+    # =====================================
+    def backoff_delay(self, attempt, retry_after=None):
+        """
+        Full-jitter exponential backoff; never shorter than retry_after.
+        """
+        delay = random.uniform(0, min(MAX_BACKOFF, self.backoff * 2 ** attempt))
+        if retry_after:
+            delay = max(delay, float(retry_after))
+        return delay
+
+    def _record(self, key, value=1):
+        with self._cond:
+            self.counts[key] += value
+            now = time.monotonic()
+            if key == "calls":
+                self._first = self._first or now
+            self._last = now
+
+    def _failed(self, exc, attempt):
+        """
+        Seconds to wait before retrying exc, or raise: the original
+        exception if it is not retryable, Throttled once retries run out.
+        """
+        limited = _is_rate_limit(exc)
+        if not limited and not _is_timeout(exc):
+            self._record("errors")
+            raise exc
+
+        self._record("rate_limited" if limited else "timeouts")
+
+        if attempt >= self.retries:
+            self._record("throttled")
+            raise Throttled(self.source, exc) from exc
+
+        delay = self.backoff_delay(attempt, getattr(exc, "retry_after", None))
+        if limited:
+            self.penalize(delay)
+
+        self._record("retries")
+        return delay
+
+    def call(self, fn, *args, **kwargs):
+        """
+        fn(*args, **kwargs) under this limiter, retried on rate limiting
+        and timeouts. Raises Throttled when every attempt was throttled.
+        """
+        attempt = 0
+
+        while True:
+            self.acquire()
+            self._record("calls")
+            try:
+                value = fn(*args, **kwargs)
+            except Exception as e:
+                delay = self._failed(e, attempt)
+            else:
+                self._record("ok")
+                return value
+            finally:
+                self.release()
+
+            time.sleep(delay)
+            attempt += 1
+
+    async def call_async(self, fn, *args, level=None):
+        """
+        await fn(*args) under this limiter; see call().
+        """
+        import asyncio
+
+        attempt = 0
+
+        while True:
+            await self.acquire_async(level)
+            self._record("calls")
+            try:
+                value = await fn(*args)
+            except Exception as e:
+                delay = self._failed(e, attempt)
+            else:
+                self._record("ok")
+                return value
+            finally:
+                self.release()
+
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self.counts)
+            stats["wait_sec"] = round(stats["wait_sec"], 3)
+            stats["inflight"] = self._inflight
+            stats["waiting"] = len(self._waiters)
+            elapsed = (self._last - self._first) if self._first else 0
+        stats["ok_per_sec"] = round(stats["ok"] / elapsed, 1) if elapsed else None
+        return stats
+
+
+def get_limiter(source):
+    """
+    Shared limiter for an upstream source, configured from DEFAULTS and
+    the <source>_* config keys.
+    """
+    limiter = _limiters.get(source)
+    if limiter is not None:
+        return limiter
+
+    with _limiters_lock:
+        if source not in _limiters:
+            settings = dict(DEFAULTS.get(source, {}))
+            for name in ("rate", "burst", "concurrency", "retries", "backoff"):
+                settings[name] = float(get_key(f"{source}_{name}", settings.get(name, 0)))
+            _limiters[source] = Limiter(source, **settings)
+        return _limiters[source]
+
+
+def limiter_stats():
+    """
+    {source: stats} for every limiter used in this process.
+    """
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.source: limiter.stats() for limiter in limiters}
@@ -1,6 +1,49 @@
+import html
+import json
 import os
 from datetime import datetime
 
+from tvx.profiling import span
+
+STYLE = """
+            body {
+                font-family: Arial, sans-serif;
+                margin: 40px;
+                background-color: #f4f4f4;
+            }
+            h1 {
+                color: #222;
+            }
+            .box {
+                background: white;
+                padding: 20px;
+                margin-bottom: 20px;
+                border-radius: 8px;
+                box-shadow: 0 0 10px rgba(0,0,0,0.05);
+            }
+            .high { color: red; }
+            .medium { color: orange; }
+            .low { color: green; }
+            table {
+                border-collapse: collapse;
+                width: 100%;
+                font-size: 13px;
+            }
+            th, td {
+                border-bottom: 1px solid #ddd;
+                padding: 4px 8px;
+                text-align: left;
+                vertical-align: top;
+            }
+            td.details {
+                font-family: monospace;
+                word-break: break-all;
+            }
+"""
+
+# Characters of per-row result metadata shown in case reports
+DETAILS_LIMIT = 300
+
 
 def generate_html(scan_data: dict, risk_data: dict, filename: str) -> str:
     """
@@ -10,30 +53,14 @@ def generate_html(scan_data: dict, risk_data: dict, filename: str) -> str:
     if not filename.endswith(".html"):
         filename += ".html"
 
+    esc = html.escape
+    level = str(risk_data.get("level", ""))
+
     html_content = f"""
     <html>
     <head>
         <title>TraceVector Fraud Report</title>
-        <style>
-            body {{
-                font-family: Arial, sans-serif;
-                margin: 40px;
-                background-color: #f4f4f4;
-            }}
-            h1 {{
-                color: #222;
-            }}
-            .box {{
-                background: white;
-                padding: 20px;
-                margin-bottom: 20px;
-                border-radius: 8px;
-                box-shadow: 0 0 10px rgba(0,0,0,0.05);
-            }}
-            .high {{ color: red; }}
-            .medium {{ color: orange; }}
-            .low {{ color: green; }}
-        </style>
+        <style>{STYLE}        </style>
     </head>
     <body>
         <h1>TraceVector Fraud Investigation Report</h1>
@@ -41,27 +68,138 @@ def generate_html(scan_data: dict, risk_data: dict, filename: str) -> str:
 
         <div class="box">
             <h2>Scan Result</h2>
-            <pre>{scan_data}</pre>
+            <pre>{esc(json.dumps(scan_data, indent=2, default=str))}</pre>
         </div>
 
         <div class="box">
             <h2>Risk Assessment</h2>
-            <p><strong>Score:</strong> {risk_data.get("score")}</p>
-            <p><strong>Level:</strong> 
-                <span class="{risk_data.get("level", "").lower()}">
-                    {risk_data.get("level")}
+            <p><strong>Score:</strong> {esc(str(risk_data.get("score")))}</p>
+            <p><strong>Level:</strong>
+                <span class="{esc(level.lower())}">
+                    {esc(level)}
                 </span>
             </p>
             <p><strong>Flags:</strong></p>
             <ul>
-                {''.join(f'<li>{flag}</li>' for flag in risk_data.get("flags", []))}
+                {''.join(f'<li>{esc(str(flag))}</li>' for flag in risk_data.get("flags", []))}
             </ul>
         </div>
     </body>
     </html>
     """
 
-    with open(filename, "w", encoding="utf-8") as f:
+    with span("report.write"), open(filename, "w", encoding="utf-8") as f:
         f.write(html_content)
 
     return os.path.abspath(filename)
+
+
+def _count_table(title, headers, rows):
+    esc = html.escape
+    head = "".join(f"<th>{esc(h)}</th>" for h in headers)
+    body = "".join(
+        "<tr>" + "".join(f"<td>{esc(str(v))}</td>" for v in row) + "</tr>"
+        for row in rows
+    ) or f'<tr><td colspan="{len(headers)}">None</td></tr>'
+
+    return f"""
+        <div class="box">
+            <h2>{esc(title)}</h2>
+            <table><tr>{head}</tr>{body}</table>
+        </div>
+"""
+
+
+def _evidence_row(row):
+    esc = html.escape
+
+    try:
+        risk = json.loads(row["risk"] or "{}")
+    except ValueError:
+        risk = {}
+    if not isinstance(risk, dict):
+        risk = {}
+    try:
+        details = json.dumps(json.loads(row["result"] or "{}").get("metadata", {}))
+    except (ValueError, AttributeError):
+        details = ""
+
+    if len(details) > DETAILS_LIMIT:
+        details = details[:DETAILS_LIMIT] + "…"
+
+    level = str(risk.get("level", ""))
+
+    return (
+        f"<tr><td>{row['id']}</td>"
+        f"<td>{esc(str(row['created_at']))}</td>"
+        f"<td>{esc(str(row['plugin']))}</td>"
+        f"<td>{esc(str(row['target']))}</td>"
+        f"<td>{esc(str(risk.get('score', '')))}</td>"
+        f'<td class="{esc(level.lower())}">{esc(level)}</td>'
+        f"<td>{esc('; '.join(map(str, risk.get('flags', []))))}</td>"
+        f'<td class="details">{esc(details)}</td></tr>\n'
+    )
+
+
+def generate_case_html(storage, case_id: str, filename: str, chunk_size: int = 1000) -> str:
+    """
+    Stream a case-wide HTML report to disk.
+
+    Summary sections come from SQL aggregation; evidence rows are read and
+    written chunk_size at a time, so memory does not grow with the case.
+    """
+
+    if not filename.endswith(".html"):
+        filename += ".html"
+
+    esc = html.escape
+    case = storage.get_case_info(case_id) or {}
+    summary = storage.case_summary(case_id)
+
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write(f"""<html>
+    <head>
+        <title>TraceVector Case Report: {esc(case_id)}</title>
+        <style>{STYLE}        </style>
+    </head>
+    <body>
+        <h1>TraceVector Case Report</h1>
+        <p><strong>Case:</strong> {esc(case_id)}</p>
+        <p><strong>Opened:</strong> {esc(str(case.get("created_at", "")))}</p>
+        <p><strong>Generated:</strong> {datetime.utcnow().isoformat()} UTC</p>
+
+        <div class="box">
+            <h2>Summary</h2>
+            <p><strong>Evidence:</strong> {summary["evidence"]}</p>
+            <p><strong>Average score:</strong> {esc(str(summary["avg_score"]))}</p>
+            <p><strong>Max score:</strong> {esc(str(summary["max_score"]))}</p>
+        </div>
+""")
+        f.write(_count_table("Risk Levels", ["Level", "Evidence"], summary["levels"]))
+        f.write(_count_table("Top Flags", ["Flag", "Evidence"], summary["flags"]))
+        f.write(_count_table("Top Email Domains", ["Domain", "Evidence"], summary["domains"]))
+        f.write(_count_table("Top ASNs", ["ASN", "Organization", "Evidence"], summary["asns"]))
+
+        f.write("""
+        <div class="box">
+            <h2>Evidence</h2>
+            <table>
+<tr><th>ID</th><th>Created</th><th>Plugin</th><th>Target</th><th>Score</th><th>Level</th><th>Flags</th><th>Details</th></tr>
+""")
+
+        chunk = []
+        for row in storage.iter_evidence(case_id, chunk_size=chunk_size):
+            chunk.append(_evidence_row(row))
+            if len(chunk) >= chunk_size:
+                with span("report.write"):
+                    f.write("".join(chunk))
+                chunk = []
+        f.write("".join(chunk))
+
+        f.write("""            </table>
+        </div>
+    </body>
+</html>
+""")
+
+    return os.path.abspath(filename)
@@ -0,0 +1,297 @@
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+from tvx.config import get_key
+
+REPUTATION_INDEX_PATH = os.path.expanduser("~/.tracevector_reputation.idx")
+
+# Feed category -> result signal (see tvx.scoring.SIGNALS); the bit of
+# each category in a range's mask is its position here
+CATEGORIES = {
+    "tor_exit": "tor_exit",
+    "vpn": "vpn",
+    "blacklisted": "blacklisted",
+}
+ALIASES = {"tor": "tor_exit", "hosting": "vpn", "blacklist": "blacklisted", "block": "blacklisted"}
+
+# Seconds between checks of the index file for a newer compile
+RELOAD_INTERVAL = 5.0
+
+# magic, format version, IPv4 range count, IPv6 range count; then IPv4
+# starts, ends (uint32) and masks (uint8), then IPv6 starts, ends
+# (16 bytes big-endian each) and masks. Ranges are disjoint and sorted.
+_MAGIC = b"TVXR"
+_VERSION = 1
+_HEADER = struct.Struct("<4sIII")
+_IPV4 = struct.Struct("!I")
+
+
+# =====================================
+# Feed parsing
+# =====================================
+def category_name(name):
+    name = name.strip().lower()
+    name = ALIASES.get(name, name)
+    if name not in CATEGORIES:
+        raise ValueError(f"Unknown reputation category: {name}")
+    return name
+
+
+def _parse_range(text):
+    """
+    (version, start, end) as integers for "1.2.3.4", "1.2.3.0/24" or
+    "1.2.3.4-1.2.3.9". Raises ValueError on anything else.
+    """
+    import ipaddress
+
+    if "-" in text:
+        first, last = (ipaddress.ip_address(p.strip()) for p in text.split("-", 1))
+        if first.version != last.version or int(last) < int(first):
+            raise ValueError(f"Bad range: {text}")
+        return first.version, int(first), int(last)
+
+    network = ipaddress.ip_network(text, strict=False)
+    return network.version, int(network.network_address), int(network.broadcast_address)
+
+
+def read_feed(path):
+    """
+    Ranges from a feed file: one IP, CIDR or start-end range per line.
+    Comments (#), blank lines and extra columns are ignored; so are lines
+    that do not parse. Returns (ranges, skipped).
+    """
+    ranges = []
+    skipped = 0
+
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            # Tor bulk lists and similar put the address in the first column
+            text = line.split(",")[0].split()[0] if " - " not in line else line
+            try:
+                ranges.append(_parse_range(text))
+            except ValueError:
+                skipped += 1
+
+    return ranges, skipped
+
+
+def _segments(ranges):
+    """
+    Disjoint, sorted (start, end, mask) segments from possibly overlapping
+    (start, end, bit) ranges; adjacent segments with equal masks are merged.
+    """
+    events = []
+    for start, end, bit in ranges:
+        events.append((start, 1, bit))
+        events.append((end + 1, -1, bit))
+    events.sort()
+
+    counts = [0] * len(CATEGORIES)
+    segments = []
+    position = None
+    i = 0
+
+    while i < len(events):
+        point = events[i][0]
+        mask = sum(1 << b for b, n in enumerate(counts) if n)
+
+        if mask and position is not None and point > position:
+            if segments and segments[-1][1] + 1 == position and segments[-1][2] == mask:
+                segments[-1][1] = point - 1
+            else:
+                segments.append([position, point - 1, mask])
+
+        while i < len(events) and events[i][0] == point:
+            counts[events[i][2]] += events[i][1]
+            i += 1
+        position = point
+
+    return segments
+
+
+def compile_feeds(feeds, out=REPUTATION_INDEX_PATH):
+    """
+    Compile {category: [feed paths]} into a range index at out. The file is
+    written next to out and renamed into place, so running lookups switch
+    to it atomically. Returns {"v4": n, "v6": n, "skipped": n}.
+    """
+    bits = {name: i for i, name in enumerate(CATEGORIES)}
+    ranges = {4: [], 6: []}
+    skipped = 0
+
+    for category, paths in feeds.items():
+        bit = bits[category_name(category)]
+        for path in paths:
+            parsed, bad = read_feed(path)
+            skipped += bad
+            for version, start, end in parsed:
+                ranges[version].append((start, end, bit))
+
+    v4 = _segments(ranges[4])
+    v6 = _segments(ranges[6])
+
+    starts = array("I", (s for s, _, _ in v4))
+    ends = array("I", (e for _, e, _ in v4))
+    if sys.byteorder == "big":
+        starts.byteswap()
+        ends.byteswap()
+
+    tmp = out + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, len(v4), len(v6)))
+        f.write(starts.tobytes())
+        f.write(ends.tobytes())
+        f.write(bytes(m for _, _, m in v4))
+        f.write(b"".join(s.to_bytes(16, "big") for s, _, _ in v6))
+        f.write(b"".join(e.to_bytes(16, "big") for _, e, _ in v6))
+        f.write(bytes(m for _, _, m in v6))
+    os.replace(tmp, out)
+
+    return {"v4": len(v4), "v6": len(v6), "skipped": skipped}
+
+
+# =====================================
+# Lookup
+# =====================================
+class ReputationIndex:
+    """
+    In-memory copy of a compiled index. IPv4 ranges are uint32 arrays,
+    with a table of the first range per /16 so each bisect only covers a
+    handful of entries. IPv6 bounds are 16-byte big-endian strings, which
+    sort like the addresses they encode.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+        with open(path, "rb") as f:
+            data = f.read()
+            stat = os.fstat(f.fileno())
+
+        self.stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+        magic, version, n4, n6 = _HEADER.unpack_from(data, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"Not a tvx reputation index: {path}")
+
+        pos = _HEADER.size
+        self._starts4 = array("I", data[pos:pos + 4 * n4])
+        pos += 4 * n4
+        self._ends4 = array("I", data[pos:pos + 4 * n4])
+        pos += 4 * n4
+        if sys.byteorder == "big":
+            self._starts4.byteswap()
+            self._ends4.byteswap()
+        self._masks4 = data[pos:pos + n4]
+        pos += n4
+
+        # _first4[h]: index of the first range starting at or after h << 16
+        self._first4 = array("I", (bisect_left(self._starts4, h << 16) for h in range(65537)))
+
+        self._starts6 = [data[pos + 16 * i:pos + 16 * (i + 1)] for i in range(n6)]
+        pos += 16 * n6
+        self._ends6 = [data[pos + 16 * i:pos + 16 * (i + 1)] for i in range(n6)]
+        pos += 16 * n6
+        self._masks6 = data[pos:pos + n6]
+
+        self.counts = {"v4": n4, "v6": n6}
+
+    def mask(self, ip):
+        """
+        Category bitmask for ip (0 if unlisted or not an IP address).
+        """
+        if ":" not in ip:
+            try:
+                key = _IPV4.unpack(socket.inet_aton(ip))[0]
+            except OSError:
+                return 0
+
+            h = key >> 16
+            # Ranges starting in earlier /16s sort before _first4[h]
+            i = bisect_right(self._starts4, key, self._first4[h], self._first4[h + 1]) - 1
+            if i >= 0 and key <= self._ends4[i]:
+                return self._masks4[i]
+            return 0
+
+        try:
+            key = socket.inet_pton(socket.AF_INET6, ip.split("%", 1)[0])
+        except (OSError, ValueError):
+            return 0
+
+        i = bisect_right(self._starts6, key) - 1
+        if i >= 0 and key <= self._ends6[i]:
+            return self._masks6[i]
+        return 0
+
+    def lookup(self, ip):
+        """
+        Signal names set for ip, e.g. ["tor_exit"].
+        """
+        mask = self.mask(ip)
+        if not mask:
+            return []
+        return [signal for bit, signal in enumerate(CATEGORIES.values()) if mask >> bit & 1]
+
+
+_index = None
+_index_path = None
+_index_checked = 0.0
+_index_lock = threading.Lock()
+
+
+def _stamp(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def get_reputation_index():
+    """
+    The compiled reputation index (config key reputation_index), or None.
+    The file is re-checked every RELOAD_INTERVAL seconds and swapped in
+    when a new compile replaced it; lookups keep using the old copy
+    until the new one is fully loaded.
+    """
+    global _index, _index_path, _index_checked
+
+    now = time.monotonic()
+    if _index_path is not None and now - _index_checked < RELOAD_INTERVAL:
+        return _index
+
+    with _index_lock:
+        if _index_path is None:
+            _index_path = os.path.expanduser(get_key("reputation_index", REPUTATION_INDEX_PATH))
+
+        if now - _index_checked >= RELOAD_INTERVAL or _index_checked == 0.0:
+            stamp = _stamp(_index_path)
+            if stamp is None:
+                _index = None
+            elif _index is None or _index.stamp != stamp:
+                try:
+                    _index = ReputationIndex(_index_path)
+                except (OSError, ValueError, struct.error):
+                    pass
+            _index_checked = now
+
+    return _index
+
+
+def reputation_signals(ip):
+    """
+    Signal names (tor_exit, vpn, blacklisted) the local feeds list ip under.
+    """
+    index = get_reputation_index()
+    if index is None:
+        return []
+    return index.lookup(ip)
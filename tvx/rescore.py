@@ -0,0 +1,200 @@
+import json
+import time
+
+from tvx.scoring import _contribution, get_rules
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("Missing dependency: numpy (run: pip install numpy)")
+
+
+class _Container:
+    """
+    Stands in for a JSON array or object: rules only see its emptiness.
+    """
+
+    __slots__ = ("filled",)
+
+    def __init__(self, filled):
+        self.filled = filled
+
+    def __bool__(self):
+        return self.filled
+
+
+_EMPTY = _Container(False)
+_FILLED = _Container(True)
+
+
+def signal_matrix(rows, width=None):
+    """
+    (ids, values) arrays from select_signals() rows: ids is int64 of
+    shape (n,), values is an object array of shape (n, k) holding the
+    value at each rule path (None where missing). JSON booleans come back
+    as bools and arrays/objects as _Container, so every op sees the types
+    calculate_risk would.
+    """
+    _require_numpy()
+
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty((0, width or 0), dtype=object)
+
+    table = np.array(rows, dtype=object)
+    values, types = table[:, 1::2], table[:, 2::2]
+
+    values[types == "true"] = True
+    values[types == "false"] = False
+
+    containers = (types == "array") | (types == "object")
+    if containers.any():
+        empty = containers & ((values == "[]") | (values == "{}"))
+        values[empty] = _EMPTY
+        values[containers & ~empty] = _FILLED
+
+    return table[:, 0].astype(np.int64), values
+
+
+def _numbers(column):
+    numeric = np.frompyfunc(lambda v: v.__class__ in (int, float), 1, 1)(column).astype(bool)
+    return numeric, np.where(numeric, column, 0).astype(np.float64)
+
+
+def _rule_column(column, rule):
+    """
+    (fired, points) arrays for one rule over a column of raw values, with
+    the same semantics as the compiled evaluator.
+    """
+    op = rule["op"]
+
+    if op == "truthy" and column.dtype == bool:
+        fired = column
+    elif op == "truthy":
+        # None for missing keys; truthiness matches calculate_risk
+        column = column.copy()
+        column[column == None] = 0  # noqa: E711 (elementwise comparison)
+        fired = column.astype(bool)
+    elif op == "eq":
+        fired = (column == rule["value"]).astype(bool)
+    elif op == "in":
+        values = frozenset(rule["value"])
+        fired = np.frompyfunc(
+            lambda v: v.__class__ in (str, int, float) and v in values, 1, 1
+        )(column).astype(bool)
+    else:
+        numeric, numbers = _numbers(column)
+        if op == "gte":
+            fired = numeric & (numbers >= rule["value"])
+        elif op == "lte":
+            fired = numeric & (numbers <= rule["value"])
+        else:
+            points = np.rint(np.where(numeric & (numbers > 0), numbers, 0) * rule["weight"])
+            if "cap" in rule:
+                points = np.minimum(points, rule["cap"])
+            return points != 0, points
+
+    return fired, fired * float(_contribution(rule))
+
+
+def score_matrix(values, rules=None):
+    """
+    Vectorized calculate_risk over a (n, k) matrix of rule values (a bool
+    matrix works for truthy rules). Returns (scores, level codes, flag
+    bitmasks); level code i indexes level_names(rules).
+    """
+    _require_numpy()
+    rules = rules or get_rules()
+
+    fired = np.zeros(values.shape, dtype=bool)
+    points = np.zeros(values.shape, dtype=np.float64)
+    for i, rule in enumerate(rules.rules):
+        fired[:, i], points[:, i] = _rule_column(values[:, i], rule)
+
+    scores = np.maximum(points.sum(axis=1), 0)
+    if "max_score" in rules.spec:
+        scores = np.minimum(scores, rules.spec["max_score"])
+    if _integral(rules):
+        scores = scores.astype(np.int64)
+
+    bits = np.left_shift(1, np.arange(len(rules.rules), dtype=np.int64))
+    masks = fired.astype(np.int64) @ bits
+
+    codes = np.full(scores.shape, len(rules.levels), dtype=np.int8)
+    for i in range(len(rules.levels) - 1, -1, -1):
+        codes[scores >= rules.levels[i][0]] = i
+
+    return scores, codes, masks
+
+
+def _integral(rules):
+    # scale points are rounded, so only the other weights can make them fractional
+    numbers = [rule["weight"] for rule in rules.rules if rule["op"] != "scale"]
+    numbers += [rule["cap"] for rule in rules.rules if "cap" in rule]
+    numbers.append(rules.spec.get("max_score", 0))
+    return all(isinstance(n, int) for n in numbers)
+
+
+def level_names(rules=None):
+    rules = rules or get_rules()
+    return [level for _, level in rules.levels] + [rules.default_level]
+
+
+def rescore(storage, case_id=None, chunk_size=50000):
+    """
+    Re-score stored evidence (one case, or all when case_id is None) with
+    the active scoring rules and write the risk back in bulk.
+
+    Rule values are read with json_extract and scored a chunk at a time in
+    NumPy. Level and flags follow from the score and the bitmask of fired
+    rules, so each distinct (mask, score) is serialized once and reused.
+    """
+    _require_numpy()
+
+    rules = get_rules()
+    paths = [rule["path"] for rule in rules.rules]
+    names = level_names(rules)
+    encoded = {}
+
+    stats = {"rows": 0, "levels": {}}
+    started = time.perf_counter()
+    after_id = 0
+
+    with storage.batch(commit_every=chunk_size):
+        while True:
+            rows = storage.select_signals(paths, case_id=case_id, after_id=after_id, limit=chunk_size)
+            if not rows:
+                break
+
+            ids, values = signal_matrix(rows, len(paths))
+            scores, codes, masks = score_matrix(values, rules)
+            keys = list(zip(masks.tolist(), scores.tolist()))
+
+            for key in set(keys):
+                if key not in encoded:
+                    mask, score = key
+                    encoded[key] = json.dumps({
+                        "score": score,
+                        "level": rules.level(score),
+                        "flags": rules.flags_for_mask(mask)
+                    })
+
+            storage.set_risk_many(zip((encoded[k] for k in keys), ids.tolist()))
+
+            counts = np.bincount(codes, minlength=len(names))
+            for code, count in enumerate(counts.tolist()):
+                if count:
+                    stats["levels"][names[code]] = stats["levels"].get(names[code], 0) + count
+
+            stats["rows"] += len(rows)
+            after_id = int(ids[-1])
+
+    elapsed = time.perf_counter() - started
+    stats["elapsed_sec"] = round(elapsed, 3)
+    stats["rows_per_sec"] = round(stats["rows"] / elapsed, 1) if elapsed else 0.0
+
+    return stats
@@ -0,0 +1,170 @@
+import asyncio
+import threading
+
+from tvx.config import get_key
+from tvx.ratelimit import current_priority, get_limiter
+
+DEFAULT_CONCURRENCY = 100
+DEFAULT_TIMEOUT = 3.0
+
+
+class DNSEngine:
+    """
+    Asyncio DNS resolver with a concurrency cap, per-query timeouts and
+    per-name request coalescing. Queries go through the "dns" rate
+    limiter, which retries timeouts.
+
+    The engine owns an event loop running in a daemon thread, so blocking
+    callers (plugins, scan workers) can share it: concurrent lookups for the
+    same (name, rdtype) while one is in flight all await that single query.
+    """
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT,
+                 nameservers=None, port=53):
+        self.concurrency = max(1, int(concurrency))
+        self.timeout = float(timeout)
+        self.nameservers = list(nameservers or [])
+        self.port = int(port)
+
+        self.stats = {"queries": 0, "coalesced": 0, "errors": 0}
+
+        self._resolver = None
+        self._semaphore = None
+        self._inflight = {}
+        self._loop = None
+        self._lock = threading.Lock()
+
+    # =====================================
+    # Event loop
+    # =====================================
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=loop.run_forever,
+                    name="tvx-dns",
+                    daemon=True
+                )
+                thread.start()
+                self._loop = loop
+        return self._loop
+
+    def _submit(self, coro):
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    def close(self):
+        with self._lock:
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._loop = None
+
+    # =====================================
+    # Async API (runs on the engine loop)
+    # =====================================
+    def _get_resolver(self):
+        if self._resolver is None:
+            import dns.asyncresolver
+
+            if self.nameservers:
+                resolver = dns.asyncresolver.Resolver(configure=False)
+                resolver.nameservers = self.nameservers
+                resolver.port = self.port
+            else:
+                resolver = dns.asyncresolver.Resolver()
+
+            resolver.timeout = self.timeout
+            resolver.lifetime = self.timeout
+            self._resolver = resolver
+
+        return self._resolver
+
+    async def _query(self, name, rdtype):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+
+        async with self._semaphore:
+            self.stats["queries"] += 1
+            try:
+                return await self._get_resolver().resolve(
+                    name, rdtype, lifetime=self.timeout
+                )
+            except Exception:
+                self.stats["errors"] += 1
+                raise
+
+    async def _lookup(self, name, rdtype, level=None):
+        answer = await get_limiter("dns").call_async(self._query, name, rdtype, level=level)
+
+        if rdtype == "MX":
+            return [r.exchange.to_text() for r in answer]
+        return [r.to_text() for r in answer]
+
+    async def aresolve(self, name, rdtype="MX", level=None):
+        key = (name.lower().rstrip("."), rdtype)
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+        else:
+            task = asyncio.ensure_future(self._lookup(key[0], rdtype, level))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t, k=key: self._inflight.pop(k, None))
+
+        # shield: one cancelled waiter must not cancel the shared lookup
+        return await asyncio.shield(task)
+
+    async def aresolve_many(self, names, rdtype="MX", level=None):
+        unique = list(dict.fromkeys(n.lower().rstrip(".") for n in names))
+        answers = await asyncio.gather(
+            *(self.aresolve(n, rdtype, level) for n in unique),
+            return_exceptions=True
+        )
+        return dict(zip(unique, answers))
+
+    # =====================================
+    # Blocking API
+    # =====================================
+    # The engine loop runs in its own thread, so the caller's priority is
+    # passed along explicitly
+    def resolve(self, name, rdtype="MX"):
+        """
+        Resolve one name. Raises the resolver exception on failure, or
+        ratelimit.Throttled if every attempt timed out.
+        """
+        return self._submit(self.aresolve(name, rdtype, current_priority()))
+
+    def resolve_many(self, names, rdtype="MX"):
+        """
+        Resolve many names concurrently, one query per distinct name.
+        Returns {name: answers or Exception}.
+        """
+        return self._submit(self.aresolve_many(names, rdtype, current_priority()))
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """
+    Shared engine configured from tvx config keys:
+    dns_concurrency, dns_timeout, dns_nameservers (comma-separated), dns_port.
+    """
+    global _engine
+
+    with _engine_lock:
+        if _engine is None:
+            nameservers = get_key("dns_nameservers", "")
+            if isinstance(nameservers, str):
+                nameservers = [n.strip() for n in nameservers.split(",") if n.strip()]
+
+            _engine = DNSEngine(
+                concurrency=get_key("dns_concurrency", DEFAULT_CONCURRENCY),
+                timeout=get_key("dns_timeout", DEFAULT_TIMEOUT),
+                nameservers=nameservers,
+                port=get_key("dns_port", 53)
+            )
+
+    return _engine
@@ -0,0 +1,277 @@
+import queue
+import signal
+import threading
+import time
+
+from tvx.config import get_key
+from tvx.profiling import count, span
+
+# Defaults for the sandbox_timeout (seconds per plugin call) and
+# sandbox_memory_mb (address space per worker, 0 = unlimited) config keys
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_MEMORY_MB = 1024
+
+# How long close() gives an idle worker to exit before killing it
+EXIT_GRACE = 2.0
+
+# Imported once in the fork server, so each worker forks with them loaded
+PRELOAD = ["tvx.plugin_loader", "tvx.plugin_security", "tvx.sandbox"]
+
+
+class SandboxError(RuntimeError):
+    """
+    A sandboxed plugin call that produced no result: status is "timeout",
+    "memory", "crashed" or "error". record(target) is the structured
+    result written in place of the scan.
+    """
+
+    def __init__(self, status, command, message, elapsed):
+        super().__init__(message)
+        self.status = status
+        self.command = command
+        self.elapsed = elapsed
+
+    def record(self, target):
+        return {
+            "target": target,
+            "error": str(self),
+            "sandbox": {
+                "status": self.status,
+                "plugin": self.command,
+                "elapsed_sec": round(self.elapsed, 3),
+            },
+        }
+
+
+# =====================================
+# Worker process
+# =====================================
+def _limit_memory(memory_mb):
+    import resource
+
+    limit = int(memory_mb) * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _load(command, plugins, pins):
+    """
+    The plugin for command, its file checked against the pins the first
+    time this worker loads it.
+    """
+    from tvx.plugin_loader import get_plugin, plugin_file
+    from tvx.plugin_security import verify_file
+
+    plugin = plugins.get(command)
+    if plugin is None:
+        found = plugin_file(command)
+        if found is None:
+            raise RuntimeError(f"Unknown plugin: {command}")
+        verify_file(*found, pins)
+
+        plugin = plugins[command] = get_plugin(command)
+    return plugin
+
+
+def _worker(conn, memory_mb):
+    """
+    Serve (command, target) requests from conn until it closes: reply
+    ("ok", result) or (status, message).
+    """
+    from tvx.plugin_security import read_pins
+
+    # Ctrl-C is the parent's to handle; it kills workers on the way out
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if memory_mb:
+        _limit_memory(memory_mb)
+
+    plugins = {}
+    try:
+        pins = read_pins()
+    except RuntimeError as e:
+        pins = e
+
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            return
+        if request is None:
+            return
+
+        command, target = request
+        try:
+            if isinstance(pins, Exception):
+                raise pins
+            reply = ("ok", _load(command, plugins, pins).run(target))
+        except MemoryError:
+            reply = ("memory", f"{command} exceeded the {memory_mb} MB memory limit")
+        except Exception as e:
+            reply = ("error", str(e) or type(e).__name__)
+
+        try:
+            conn.send(reply)
+        except MemoryError:
+            conn.send(("memory", f"{command} exceeded the {memory_mb} MB memory limit"))
+        except Exception as e:
+            # Unpicklable result
+            conn.send(("error", f"{command} returned an unsendable result: {e}"))
+
+
+# =====================================
+# Pool
+# =====================================
+class _Worker:
+
+    def __init__(self, context, memory_mb):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_worker, args=(child, memory_mb), daemon=True)
+        self.process.start()
+        child.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(EXIT_GRACE)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class SandboxPool:
+    """
+    Pre-forked worker processes that run plugins on behalf of this one.
+
+    Each call goes to an idle worker over a pipe and gets timeout seconds
+    of wall-clock time; a worker that overruns, crashes or hits its
+    memory limit is killed and replaced, and the call raises SandboxError
+    instead of hanging. Workers are forked from a single-threaded fork
+    server, so respawning from a busy threaded parent is safe, and each
+    worker verifies a plugin's file against the pins before its first
+    import of it.
+    """
+
+    def __init__(self, workers=4, timeout=None, memory_mb=None):
+        import multiprocessing
+
+        self.timeout = float(timeout if timeout is not None else get_key("sandbox_timeout", DEFAULT_TIMEOUT))
+        self.memory_mb = int(memory_mb if memory_mb is not None else get_key("sandbox_memory_mb", DEFAULT_MEMORY_MB))
+
+        self._context = multiprocessing.get_context("forkserver")
+        self._context.set_forkserver_preload(PRELOAD)
+
+        self._lock = threading.Lock()
+        self.counts = {"calls": 0, "ok": 0, "errors": 0, "timeouts": 0, "memory": 0, "crashed": 0, "respawns": 0}
+
+        self._idle = queue.Queue()
+        self._workers = set()
+        for _ in range(max(1, workers)):
+            self._spawn()
+
+    def _spawn(self):
+        worker = _Worker(self._context, self.memory_mb)
+        with self._lock:
+            self._workers.add(worker)
+        self._idle.put(worker)
+
+    def _replace(self, worker):
+        worker.kill()
+        with self._lock:
+            self._workers.discard(worker)
+            self.counts["respawns"] += 1
+        self._spawn()
+
+    def _record(self, key):
+        with self._lock:
+            self.counts[key] += 1
+
+    def run(self, command, target, timeout=None):
+        """
+        Result of plugin command on target in a worker. Raises SandboxError
+        if it timed out, ran out of memory, crashed or raised.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        worker = self._idle.get()
+        started = time.perf_counter()
+        self._record("calls")
+
+        try:
+            with span("sandbox.run"):
+                worker.conn.send((command, target))
+                if worker.conn.poll(timeout):
+                    status, value = worker.conn.recv()
+                else:
+                    status, value = "timeout", f"{command} timed out after {timeout}s"
+        except (EOFError, OSError):
+            status, value = "crashed", f"{command} worker died ({_exit_reason(worker.process)})"
+
+        elapsed = time.perf_counter() - started
+
+        if status == "ok":
+            self._idle.put(worker)
+            self._record("ok")
+            return value
+
+        if status == "error":
+            self._idle.put(worker)
+            self._record("errors")
+        else:
+            # Stuck, dead or out of memory: never reuse it
+            self._replace(worker)
+            self._record("timeouts" if status == "timeout" else status)
+            count(f"sandbox.{status}")
+
+        raise SandboxError(status, command, value, elapsed)
+
+    def plugin(self, command):
+        return SandboxedPlugin(self, command)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counts)
+            stats["workers"] = len(self._workers)
+        return stats
+
+    def close(self):
+        with self._lock:
+            workers, self._workers = list(self._workers), set()
+        for worker in workers:
+            worker.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class SandboxedPlugin:
+    """
+    run(target) through a SandboxPool, in place of a PluginHandle. Has no
+    run_many, so every target gets its own deadline.
+    """
+
+    def __init__(self, pool, command):
+        self.pool = pool
+        self.command = command
+
+    def run(self, target):
+        return self.pool.run(self.command, target)
+
+
+def _exit_reason(process):
+    process.join(0.1)
+    code = process.exitcode
+    if code is None:
+        return "still running"
+    if code < 0:
+        return f"signal {signal.Signals(-code).name}"
+    return f"exit code {code}"
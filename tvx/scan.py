@@ -0,0 +1,216 @@
+import csv
+import json
+import os
+import sys
+import time
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from tvx import profiling
+from tvx.profiling import span
+from tvx.ratelimit import BULK, limiter_stats, priority
+from tvx.sandbox import SandboxError
+from tvx.scoring import calculate_risk, get_rules
+
+
+def read_targets(path: str):
+    """
+    Stream targets from a .txt, .csv or .jsonl file, one at a time.
+    """
+
+    ext = os.path.splitext(path)[1].lower()
+
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if ext == ".csv":
+            reader = csv.reader(f)
+            column = 0
+            first = True
+
+            for row in reader:
+                if not row:
+                    continue
+
+                # Header row: use the "target" column if there is one
+                if first:
+                    first = False
+                    header = [cell.strip().lower() for cell in row]
+                    if "target" in header:
+                        column = header.index("target")
+                        continue
+
+                if column < len(row) and row[column].strip():
+                    yield row[column].strip()
+
+        elif ext in (".jsonl", ".ndjson"):
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+
+                item = json.loads(line)
+                if isinstance(item, dict):
+                    item = item.get("target")
+                if item:
+                    yield str(item).strip()
+
+        else:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    yield line
+
+
+def _score(target, result):
+    try:
+        return {"target": target, "scan": result, "risk": calculate_risk(result)}
+    except Exception as e:
+        return {"target": target, "error": str(e)}
+
+
+def _scan_batch(plugin, batch):
+    # Bulk work yields upstream capacity to interactive lookups
+    with priority(BULK):
+        if len(batch) > 1 and hasattr(plugin, "run_many"):
+            with span("plugin.run_many"):
+                results = plugin.run_many(batch)
+        else:
+            results = []
+            for target in batch:
+                with span("plugin.run"):
+                    results.append(plugin.run(target))
+
+    # One span per batch: scoring takes microseconds per target
+    with span("scoring"):
+        return [_score(t, r) for t, r in zip(batch, results)]
+
+
+def _batches(targets, size):
+    it = iter(targets)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+def run_scan(plugin, targets, out, workers: int = 8, max_pending: int = None,
+             batch_size: int = None) -> dict:
+    """
+    Run plugin.run + calculate_risk over targets on a bounded thread pool.
+
+    At most max_pending batches are in flight at any time, so memory stays
+    flat no matter how large the input is. Plugins exposing run_many() get
+    whole batches (default 256 targets) so they can share lookups; others
+    get one target per task. Results are written to out as NDJSON in
+    completion order.
+    """
+
+    workers = max(1, workers)
+    max_pending = max_pending or workers * 4
+
+    if batch_size is None:
+        batch_size = 256 if hasattr(plugin, "run_many") else 1
+
+    stats = {"targets": 0, "ok": 0, "errors": 0}
+    levels = {}
+    started = time.perf_counter()
+
+    def emit(record):
+        out.write(json.dumps(record) + "\n")
+
+    def drain(done):
+        for future in done:
+            batch = pending.pop(future)
+            try:
+                records = future.result()
+            except SandboxError as e:
+                records = [e.record(t) for t in batch]
+            except Exception as e:
+                records = [{"target": t, "error": str(e)} for t in batch]
+
+            for record in records:
+                if "error" in record:
+                    stats["errors"] += 1
+                else:
+                    stats["ok"] += 1
+                    level = record["risk"]["level"]
+                    levels[level] = levels.get(level, 0) + 1
+                emit(record)
+
+        profiling.maybe_write_metrics()
+
+    pending = {}
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for batch in _batches(targets, batch_size):
+            # Backpressure: wait for a slot before reading further
+            if len(pending) >= max_pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                drain(done)
+
+            pending[pool.submit(_scan_batch, plugin, batch)] = batch
+            stats["targets"] += len(batch)
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            drain(done)
+
+    out.flush()
+
+    elapsed = time.perf_counter() - started
+    stats["elapsed_sec"] = round(elapsed, 3)
+    stats["targets_per_sec"] = round(stats["targets"] / elapsed, 1) if elapsed else 0.0
+    stats["levels"] = levels
+
+    return stats
+
+
+def print_summary(stats: dict, stream=sys.stderr):
+    print("\n=== Scan Summary ===", file=stream)
+    print(f"Targets:    {stats['targets']}", file=stream)
+    print(f"Succeeded:  {stats['ok']}", file=stream)
+    print(f"Errors:     {stats['errors']}", file=stream)
+    print(f"Elapsed:    {stats['elapsed_sec']}s", file=stream)
+    print(f"Throughput: {stats['targets_per_sec']} targets/s", file=stream)
+
+    for level, count in sorted(stats["levels"].items()):
+        print(f"  {level}: {count}", file=stream)
+
+    sandbox = stats.get("sandbox")
+    if sandbox:
+        print(f"Sandbox:    {sandbox['workers']} workers, {sandbox['timeouts']} timeouts, "
+              f"{sandbox['memory']} over memory, {sandbox['crashed']} crashed, "
+              f"{sandbox['respawns']} respawns", file=stream)
+
+    print_rules(stream)
+    print_upstreams(stream)
+
+
+def print_rules(stream=sys.stderr):
+    """
+    Per-rule hit counts (and sampled cost) of the active scoring rules.
+    """
+    rules = get_rules().stats()
+    if not rules["calls"]:
+        return
+
+    print(f"Rules ({rules['source']}):", file=stream)
+    for rule in rules["rules"]:
+        cost = f", {rule['mean_ns']} ns" if rule["mean_ns"] is not None else ""
+        print(f"  {rule['name']}: {rule['hits']} hits ({rule['hit_rate']:.1%}){cost}", file=stream)
+
+
+def print_upstreams(stream=sys.stderr):
+    """
+    Per-source request and throttling counts from the rate limiters.
+    """
+    upstreams = limiter_stats()
+    if not upstreams:
+        return
+
+    print("Upstreams:", file=stream)
+    for source, s in sorted(upstreams.items()):
+        rate = f", {s['ok_per_sec']}/s" if s["ok_per_sec"] else ""
+        print(f"  {source}: {s['ok']} ok{rate}, {s['rate_limited']} rate limited, "
+              f"{s['timeouts']} timeouts, {s['retries']} retries, {s['throttled']} throttled, "
+              f"{s['wait_sec']}s waiting", file=stream)
@@ -0,0 +1,425 @@
+import json
+import os
+import re
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from http.server import BaseHTTPRequestHandler, HTTPServer, ThreadingHTTPServer
+from socketserver import ThreadingMixIn
+
+from tvx import profiling
+from tvx.plugin_loader import get_plugin, list_plugins, plugin_file
+from tvx.profiling import span
+from tvx.ratelimit import limiter_stats
+from tvx.sandbox import SandboxError
+from tvx.scoring import calculate_risk, get_rules
+from tvx.storage.manager import get_storage
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8787
+DEFAULT_TIMEOUT = 10.0
+
+# Extra request time with --sandbox, so a plugin call that hits the same
+# timeout in its worker reports its own structured error first
+SANDBOX_GRACE = 0.5
+
+# Largest accepted request body (bytes)
+MAX_BODY = 10 * 1024 * 1024
+
+# Largest accepted targets list for one /scan request
+MAX_TARGETS = 10000
+
+
+class RequestError(Exception):
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Server:
+    """
+    Request handling shared by the HTTP and Unix-socket transports.
+    Plugins, caches and the storage connection are loaded once and reused;
+    each request runs on a bounded worker pool with a deadline.
+    """
+
+    def __init__(self, workers=16, timeout=DEFAULT_TIMEOUT, storage=None, sandbox=None):
+        self.timeout = timeout
+        self.sandbox = sandbox
+        self.workers = workers
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tvx-serve")
+        self.storage = storage or get_storage()
+        self.started = time.time()
+
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "timeouts": 0, "inflight": 0, "rejected": 0}
+
+        # Timed-out requests whose call is still running: each holds a pool
+        # thread until it returns (only a sandbox worker can be killed)
+        self._abandoned = set()
+
+        self.routes = {
+            ("POST", "/scan"): self.scan,
+            ("POST", "/score"): self.score,
+            ("POST", "/case/add"): self.case_add,
+            ("GET", "/health"): self.health,
+        }
+
+    def warm(self, commands=None):
+        """
+        Import plugins (all of them by default) and open the lookup caches
+        before the first request arrives.
+        """
+        from tvx.cache import get_cache
+        from tvx.netcache import get_network_cache
+
+        loaded = []
+        for command in commands or [p["command"] for p in list_plugins()]:
+            # Sandboxed plugins are imported by the workers, not here
+            if self.sandbox is not None:
+                if plugin_file(command) is not None:
+                    loaded.append(command)
+                continue
+            try:
+                if get_plugin(command) is not None:
+                    loaded.append(command)
+            except RuntimeError as e:
+                print(f"[!] {e}", file=sys.stderr)
+
+        get_cache()
+        get_network_cache()
+        return loaded
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        if self.sandbox is not None:
+            self.sandbox.close()
+
+    # =====================================
+    # Dispatch
+    # =====================================
+    def handle(self, method, path, body):
+        """
+        (status, payload) for one request. payload is a dict (sent as JSON)
+        or a str (sent as text).
+        """
+        path = path.split("?", 1)[0].rstrip("/") or "/"
+
+        with self._lock:
+            self.stats["requests"] += 1
+
+        if method == "GET" and path == "/metrics":
+            return 200, self.metrics()
+
+        route = self.routes.get((method, path))
+        if route is None:
+            if any(p == path for _, p in self.routes):
+                return self._error(405, f"Method {method} not allowed")
+            return self._error(404, f"Unknown endpoint: {path}")
+
+        try:
+            request = json.loads(body) if body else {}
+        except ValueError as e:
+            return self._error(400, f"Invalid JSON: {e}")
+        if not isinstance(request, dict):
+            return self._error(400, "Request body must be a JSON object")
+
+        with self._lock:
+            if len(self._abandoned) >= self.workers:
+                self.stats["rejected"] += 1
+                stuck = True
+            else:
+                self.stats["inflight"] += 1
+                stuck = False
+        if stuck:
+            return self._error(503, "Every worker is held by a timed-out request; retry later "
+                                    "(serve --sandbox kills stuck plugin calls)")
+
+        try:
+            with span(f"serve.{path.strip('/').replace('/', '.') or 'root'}"):
+                future = self.pool.submit(route, request)
+                return 200, future.result(timeout=self.timeout + (SANDBOX_GRACE if self.sandbox else 0))
+        except TimeoutError:
+            # cancel() only stops a request still waiting for a thread
+            if not future.cancel():
+                self._abandon(future)
+            with self._lock:
+                self.stats["timeouts"] += 1
+            return self._error(504, f"Request exceeded {self.timeout}s")
+        except RequestError as e:
+            return self._error(e.status, str(e))
+        except SandboxError as e:
+            status, payload = self._error(504 if e.status == "timeout" else 502, str(e))
+            payload["sandbox"] = e.record(None)["sandbox"]
+            return status, payload
+        except Exception as e:
+            return self._error(500, f"{type(e).__name__}: {e}")
+        finally:
+            with self._lock:
+                self.stats["inflight"] -= 1
+
+    def _abandon(self, future):
+        with self._lock:
+            self._abandoned.add(future)
+
+        def finished(f):
+            with self._lock:
+                self._abandoned.discard(f)
+
+        # Runs at once if the call finished in the meantime
+        future.add_done_callback(finished)
+
+    def _error(self, status, message):
+        with self._lock:
+            self.stats["errors"] += 1
+        return status, {"error": message}
+
+    # =====================================
+    # Endpoints
+    # =====================================
+    def _plugin(self, request):
+        name = request.get("plugin")
+        if not name:
+            raise RequestError(400, "Missing 'plugin'")
+
+        if self.sandbox is not None:
+            if plugin_file(name) is None:
+                raise RequestError(404, f"Unknown plugin: {name}")
+            return name, self.sandbox.plugin(name)
+
+        try:
+            plugin = get_plugin(name)
+        except RuntimeError as e:
+            raise RequestError(500, str(e))
+        if plugin is None:
+            raise RequestError(404, f"Unknown plugin: {name}")
+
+        return name, plugin
+
+    def _run(self, plugin, targets):
+        with span("plugin.run"):
+            if len(targets) > 1 and hasattr(plugin, "run_many"):
+                results = plugin.run_many(targets)
+            else:
+                results = [plugin.run(t) for t in targets]
+
+        with span("scoring"):
+            return [(r, calculate_risk(r) if r is not None else None) for r in results]
+
+    def scan(self, request):
+        """
+        {"plugin": "email", "target": "a@b.c"} or {"plugin": ..., "targets": [...]};
+        with "case", results are also stored as evidence.
+        """
+        name, plugin = self._plugin(request)
+
+        if "targets" in request:
+            targets = request["targets"]
+            if not isinstance(targets, list) or not all(isinstance(t, str) for t in targets):
+                raise RequestError(400, "'targets' must be a list of strings")
+            if len(targets) > MAX_TARGETS:
+                raise RequestError(413, f"At most {MAX_TARGETS} targets per request")
+        elif isinstance(request.get("target"), str):
+            targets = [request["target"]]
+        else:
+            raise RequestError(400, "Missing 'target' or 'targets'")
+
+        scored = self._run(plugin, targets)
+
+        case_id = request.get("case")
+        if case_id:
+            self.storage.add_evidence_many(case_id, [
+                (name, t, result, risk)
+                for t, (result, risk) in zip(targets, scored) if result is not None
+            ])
+
+        if "targets" in request:
+            return {"results": [{"scan": r, "risk": k} for r, k in scored]}
+        return {"scan": scored[0][0], "risk": scored[0][1]}
+
+    def score(self, request):
+        """
+        {"result": {...}}: risk for an already collected scan result.
+        """
+        result = request.get("result")
+        if not isinstance(result, dict):
+            raise RequestError(400, "'result' must be an object")
+
+        with span("scoring"):
+            return calculate_risk(result)
+
+    def case_add(self, request):
+        """
+        {"case": ID, "plugin": P, "target": T} runs the plugin and stores the
+        evidence; pass "result" to store an existing result instead.
+        """
+        case_id = request.get("case")
+        target = request.get("target")
+        if not case_id or not isinstance(target, str):
+            raise RequestError(400, "Missing 'case' or 'target'")
+
+        if isinstance(request.get("result"), dict):
+            name = request.get("plugin") or "external"
+            result = request["result"]
+            with span("scoring"):
+                risk = calculate_risk(result)
+        else:
+            name, plugin = self._plugin(request)
+            result, risk = self._run(plugin, [target])[0]
+            if result is None:
+                raise RequestError(422, f"Plugin '{name}' returned no result")
+
+        self.storage.add_evidence(case_id, name, target, result, risk)
+        return {"case": case_id, "plugin": name, "target": target, "scan": result, "risk": risk}
+
+    def health(self, request):
+        return {"status": "ok", "uptime_sec": round(time.time() - self.started, 3)}
+
+    def metrics(self):
+        from tvx.cache import get_cache
+
+        with self._lock:
+            extra = {f"tvx_serve_{k}": v for k, v in self.stats.items()}
+            extra["tvx_serve_abandoned"] = len(self._abandoned)
+        extra["tvx_serve_uptime_seconds"] = round(time.time() - self.started, 3)
+
+        for source, s in limiter_stats().items():
+            for key, value in s.items():
+                if value is not None:
+                    extra[f"tvx_ratelimit_{source}_{key}"] = value
+
+        if self.sandbox is not None:
+            for key, value in self.sandbox.stats().items():
+                extra[f"tvx_sandbox_{key}"] = value
+
+        rules = get_rules().stats()
+        extra["tvx_scoring_calls"] = rules["calls"]
+        for rule in rules["rules"]:
+            name = re.sub(r"\W", "_", rule["name"])
+            extra[f"tvx_scoring_rule_{name}_hits"] = rule["hits"]
+            if rule["mean_ns"] is not None:
+                extra[f"tvx_scoring_rule_{name}_mean_ns"] = rule["mean_ns"]
+
+        # In-memory counters only: cache.stats() writes and scans the table
+        cache = get_cache()
+        if cache is not None:
+            for source, (hits, misses) in cache.counters().items():
+                extra[f"tvx_cache_{source}_hits"] = hits
+                extra[f"tvx_cache_{source}_misses"] = misses
+
+        return profiling.prometheus(extra)
+
+
+# =====================================
+# Transports
+# =====================================
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "tvx"
+
+    # Seconds an idle or slow client may hold a connection
+    timeout = 30
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out as separate writes; without this, Nagle
+        # plus delayed ACKs add ~40ms to every keep-alive response
+        if self.server.address_family != socket.AF_UNIX:
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _respond(self, status, payload):
+        if isinstance(payload, str):
+            data = payload.encode()
+            content_type = "text/plain; version=0.0.4"
+        else:
+            data = json.dumps(payload, default=str).encode()
+            content_type = "application/json"
+
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _dispatch(self, method):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY:
+            self.close_connection = True
+            self._respond(413, {"error": f"Body larger than {MAX_BODY} bytes"})
+            return
+
+        body = self.rfile.read(length) if length else b""
+        self._respond(*self.server.app.handle(method, self.path, body))
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def address_string(self):
+        # Unix-socket peers have no (host, port)
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class UnixHTTPServer(ThreadingMixIn, HTTPServer):
+    address_family = socket.AF_UNIX
+    daemon_threads = True
+
+    def server_bind(self):
+        # A socket file left by a previous run would make bind() fail
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        super().server_bind()
+        os.chmod(self.server_address, 0o600)
+        self.server_name = "localhost"
+        self.server_port = 0
+
+
+def make_server(app, host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None, verbose=False):
+    if socket_path:
+        httpd = UnixHTTPServer(socket_path, Handler)
+    else:
+        httpd = ThreadingHTTPServer((host, port), Handler)
+
+    httpd.app = app
+    httpd.verbose = verbose
+    return httpd
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None, workers=16,
+          timeout=DEFAULT_TIMEOUT, plugins=None, verbose=False, sandbox=False):
+    """
+    Run the JSON API until interrupted. With sandbox, plugins run in a
+    SandboxPool of workers processes, each call limited to timeout.
+    """
+    profiling.enable()
+
+    pool = None
+    if sandbox:
+        from tvx.sandbox import SandboxPool
+        pool = SandboxPool(workers=workers, timeout=timeout)
+
+    app = Server(workers=workers, timeout=timeout, sandbox=pool)
+    loaded = app.warm(plugins)
+    httpd = make_server(app, host, port, socket_path, verbose)
+
+    where = socket_path or f"http://{host}:{httpd.server_port}"
+    print(f"[✓] Serving on {where} (plugins: {', '.join(loaded) or 'none'})", file=sys.stderr)
+
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        app.close()
+        if socket_path and os.path.exists(socket_path):
+            os.unlink(socket_path)
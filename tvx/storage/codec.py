@@ -0,0 +1,158 @@
+import re
+import struct
+import threading
+import zlib
+from collections import Counter
+from datetime import datetime
+
+# Encoded values are BLOBs: a format version byte, then per format:
+#   1: dictionary id (uint32 LE) + raw deflate using that dictionary
+# Plain JSON is stored as TEXT and passes through unchanged, so rows
+# written before compression was enabled still read.
+FORMAT_ZDICT = 1
+_ZDICT_HEADER = struct.Struct("<BI")
+
+# zlib only uses the last 32KB of a preset dictionary
+DICT_SIZE = 32 * 1024
+DEFAULT_LEVEL = 6
+
+# Encoded values up to this size (typically risk JSON, of which there are
+# only a few distinct ones) have their decoded text memoized
+MEMO_MAX_BYTES = 64
+MEMO_ENTRIES = 4096
+
+# JSON fragments a dictionary is built from: a string (with its key colon
+# and a short scalar value when there is one) or a run of punctuation
+_FRAGMENT_RE = re.compile(
+    r'"(?:[^"\\]|\\.)*"(?:\s*:\s*(?:"(?:[^"\\]|\\.){0,64}"|-?\d+(?:\.\d+)?|true|false|null|\[\]|\{\}))?'
+    r'|[\[\]{},:\s]{2,}'
+)
+
+
+def train_dictionary(samples, size=DICT_SIZE):
+    """
+    Preset dictionary from sample JSON texts: the fragments that save the
+    most bytes (count x length) that fit in size, most valuable last,
+    where deflate finds them at the shortest distance.
+    """
+    counts = Counter()
+    for text in samples:
+        counts.update(_FRAGMENT_RE.findall(text))
+
+    ranked = sorted(
+        (f for f, n in counts.items() if n > 1),
+        key=lambda f: counts[f] * len(f),
+        reverse=True
+    )
+
+    chosen = []
+    total = 0
+    for fragment in ranked:
+        data = fragment.encode()
+        if total + len(data) > size:
+            continue
+        chosen.append(data)
+        total += len(data)
+
+    return b"".join(reversed(chosen))
+
+
+class Codec:
+    """
+    Encodes result/risk JSON for one evidence database. Dictionaries live in
+    its codec_dicts table and are loaded on first use; ids written by other
+    processes are picked up when first seen.
+    """
+
+    def __init__(self, conn, level=DEFAULT_LEVEL):
+        self.conn = conn
+        self.level = level
+        self._dicts = {}
+        self._current = None
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._memo = {}
+        # Header bytes of an encoded value -> its dictionary, so decode skips
+        # parsing the version and dictionary id of every row
+        self._headers = {}
+
+    def _load(self):
+        with self._lock:
+            for dict_id, data in self.conn.execute("SELECT id, data FROM codec_dicts ORDER BY id"):
+                self._dicts[dict_id] = bytes(data)
+                self._current = dict_id
+            self._loaded = True
+
+    def current(self):
+        """
+        Id of the newest dictionary, or None if none was trained.
+        """
+        if not self._loaded:
+            self._load()
+        return self._current
+
+    def add_dictionary(self, data, samples=0):
+        cur = self.conn.execute(
+            "INSERT INTO codec_dicts (data, samples, created_at) VALUES (?, ?, ?)",
+            (data, samples, datetime.utcnow().isoformat())
+        )
+        with self._lock:
+            self._dicts[cur.lastrowid] = data
+            self._current = cur.lastrowid
+        return cur.lastrowid
+
+    def encode(self, text, dict_id=None):
+        """
+        Compressed BLOB for a JSON text, or the text itself when there is no
+        dictionary or compression would not make it smaller.
+        """
+        dict_id = dict_id or self.current()
+        if dict_id is None:
+            return text
+
+        data = text.encode()
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15, zdict=self._dicts[dict_id])
+        packed = _ZDICT_HEADER.pack(FORMAT_ZDICT, dict_id) + compressor.compress(data) + compressor.flush()
+
+        return packed if len(packed) < len(data) else text
+
+    def decode(self, value):
+        """
+        JSON text for a stored result/risk value (TEXT or encoded BLOB).
+        """
+        if value.__class__ is str or value is None:
+            return value
+
+        small = len(value) <= MEMO_MAX_BYTES
+        if small:
+            text = self._memo.get(value)
+            if text is not None:
+                return text
+
+        size = _ZDICT_HEADER.size
+        zdict = self._headers.get(value[:size])
+        if zdict is None:
+            zdict = self._header(bytes(value[:size]))
+
+        # A complete raw deflate stream decodes fully without flush()
+        text = zlib.decompressobj(-15, zdict=zdict).decompress(value[size:]).decode()
+
+        if small:
+            if len(self._memo) >= MEMO_ENTRIES:
+                self._memo.clear()
+            self._memo[bytes(value)] = text
+
+        return text
+
+    def _header(self, header):
+        version, dict_id = _ZDICT_HEADER.unpack(header)
+        if version != FORMAT_ZDICT:
+            raise ValueError(f"Unknown evidence encoding version: {version}")
+
+        zdict = self._dicts.get(dict_id)
+        if zdict is None:
+            self._load()
+            zdict = self._dicts[dict_id]
+
+        self._headers[header] = zdict
+        return zdict
@@ -1,96 +1,1041 @@
 import sqlite3
 import json
 import os
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 
+from tvx.config import get_key
+from tvx.entities import ENTITY_TYPES, extract_entities, normalize_entity
+from tvx.profiling import span
+from tvx.scoring import calculate_risk, flag_mask
+from tvx.storage.base import BaseStorage
+from tvx.storage.codec import Codec, train_dictionary
+from tvx.utils import classify_target
+
 DB_PATH = os.path.expanduser("~/.tracevector_cases.db")
 
+# Seconds a writer waits on a locked database before giving up
+BUSY_TIMEOUT = 30
+
+# Columns copied out of the risk JSON (and the target) on insert, so
+# filters and aggregates never parse JSON
+RISK_COLUMNS = ("score", "level", "flags", "target_type")
+
+_initialized = set()
+_init_lock = threading.Lock()
 
-def _connect():
-    conn = sqlite3.connect(DB_PATH)
+
+def _connect(path=DB_PATH):
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT * 1000}")
     return conn
 
 
-def _init():
-    conn = _connect()
-    cur = conn.cursor()
+def _init(conn, path=DB_PATH):
+    # Schema DDL runs once per database per process
+    with _init_lock:
+        if path in _initialized:
+            return
 
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS cases (
-            id TEXT PRIMARY KEY,
-            created_at TEXT
-        )
+        cur = conn.cursor()
+
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS cases (
+                id TEXT PRIMARY KEY,
+                created_at TEXT
+            )
+        """)
+
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS evidence (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                case_id TEXT,
+                plugin TEXT,
+                target TEXT,
+                result TEXT,
+                risk TEXT,
+                created_at TEXT
+            )
+        """)
+
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_evidence_case_created
+            ON evidence (case_id, created_at)
+        """)
+
+        conn.commit()
+
+        _migrate(conn)
+
+        _initialized.add(path)
+
+
+# =====================================
+# Migrations
+# =====================================
+def _risk_columns(conn):
+    """
+    Add score/level/flags/target_type and backfill them from stored rows.
+    """
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(evidence)")}
+
+    for name, kind in (("score", "INTEGER"), ("level", "TEXT"), ("flags", "INTEGER"), ("target_type", "TEXT")):
+        if name not in columns:
+            conn.execute(f"ALTER TABLE evidence ADD COLUMN {name} {kind}")
+
+    conn.create_function(
+        "tvx_flag_mask", 1,
+        lambda risk: flag_mask(json.loads(risk or "{}").get("flags") or []),
+        deterministic=True
+    )
+    conn.create_function("tvx_target_type", 1, classify_target, deterministic=True)
+
+    conn.execute("""
+        UPDATE evidence SET
+            score = json_extract(risk, '$.score'),
+            level = json_extract(risk, '$.level'),
+            flags = tvx_flag_mask(risk),
+            target_type = tvx_target_type(target)
+        WHERE score IS NULL AND json_valid(risk)
     """)
 
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS evidence (
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_evidence_level_created ON evidence (level, created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_evidence_case_level_score ON evidence (case_id, level, score)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_evidence_score_case ON evidence (score, case_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_evidence_plugin_created ON evidence (plugin, created_at)")
+
+
+def _codec_dicts(conn):
+    """
+    Preset dictionaries for compressed result/risk values (see codec).
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS codec_dicts (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
-            case_id TEXT,
-            plugin TEXT,
-            target TEXT,
-            result TEXT,
-            risk TEXT,
+            data BLOB,
+            samples INTEGER,
             created_at TEXT
         )
     """)
 
-    conn.commit()
-    conn.close()
 
+def _entity_tables(conn):
+    """
+    Inverted index from entities (email, domain, MX host, ASN, ...) to the
+    evidence and cases they appear in. entity_cases keeps one row per
+    (entity, case), so cross-case questions never touch per-row entries.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS entities (
+            value TEXT,
+            type TEXT,
+            evidence_id INTEGER,
+            case_id TEXT,
+            PRIMARY KEY (value, type, evidence_id)
+        ) WITHOUT ROWID
+    """)
 
-class Storage:
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS entity_cases (
+            value TEXT,
+            type TEXT,
+            case_id TEXT,
+            evidence_count INTEGER,
+            first_evidence_id INTEGER,
+            last_evidence_id INTEGER,
+            PRIMARY KEY (value, type, case_id)
+        ) WITHOUT ROWID
+    """)
 
-    def __init__(self):
-        _init()
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_entity_cases_case ON entity_cases (case_id, type, value)")
 
-    def create_case(self, case_id):
-        conn = _connect()
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO cases (id, created_at) VALUES (?, ?)",
-            (case_id, datetime.utcnow().isoformat())
+
+def _version_columns(conn):
+    """
+    prev_id links a refreshed result to the row it replaces; refreshed_at
+    records when an unchanged row was last re-checked.
+    """
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(evidence)")}
+
+    for name, kind in (("prev_id", "INTEGER"), ("refreshed_at", "TEXT")):
+        if name not in columns:
+            conn.execute(f"ALTER TABLE evidence ADD COLUMN {name} {kind}")
+
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_evidence_case_plugin_target ON evidence (case_id, plugin, target)")
+
+
+def _segment_log(conn):
+    """
+    Names of segment files (see segment.py) already folded into evidence,
+    written in the same transaction as their rows.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS segment_log (
+            name TEXT PRIMARY KEY,
+            rows INTEGER,
+            applied_at TEXT
         )
+    """)
+
+
+# PRAGMA user_version n means MIGRATIONS[:n] have run
+MIGRATIONS = [
+    _risk_columns,
+    _codec_dicts,
+    _entity_tables,
+    _version_columns,
+    _segment_log,
+]
+
+
+def _migrate(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= len(MIGRATIONS):
+        return
+
+    # Take the write lock first so concurrent processes migrate once
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for migration in MIGRATIONS[version:]:
+            with span("sqlite.migrate"):
+                migration(conn)
+        conn.execute(f"PRAGMA user_version={len(MIGRATIONS)}")
         conn.commit()
-        conn.close()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def _stored_size(value):
+    if value is None:
+        return 0
+    return len(value) if isinstance(value, bytes) else len(value.encode())
+
+
+def _db_size(path):
+    return sum(
+        os.path.getsize(path + suffix)
+        for suffix in ("", "-wal")
+        if os.path.exists(path + suffix)
+    )
+
+
+def _risk_values(risk, target=None):
+    """
+    (score, level, flags bitmask, target_type) column values for a risk dict.
+    """
+    risk = risk if isinstance(risk, dict) else {}
+    return (
+        risk.get("score"),
+        risk.get("level"),
+        flag_mask(risk.get("flags") or []),
+        classify_target(target) if target is not None else None,
+    )
+
+
+class Storage(BaseStorage):
+    """
+    Case/evidence store on one long-lived SQLite connection (WAL mode).
+
+    Every write commits immediately unless it runs inside batch(), which
+    groups writes into transactions of commit_every rows.
+    """
+
+    def __init__(self, path=DB_PATH, compress=None):
+        self.path = path
+        self.conn = _connect(path)
+        _init(self.conn, path)
+
+        # result/risk may be stored compressed; SQL that reads them as JSON
+        # goes through tvx_decode()
+        self.codec = Codec(self.conn)
+        self.conn.create_function("tvx_decode", 1, self.codec.decode, deterministic=True)
+        if compress is None:
+            compress = str(get_key("evidence_compression", "0")) == "1"
+        self.compress = compress
+
+        self._lock = threading.RLock()
+        self._batch_depth = 0
+        self._commit_every = 0
+        self._pending = 0
+
+    def init(self):
+        # The schema is created and migrated when the Storage is opened
+        _init(self.conn, self.path)
+
+    def close(self):
+        with self._lock:
+            self.conn.commit()
+            self.conn.close()
+
+    def _encode(self, text):
+        return self.codec.encode(text) if self.compress else text
+
+    def _rows(self, rows):
+        """
+        Evidence dicts with result/risk decoded, for one fetched chunk.
+        """
+        if not rows:
+            return
+        # zip over the chunk's column names is about twice as fast as dict(Row)
+        names = rows[0].keys()
+        decode = self.codec.decode
+        for row in rows:
+            row = dict(zip(names, row))
+            row["result"] = decode(row["result"])
+            row["risk"] = decode(row["risk"])
+            yield row
+
+    # =====================================
+    # Transactions
+    # =====================================
+    def _commit(self):
+        with span("sqlite.commit"):
+            self.conn.commit()
+
+    def _written(self, rows=1):
+        if not self._batch_depth:
+            self._commit()
+            return
+
+        self._pending += rows
+        if self._pending >= self._commit_every:
+            self._commit()
+            self._pending = 0
+
+    @contextmanager
+    def batch(self, commit_every=1000):
+        """
+        Group writes into transactions of commit_every rows.
+        Anything still pending is committed on exit. The batch holds the
+        storage lock, so other threads wait until it finishes.
+        """
+        with self._lock:
+            self._batch_depth += 1
+            previous = self._commit_every
+            self._commit_every = commit_every
+
+            try:
+                yield self
+            except Exception:
+                self.conn.rollback()
+                self._pending = 0
+                raise
+            finally:
+                self._batch_depth -= 1
+                self._commit_every = previous
+
+                if not self._batch_depth and self.conn.in_transaction:
+                    self._commit()
+                    self._pending = 0
+
+    # =====================================
+    # Cases / evidence
+    # =====================================
+    def create_case(self, case_id, created_at=None, exist_ok=False):
+        with self._lock:
+            self.conn.execute(
+                f"INSERT {'OR IGNORE ' if exist_ok else ''}INTO cases (id, created_at) VALUES (?, ?)",
+                (case_id, created_at or datetime.utcnow().isoformat())
+            )
+            self._written()
 
     def add_evidence(self, case_id, plugin, target, result, risk):
-        conn = _connect()
-        cur = conn.cursor()
-        cur.execute(
-            """
-            INSERT INTO evidence (case_id, plugin, target, result, risk, created_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-            """,
-            (
-                case_id,
-                plugin,
-                target,
-                json.dumps(result),
-                json.dumps(risk),
-                datetime.utcnow().isoformat()
+        self.add_evidence_many(case_id, [(plugin, target, result, risk)])
+
+    def add_scan(self, case_id, scan_data):
+        """
+        Store one scan record ({"target", "scan", "risk"}, as written by
+        tvx scan; "plugin" optional) as evidence.
+        """
+        result = scan_data.get("scan")
+        risk = scan_data.get("risk") or calculate_risk(result or {})
+        self.add_evidence(case_id, scan_data.get("plugin") or "scan", scan_data.get("target"), result, risk)
+
+    def add_evidence_many(self, case_id, items, prev_ids=None, created=None):
+        """
+        Insert (plugin, target, result, risk) tuples in one transaction.
+        prev_ids, if given, holds for each item the id of the row it is a
+        new version of; created, its original created_at (default now).
+        """
+        items = list(items)
+        prev_ids = list(prev_ids) if prev_ids is not None else [None] * len(items)
+        now = datetime.utcnow().isoformat()
+        created = list(created) if created is not None else [now] * len(items)
+        rows = [
+            (case_id, plugin, target, self._encode(json.dumps(result)), self._encode(json.dumps(risk)), created_at)
+            + _risk_values(risk, target) + (prev_id,)
+            for (plugin, target, result, risk), prev_id, created_at in zip(items, prev_ids, created)
+        ]
+        entities = [extract_entities(plugin, target, result) for plugin, target, result, _ in items]
+
+        with self._lock, span("sqlite.insert"):
+            self.conn.executemany(
+                """
+                INSERT INTO evidence (case_id, plugin, target, result, risk, created_at,
+                                      score, level, flags, target_type, prev_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                rows
+            )
+
+            if rows:
+                # The rows were inserted back to back inside this write
+                # transaction, so their ids are consecutive
+                last_id = self.conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+                first_id = last_id - len(rows) + 1
+                self._index_entities(
+                    (first_id + offset, case_id, found) for offset, found in enumerate(entities)
+                )
+
+            self._written(len(rows))
+
+        return len(rows)
+
+    def import_evidence(self, case_id, rows, ids=None):
+        """
+        Insert prepared rows (plugin, target, result JSON, risk JSON,
+        created_at, score, level, flags, target_type, entity set,
+        refreshed_at, export id, export prev_id), skipping any whose
+        (plugin, target, created_at) the case already has. ids maps export
+        ids to row ids across calls: each row is added to it, and prev_id
+        is looked up in it, so refresh chains survive the move. Returns
+        the number inserted.
+        """
+        indexed = []
+
+        with self._lock, span("sqlite.insert"):
+            cur = self.conn.cursor()
+
+            for (plugin, target, result, risk, created_at, score, level, flags, target_type, found,
+                 refreshed_at, export_id, export_prev_id) in rows:
+                prev_id = ids.get(export_prev_id) if ids is not None and export_prev_id is not None else None
+
+                # Probes the (case_id, plugin, target) index
+                cur.execute(
+                    """
+                    INSERT INTO evidence (case_id, plugin, target, result, risk, created_at,
+                                          score, level, flags, target_type, refreshed_at, prev_id)
+                    SELECT ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM evidence
+                        WHERE case_id = ? AND plugin = ? AND target = ? AND created_at = ?
+                    )
+                    """,
+                    (case_id, plugin, target, self._encode(result), self._encode(risk), created_at,
+                     score, level, flags, target_type, refreshed_at, prev_id,
+                     case_id, plugin, target, created_at)
+                )
+                if cur.rowcount:
+                    evidence_id = cur.lastrowid
+                    indexed.append((evidence_id, case_id, found))
+                elif ids is not None and export_id is not None:
+                    # Already imported: later rows may still chain to it
+                    evidence_id = cur.execute(
+                        "SELECT id FROM evidence WHERE case_id = ? AND plugin = ? AND target = ? AND created_at = ?",
+                        (case_id, plugin, target, created_at)
+                    ).fetchone()[0]
+
+                if ids is not None and export_id is not None:
+                    ids[export_id] = evidence_id
+
+            self._index_entities(indexed)
+            self._written(len(indexed))
+
+        return len(indexed)
+
+    def _index_entities(self, rows):
+        """
+        Add (evidence_id, case_id, entity set) rows to the entity index.
+        Caller holds the lock and commits.
+        """
+        postings = []
+        per_case = {}
+
+        for evidence_id, case_id, found in rows:
+            for entity_type, value in found:
+                postings.append((value, entity_type, evidence_id, case_id))
+
+                key = (value, entity_type, case_id)
+                if key in per_case:
+                    per_case[key][0] += 1
+                    per_case[key][2] = evidence_id
+                else:
+                    per_case[key] = [1, evidence_id, evidence_id]
+
+        with span("sqlite.entities"):
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO entities (value, type, evidence_id, case_id) VALUES (?, ?, ?, ?)",
+                postings
+            )
+            self.conn.executemany(
+                """
+                INSERT INTO entity_cases (value, type, case_id, evidence_count,
+                                          first_evidence_id, last_evidence_id)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (value, type, case_id) DO UPDATE SET
+                    evidence_count = evidence_count + excluded.evidence_count,
+                    last_evidence_id = MAX(last_evidence_id, excluded.last_evidence_id)
+                """,
+                [key + tuple(counts) for key, counts in per_case.items()]
             )
+
+    def get_case_info(self, case_id):
+        with self._lock:
+            case = self.conn.execute(
+                "SELECT * FROM cases WHERE id=?", (case_id,)
+            ).fetchone()
+
+        return dict(case) if case else None
+
+    def iter_evidence(self, case_id, after_id=None, limit=None, chunk_size=1000):
+        """
+        Yield evidence rows of a case in (created_at, id) order.
+
+        Rows are fetched chunk_size at a time with keyset pagination on the
+        (case_id, created_at) index, so memory stays flat for any case size.
+        after_id resumes after a previously returned row id.
+        """
+        position = None
+
+        if after_id is not None:
+            with self._lock:
+                row = self.conn.execute(
+                    "SELECT created_at, id FROM evidence WHERE id=? AND case_id=?",
+                    (after_id, case_id)
+                ).fetchone()
+            if row is None:
+                return
+            position = (row[0], row[1])
+
+        remaining = limit
+
+        while remaining is None or remaining > 0:
+            size = chunk_size if remaining is None else min(chunk_size, remaining)
+
+            with self._lock, span("sqlite.read"):
+                if position is None:
+                    rows = self.conn.execute(
+                        "SELECT * FROM evidence WHERE case_id=? "
+                        "ORDER BY created_at, id LIMIT ?",
+                        (case_id, size)
+                    ).fetchall()
+                else:
+                    # Finish the current timestamp first (bulk inserts share
+                    # one created_at), then seek past it; both are index seeks
+                    rows = self.conn.execute(
+                        "SELECT * FROM evidence WHERE case_id=? AND created_at=? "
+                        "AND id > ? ORDER BY id LIMIT ?",
+                        (case_id, position[0], position[1], size)
+                    ).fetchall()
+
+                    if len(rows) < size:
+                        rows += self.conn.execute(
+                            "SELECT * FROM evidence WHERE case_id=? AND created_at > ? "
+                            "ORDER BY created_at, id LIMIT ?",
+                            (case_id, position[0], size - len(rows))
+                        ).fetchall()
+
+            yield from self._rows(rows)
+
+            if len(rows) < size:
+                return
+
+            position = (rows[-1]["created_at"], rows[-1]["id"])
+            if remaining is not None:
+                remaining -= len(rows)
+
+    def select_signals(self, paths, case_id=None, after_id=0, limit=10000):
+        """
+        (id, value, type, value, type, ...) at each JSON path of result for
+        up to limit evidence rows with id > after_id. Values are pulled out
+        with json_extract, so result blobs are never parsed in Python; the
+        json_type beside each tells true/false from 1/0 and arrays/objects
+        (returned as JSON text) from strings.
+        """
+        columns = ", ".join(
+            "json_extract(tvx_decode(result), ?), json_type(tvx_decode(result), ?)" for _ in paths
         )
-        conn.commit()
-        conn.close()
+        params = [f"$.{p}" for p in paths for _ in range(2)] + [after_id]
 
-    def get_case(self, case_id):
-        conn = _connect()
-        cur = conn.cursor()
+        sql = f"SELECT id, {columns} FROM evidence WHERE id > ?"
+        if case_id is not None:
+            sql += " AND case_id = ?"
+            params.append(case_id)
+        sql += " ORDER BY id LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def set_risk_many(self, rows):
+        """
+        Overwrite the stored risk for (risk, evidence_id) pairs.
+        risk may be a dict or already-serialized JSON text.
+        """
+        # Rescoring repeats the same few serialized risks; decode each once
+        decoded = {}
+        values = []
+
+        for risk, evidence_id in rows:
+            if isinstance(risk, str):
+                if risk not in decoded:
+                    decoded[risk] = (self._encode(risk),) + _risk_values(json.loads(risk))[:3]
+                values.append(decoded[risk] + (evidence_id,))
+            else:
+                values.append((self._encode(json.dumps(risk)),) + _risk_values(risk)[:3] + (evidence_id,))
+
+        with self._lock:
+            self.conn.executemany(
+                "UPDATE evidence SET risk=?, score=?, level=?, flags=? WHERE id=?", values
+            )
+            self._written(len(values))
+
+        return len(values)
+
+    # =====================================
+    # Refresh
+    # =====================================
+    def iter_stale(self, case_id, before, chunk_size=1000):
+        """
+        Yield (id, plugin, target, result) for the latest version of each
+        (plugin, target) in a case, where that version was created or last
+        re-checked before the given ISO timestamp.
+        """
+        sql = """
+            SELECT id, plugin, target, result FROM evidence
+            WHERE id IN (
+                SELECT MAX(id) FROM evidence WHERE case_id = ? GROUP BY plugin, target
+            )
+            AND COALESCE(refreshed_at, created_at) < ?
+            ORDER BY id
+        """
+
+        with self._lock, span("sqlite.query"):
+            cursor = self.conn.execute(sql, (case_id, before))
+
+        try:
+            while True:
+                with self._lock, span("sqlite.read"):
+                    rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    return
+                for row in rows:
+                    yield row["id"], row["plugin"], row["target"], self.codec.decode(row["result"])
+        finally:
+            cursor.close()
+
+    def mark_refreshed(self, evidence_ids, when=None):
+        """
+        Record that evidence rows were re-checked and found unchanged.
+        """
+        when = when or datetime.utcnow().isoformat()
+        values = [(when, evidence_id) for evidence_id in evidence_ids]
+
+        with self._lock:
+            self.conn.executemany("UPDATE evidence SET refreshed_at=? WHERE id=?", values)
+            self._written(len(values))
+
+        return len(values)
+
+    def case_summary(self, case_id, top=10):
+        """
+        Aggregates for a case computed in SQL: row count, score stats,
+        level histogram and the most common flags, email domains and ASNs.
+        """
+        with self._lock, span("sqlite.aggregate"):
+            cur = self.conn.cursor()
+
+            total, avg_score, max_score = cur.execute(
+                "SELECT COUNT(*), AVG(score), MAX(score) FROM evidence WHERE case_id=?",
+                (case_id,)
+            ).fetchone()
+
+            levels = cur.execute(
+                "SELECT level, COUNT(*) FROM evidence "
+                "WHERE case_id=? GROUP BY level ORDER BY COUNT(*) DESC",
+                (case_id,)
+            ).fetchall()
+
+            flags = cur.execute(
+                "SELECT f.value, COUNT(*) FROM evidence, json_each(tvx_decode(evidence.risk), '$.flags') AS f "
+                "WHERE evidence.case_id=? GROUP BY f.value ORDER BY COUNT(*) DESC LIMIT ?",
+                (case_id, top)
+            ).fetchall()
+
+            domains = cur.execute(
+                "SELECT lower(substr(target, instr(target, '@') + 1)) AS domain, COUNT(*) "
+                "FROM evidence WHERE case_id=? AND instr(target, '@') > 0 "
+                "GROUP BY domain ORDER BY COUNT(*) DESC LIMIT ?",
+                (case_id, top)
+            ).fetchall()
+
+            asns = cur.execute(
+                "SELECT json_extract(tvx_decode(result), '$.metadata.asn') AS asn, "
+                "MAX(json_extract(tvx_decode(result), '$.metadata.org')), COUNT(*) "
+                "FROM evidence WHERE case_id=? AND asn IS NOT NULL "
+                "GROUP BY asn ORDER BY COUNT(*) DESC LIMIT ?",
+                (case_id, top)
+            ).fetchall()
+
+        return {
+            "evidence": total,
+            "avg_score": round(avg_score, 1) if avg_score is not None else None,
+            "max_score": max_score,
+            "levels": [tuple(r) for r in levels],
+            "flags": [tuple(r) for r in flags],
+            "domains": [tuple(r) for r in domains],
+            "asns": [tuple(r) for r in asns],
+        }
+
+    def _filters(self, case_id=None, level=None, since=None, until=None, plugin=None,
+                 min_score=None, target_type=None, flags=None):
+        clauses = []
+        params = []
+
+        for column, value in (("case_id", case_id), ("level", level),
+                              ("plugin", plugin), ("target_type", target_type)):
+            if value is not None:
+                if isinstance(value, (list, tuple)):
+                    clauses.append(f"{column} IN ({', '.join('?' for _ in value)})")
+                    params.extend(value)
+                else:
+                    clauses.append(f"{column} = ?")
+                    params.append(value)
+
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+        if min_score is not None:
+            clauses.append("score >= ?")
+            params.append(min_score)
+        if flags:
+            clauses.append("flags & ? = ?")
+            params.extend([flags, flags])
+
+        return clauses, params
 
-        cur.execute("SELECT * FROM cases WHERE id=?", (case_id,))
-        case = cur.fetchone()
+    def query_evidence(self, after_id=None, limit=None, chunk_size=1000, **filters):
+        """
+        Yield evidence rows matching filters in id order. Filters (case_id,
+        level, since, until, plugin, min_score, target_type, flags bitmask)
+        run in SQL on the indexed columns; level/plugin/case_id/target_type
+        also accept lists. Rows come off one cursor chunk_size at a time.
+        """
+        clauses, params = self._filters(**filters)
+        clauses.append("id > ?")
+        params.append(after_id or 0)
 
-        cur.execute("SELECT * FROM evidence WHERE case_id=?", (case_id,))
-        evidence = cur.fetchall()
+        sql = f"SELECT * FROM evidence WHERE {' AND '.join(clauses)} ORDER BY id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
 
-        conn.close()
+        with self._lock, span("sqlite.query"):
+            cursor = self.conn.execute(sql, params)
 
+        try:
+            while True:
+                with self._lock, span("sqlite.read"):
+                    rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    return
+                yield from self._rows(rows)
+        finally:
+            cursor.close()
+
+    def export_lines(self, case_id, chunk_size=5000):
+        """
+        Yield lists of NDJSON lines (id, plugin, target, created_at,
+        refreshed_at, prev_id, result, risk) for a case in id order,
+        chunk_size at a time. Quoting happens in SQL and stored JSON is
+        spliced in as is, so nothing is parsed.
+        """
+        cursor = self.conn.cursor()
+        cursor.row_factory = None
+        decode = self.codec.decode
+
+        with self._lock, span("sqlite.query"):
+            cursor.execute(
+                """
+                SELECT '{"id": ' || id || ', "plugin": ' || json_quote(plugin)
+                       || ', "target": ' || json_quote(target)
+                       || ', "created_at": ' || json_quote(created_at)
+                       || ', "refreshed_at": ' || json_quote(refreshed_at)
+                       || ', "prev_id": ' || json_quote(prev_id) || ', "result": ',
+                       result, risk
+                FROM evidence WHERE case_id = ? ORDER BY id
+                """,
+                (case_id,)
+            )
+
+        try:
+            while True:
+                with self._lock, span("sqlite.read"):
+                    rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    return
+                yield [
+                    f'{head}{decode(result) or "null"}, "risk": {decode(risk) or "null"}}}\n'
+                    for head, result, risk in rows
+                ]
+        finally:
+            cursor.close()
+
+    def query_cases(self, limit=None, **filters):
+        """
+        Per-case matching evidence count and max/avg score, highest max
+        score first, for the same filters as query_evidence.
+        """
+        clauses, params = self._filters(**filters)
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        sql = (
+            f"SELECT case_id, COUNT(*) AS evidence, MAX(score) AS max_score, "
+            f"ROUND(AVG(score), 1) AS avg_score FROM evidence{where} "
+            f"GROUP BY case_id ORDER BY max_score DESC, evidence DESC"
+        )
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        with self._lock, span("sqlite.query"):
+            return [dict(row) for row in self.conn.execute(sql, params)]
+
+    # =====================================
+    # Entities
+    # =====================================
+    def lookup_entity(self, value, entity_type=None, limit=20):
+        """
+        Cases (with evidence counts) and the latest evidence ids in which
+        an entity appears, for every type it was indexed under.
+        """
+        if entity_type:
+            candidates = [(normalize_entity(value, entity_type), entity_type)]
+        else:
+            # The type is unknown, so try the value as each type normalizes it
+            forms = {normalize_entity(value, t) for t in ENTITY_TYPES}
+            with self._lock:
+                candidates = self.conn.execute(
+                    f"SELECT DISTINCT value, type FROM entity_cases "
+                    f"WHERE value IN ({', '.join('?' for _ in forms)})",
+                    list(forms)
+                ).fetchall()
+            candidates = [tuple(c) for c in candidates]
+
+        cases = []
+        evidence_ids = []
+
+        with self._lock, span("sqlite.entities"):
+            for candidate in candidates:
+                # Both read the primary key backwards: no sort, however
+                # common the entity is
+                cases += self.conn.execute(
+                    "SELECT type, case_id, evidence_count, first_evidence_id, last_evidence_id "
+                    "FROM entity_cases WHERE value = ? AND type = ?",
+                    candidate
+                ).fetchall()
+                evidence_ids += [tuple(r) for r in self.conn.execute(
+                    "SELECT evidence_id, type FROM entities WHERE value = ? AND type = ? "
+                    "ORDER BY evidence_id DESC LIMIT ?",
+                    candidate + (limit,)
+                )]
+
+            cases = sorted(cases, key=lambda r: r["last_evidence_id"], reverse=True)[:limit]
+            evidence_ids = sorted(evidence_ids, reverse=True)[:limit]
+            types = dict((r[0], r[1]) for r in evidence_ids)
+
+            evidence = self.conn.execute(
+                "SELECT id, case_id, plugin, target, score, level, created_at FROM evidence "
+                f"WHERE id IN ({', '.join('?' for _ in types)}) ORDER BY id DESC",
+                list(types)
+            ).fetchall()
+
+        evidence = [dict(r, type=types[r["id"]]) for r in evidence]
+        value = candidates[0][0] if candidates else normalize_entity(value, entity_type)
+
+        return {
+            "value": value,
+            "cases": [dict(r) for r in cases],
+            "evidence": [dict(r) for r in evidence],
+        }
+
+    def related_cases(self, case_id, limit=20, max_entity_cases=1000):
+        """
+        Other cases sharing entities with case_id, most shared entities
+        first. Entities found in more than max_entity_cases cases (webmail
+        domains, big providers' MX hosts) link everything and are skipped.
+        """
+        with self._lock, span("sqlite.entities"):
+            rows = self.conn.execute(
+                """
+                WITH mine AS (
+                    SELECT value, type FROM entity_cases AS m
+                    WHERE m.case_id = ?
+                      AND (SELECT COUNT(*) FROM (
+                              SELECT 1 FROM entity_cases AS c
+                              WHERE c.value = m.value AND c.type = m.type
+                              LIMIT ? + 1)) <= ?
+                ),
+                shared AS (
+                    SELECT other.case_id, mine.type, mine.value, other.evidence_count
+                    FROM mine
+                    JOIN entity_cases AS other
+                      ON other.value = mine.value AND other.type = mine.type
+                    WHERE other.case_id != ?
+                )
+                SELECT case_id,
+                       COUNT(*) AS shared_entities,
+                       SUM(evidence_count) AS evidence,
+                       json_group_array(json_array(type, value)) AS entities
+                FROM shared
+                GROUP BY case_id
+                ORDER BY shared_entities DESC, evidence DESC
+                LIMIT ?
+                """,
+                (case_id, max_entity_cases, max_entity_cases, case_id, limit)
+            ).fetchall()
+
+        related = []
+        for row in rows:
+            row = dict(row)
+            row["entities"] = json.loads(row["entities"])[:20]
+            related.append(row)
+        return related
+
+    def reindex_entities(self, chunk_size=5000):
+        """
+        Rebuild the entity index from all stored evidence (for databases
+        written before the index existed).
+        """
+        with self._lock:
+            self.conn.execute("DELETE FROM entities")
+            self.conn.execute("DELETE FROM entity_cases")
+            self._commit()
+
+        rows_done = 0
+        last_id = 0
+
+        while True:
+            with self._lock, span("sqlite.reindex"):
+                rows = self.conn.execute(
+                    "SELECT id, case_id, plugin, target, result FROM evidence "
+                    "WHERE id > ? ORDER BY id LIMIT ?",
+                    (last_id, chunk_size)
+                ).fetchall()
+                if not rows:
+                    break
+
+                indexed = []
+                for row in rows:
+                    try:
+                        result = json.loads(self.codec.decode(row["result"]) or "{}")
+                    except ValueError:
+                        result = {}
+                    found = extract_entities(row["plugin"], row["target"], result)
+                    indexed.append((row["id"], row["case_id"], found))
+
+                self._index_entities(indexed)
+
+                self._commit()
+
+            rows_done += len(rows)
+            last_id = rows[-1]["id"]
+
+        return rows_done
+
+    # =====================================
+    # Compaction
+    # =====================================
+    def compact(self, samples=2000, chunk_size=5000, vacuum=True):
+        """
+        Train a dictionary from a sample of stored rows, re-encode every
+        result/risk with it (chunk_size rows per transaction) and reclaim
+        the freed pages. New writes from this Storage are compressed too.
+        """
+        started = time.perf_counter()
+        file_before = _db_size(self.path)
+
+        with self._lock:
+            sample = self.conn.execute(
+                "SELECT result, risk FROM evidence WHERE id IN "
+                "(SELECT id FROM evidence ORDER BY RANDOM() LIMIT ?)",
+                (samples,)
+            ).fetchall()
+
+            texts = [self.codec.decode(v) for row in sample for v in row if v is not None]
+            dict_id = self.codec.add_dictionary(train_dictionary(texts), samples=len(sample))
+            self._commit()
+
+        self.compress = True
+        stats = {"rows": 0, "bytes_before": 0, "bytes_after": 0, "dictionary": dict_id}
+        last_id = 0
+
+        while True:
+            with self._lock, span("sqlite.compact"):
+                rows = self.conn.execute(
+                    "SELECT id, result, risk FROM evidence WHERE id > ? ORDER BY id LIMIT ?",
+                    (last_id, chunk_size)
+                ).fetchall()
+                if not rows:
+                    break
+
+                updates = []
+                for evidence_id, result, risk in rows:
+                    new_result = self.codec.encode(self.codec.decode(result), dict_id)
+                    new_risk = self.codec.encode(self.codec.decode(risk), dict_id)
+
+                    stats["bytes_before"] += _stored_size(result) + _stored_size(risk)
+                    stats["bytes_after"] += _stored_size(new_result) + _stored_size(new_risk)
+                    updates.append((new_result, new_risk, evidence_id))
+
+                self.conn.executemany("UPDATE evidence SET result=?, risk=? WHERE id=?", updates)
+                self._commit()
+
+            stats["rows"] += len(rows)
+            last_id = rows[-1][0]
+
+        if vacuum:
+            with self._lock, span("sqlite.vacuum"):
+                self.conn.execute("VACUUM")
+
+        stats["ratio"] = round(stats["bytes_before"] / stats["bytes_after"], 2) if stats["bytes_after"] else None
+        stats["file_before"] = file_before
+        stats["file_after"] = _db_size(self.path)
+        stats["elapsed_sec"] = round(time.perf_counter() - started, 3)
+        return stats
+
+    def get_case(self, case_id):
         return {
-            "case": dict(case) if case else None,
-            "evidence": [dict(e) for e in evidence]
+            "case": self.get_case_info(case_id),
+            "evidence": list(self.iter_evidence(case_id))
         }
 
 
-def get_storage():
-    return Storage()
+_storages = {}
+_storages_lock = threading.Lock()
+
+
+def get_storage(path=DB_PATH):
+    """
+    Shared storage for path. Config key storage_backend picks the
+    implementation: "sqlite" (default) or "segment" (append-only segment
+    files in front of SQLite, for high-rate ingest).
+    """
+    with _storages_lock:
+        if path not in _storages:
+            if get_key("storage_backend", "sqlite") == "segment":
+                from tvx.storage.segment import SegmentStorage
+
+                _storages[path] = SegmentStorage(Storage(path))
+            else:
+                _storages[path] = Storage(path)
+        return _storages[path]
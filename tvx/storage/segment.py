@@ -0,0 +1,589 @@
+import atexit
+import fcntl
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from tvx.config import get_key
+from tvx.profiling import span
+from tvx.scoring import calculate_risk
+from tvx.storage.base import BaseStorage
+from tvx.storage.manager import _risk_values
+
+# Segment files are NDJSON, one evidence record per line:
+#   seg-<time_ns>-<pid>.opening  created and flocked, about to go active
+#   seg-<time_ns>-<pid>.active   being appended to by process <pid>,
+#                                which holds an exclusive flock on it
+#   seg-<time_ns>-<pid>.ndjson   sealed, waiting to be compacted
+# Names sort in creation order. A sealed segment is deleted once its rows
+# and its name (segment_log) are committed to SQLite.
+OPENING_SUFFIX = ".opening"
+ACTIVE_SUFFIX = ".active"
+SEALED_SUFFIX = ".ndjson"
+
+# An active segment is sealed past either limit
+SEGMENT_MAX_BYTES = 16 * 1024 * 1024
+SEGMENT_MAX_AGE = 10.0
+
+# Seconds between background compaction passes
+COMPACT_INTERVAL = 2.0
+
+# How long flush() waits for other threads' and processes' readers
+# before giving up
+FLUSH_WAIT = 30.0
+
+
+class FlushError(RuntimeError):
+    """
+    Sealed segments could not be folded into SQLite because merged reads
+    held the lock; their rows are safe on disk but not in SQLite yet.
+    """
+
+
+def _flushed(name):
+    def method(self, *args, **kwargs):
+        self.flush()
+        return getattr(self.store, name)(*args, **kwargs)
+
+    method.__name__ = name
+    method.__doc__ = f"Storage.{name}, after folding pending segments into SQLite."
+    return method
+
+
+def _matches(row, case_id=None, level=None, since=None, until=None, plugin=None,
+             min_score=None, target_type=None, flags=None):
+    # Python version of Storage._filters for rows not in SQLite yet
+    for column, value in (("case_id", case_id), ("level", level),
+                          ("plugin", plugin), ("target_type", target_type)):
+        if value is not None:
+            if isinstance(value, (list, tuple)):
+                if row[column] not in value:
+                    return False
+            elif row[column] != value:
+                return False
+
+    if since is not None and row["created_at"] < since:
+        return False
+    if until is not None and row["created_at"] >= until:
+        return False
+    if min_score is not None and (row["score"] is None or row["score"] < min_score):
+        return False
+    if flags and (row["flags"] or 0) & flags != flags:
+        return False
+
+    return True
+
+
+class SegmentStorage(BaseStorage):
+    """
+    Write-optimized front for a Storage: evidence is appended to rotating
+    NDJSON segment files (fsync'd with group commit: one fsync covers every
+    writer waiting on it) and a background thread folds sealed segments
+    into SQLite, with its indexes, risk columns and entity postings.
+
+    Evidence reads merge SQLite with the records still in segments, so a
+    write is visible as soon as add_evidence returns. Pending rows have no
+    id yet (id None), so paged reads (limit set) fold them in first.
+    Aggregates, rescoring, refresh and entity queries fold pending
+    segments in first and then run on SQLite.
+    """
+
+    def __init__(self, store, directory=None, max_bytes=None, max_age=None, fsync=None):
+        self.store = store
+        self.path = store.path
+        self.directory = directory or get_key("segment_dir") or store.path + ".segments"
+        self.max_bytes = int(max_bytes or get_key("segment_max_bytes", SEGMENT_MAX_BYTES))
+        self.max_age = float(max_age or get_key("segment_max_age", SEGMENT_MAX_AGE))
+        if fsync is None:
+            fsync = str(get_key("segment_fsync", "1")) == "1"
+        self.fsync = fsync
+
+        self._write_lock = threading.Lock()
+        self._file = None
+        self._name = None
+        self._opened = 0.0
+        self._size = 0
+
+        # Bytes ever appended by this process / known to be on disk
+        self._written = 0
+        self._synced = 0
+        self._syncing = False
+        self._sync_cond = threading.Condition()
+
+        self._compact_lock = threading.Lock()
+        # Merged reads open in the current thread
+        self._local = threading.local()
+        self._tails_lock = threading.Lock()
+        self._tails = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.init()
+
+    # =====================================
+    # BaseStorage
+    # =====================================
+    def init(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._recover()
+
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._compact_loop, name="tvx-compactor", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def create_case(self, case_id, created_at=None, exist_ok=False):
+        self.store.create_case(case_id, created_at=created_at, exist_ok=exist_ok)
+
+    def add_scan(self, case_id, scan_data):
+        result = scan_data.get("scan")
+        risk = scan_data.get("risk") or calculate_risk(result or {})
+        self.add_evidence(case_id, scan_data.get("plugin") or "scan", scan_data.get("target"), result, risk)
+
+    def get_case(self, case_id):
+        return {
+            "case": self.get_case_info(case_id),
+            "evidence": list(self.iter_evidence(case_id))
+        }
+
+    def get_case_info(self, case_id):
+        return self.store.get_case_info(case_id)
+
+    def close(self):
+        """
+        Stop the compactor, seal the active segment and fold it in.
+        """
+        if self._thread is None:
+            return
+
+        self._stop.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+        atexit.unregister(self.close)
+        try:
+            self.flush()
+        except FlushError as e:
+            # The next process to open the directory folds them in
+            print(f"[!] Segments left pending: {e}", file=sys.stderr)
+
+    # =====================================
+    # Writes
+    # =====================================
+    def add_evidence(self, case_id, plugin, target, result, risk):
+        self.add_evidence_many(case_id, [(plugin, target, result, risk)])
+
+    def add_evidence_many(self, case_id, items, prev_ids=None, created=None):
+        """
+        Append (plugin, target, result, risk) tuples to the active segment;
+        durable (fsync'd) when this returns.
+        """
+        items = list(items)
+        if not items:
+            return 0
+
+        prev_ids = list(prev_ids) if prev_ids is not None else [None] * len(items)
+        now = datetime.utcnow().isoformat()
+        created = list(created) if created is not None else [now] * len(items)
+
+        data = "".join(
+            json.dumps({
+                "case_id": case_id, "plugin": plugin, "target": target,
+                "result": result, "risk": risk, "created_at": created_at, "prev_id": prev_id,
+            }) + "\n"
+            for (plugin, target, result, risk), prev_id, created_at in zip(items, prev_ids, created)
+        ).encode()
+
+        with span("segment.append"):
+            upto = self._append(data)
+        if self.fsync:
+            with span("segment.fsync"):
+                self._sync(upto)
+
+        return len(items)
+
+    @contextmanager
+    def batch(self, commit_every=1000):
+        # Segment appends are already grouped; nothing to batch
+        yield self
+
+    def _append(self, data):
+        with self._write_lock:
+            if self._file is not None and self._size >= self.max_bytes:
+                self._seal()
+            if self._file is None:
+                self._open()
+
+            view = memoryview(data)
+            while view:
+                view = view[os.write(self._file.fileno(), view):]
+            self._size += len(data)
+            self._written += len(data)
+            return self._written
+
+    def _sync(self, upto):
+        """
+        Group commit: return once bytes up to upto are on disk. One caller
+        at a time fsyncs, covering everything appended before it started;
+        the others wait for that and usually find their data covered.
+        """
+        with self._sync_cond:
+            while self._synced < upto:
+                if not self._syncing:
+                    self._syncing = True
+                    break
+                self._sync_cond.wait()
+            else:
+                return
+
+        synced = self._synced
+        try:
+            with self._write_lock:
+                # A duplicate descriptor stays valid if the segment is
+                # sealed (and its file closed) meanwhile
+                fd = os.dup(self._file.fileno()) if self._file is not None else None
+                covered = self._written
+            if fd is not None:
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            synced = covered
+        finally:
+            with self._sync_cond:
+                self._synced = max(self._synced, synced)
+                self._syncing = False
+                self._sync_cond.notify_all()
+
+    def _open(self):
+        # Caller holds _write_lock
+        # Flock it before it is visible as .active: _recover in another
+        # process seals any active segment whose lock is free
+        while True:
+            self._name = f"seg-{time.time_ns():020d}-{os.getpid()}"
+            path = os.path.join(self.directory, self._name)
+            f = open(path + OPENING_SUFFIX, "ab", buffering=0)
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                os.rename(path + OPENING_SUFFIX, path + ACTIVE_SUFFIX)
+                break
+            except FileNotFoundError:
+                # Removed by _recover before the flock: take a new name
+                f.close()
+        self._file = f
+        self._opened = time.monotonic()
+        self._size = 0
+
+    def _seal(self):
+        """
+        fsync and close the active segment and rename it to sealed.
+        Caller holds _write_lock.
+        """
+        if self._file is None:
+            return
+
+        os.fsync(self._file.fileno())
+        with self._sync_cond:
+            self._synced = max(self._synced, self._written)
+            self._sync_cond.notify_all()
+
+        active = os.path.join(self.directory, self._name + ACTIVE_SUFFIX)
+        os.rename(active, os.path.join(self.directory, self._name + SEALED_SUFFIX))
+        self._file.close()
+        self._file = None
+
+    # =====================================
+    # Compaction
+    # =====================================
+    def _segments(self, suffixes=(ACTIVE_SUFFIX, SEALED_SUFFIX)):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(n for n in names if n.startswith("seg-") and n.endswith(suffixes))
+
+    def _recover(self):
+        """
+        Seal active segments left behind by processes that are gone (their
+        flock is free), dropping a torn last line, and remove the empty
+        ones they died opening.
+        """
+        for name in self._segments((OPENING_SUFFIX,)):
+            path = os.path.join(self.directory, name)
+            try:
+                f = open(path, "rb")
+            except FileNotFoundError:
+                continue
+
+            with f:
+                try:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    continue  # Being opened
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+        for name in self._segments((ACTIVE_SUFFIX,)):
+            if self._name and name == self._name + ACTIVE_SUFFIX:
+                continue
+
+            path = os.path.join(self.directory, name)
+            try:
+                f = open(path, "r+b")
+            except FileNotFoundError:
+                continue
+
+            with f:
+                try:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    continue  # Still being written
+
+                data = f.read()
+                end = data.rfind(b"\n") + 1
+                if end < len(data):
+                    f.truncate(end)
+                os.fsync(f.fileno())
+                os.rename(path, path[:-len(ACTIVE_SUFFIX)] + SEALED_SUFFIX)
+
+    @contextmanager
+    def _locked(self, mode):
+        """
+        flock on the directory's lock file: readers of pending segments
+        share it, compaction takes it exclusively, so no segment is folded
+        in halfway through a merged read.
+        """
+        f = open(os.path.join(self.directory, "compact.lock"), "a")
+        try:
+            fcntl.flock(f.fileno(), mode)
+            yield
+        finally:
+            f.close()
+
+    def _read_segment(self, name):
+        with open(os.path.join(self.directory, name), "rb") as f:
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        return [json.loads(line) for line in data[:end].splitlines() if line.strip()], end
+
+    def _apply(self, name):
+        """
+        Fold one sealed segment into SQLite (rows and segment_log entry in
+        one transaction), then delete the file. Caller holds the exclusive
+        lock.
+        """
+        store = self.store
+        path = os.path.join(self.directory, name)
+        records, _ = self._read_segment(name)
+
+        with store.batch(commit_every=len(records) + 1), span("segment.compact"):
+            done = store.conn.execute("SELECT 1 FROM segment_log WHERE name = ?", (name,)).fetchone()
+
+            if not done:
+                by_case = {}
+                for r in records:
+                    by_case.setdefault(r["case_id"], []).append(r)
+
+                for case_id, rows in by_case.items():
+                    store.add_evidence_many(
+                        case_id,
+                        [(r["plugin"], r["target"], r["result"], r["risk"]) for r in rows],
+                        prev_ids=[r.get("prev_id") for r in rows],
+                        created=[r["created_at"] for r in rows],
+                    )
+
+                store.conn.execute(
+                    "INSERT INTO segment_log (name, rows, applied_at) VALUES (?, ?, ?)",
+                    (name, len(records), datetime.utcnow().isoformat())
+                )
+
+        os.remove(path)
+        with self._tails_lock:
+            self._tails.pop(name.rsplit(".", 1)[0], None)
+        return 0 if done else len(records)
+
+    def compact_segments(self, wait=True):
+        """
+        Fold every sealed segment into SQLite. Returns rows applied.
+
+        A merged read holding the lock makes this give up at once without
+        wait. With wait it is waited for, up to FLUSH_WAIT, and FlushError
+        is raised if it outlasts that or is open in this thread (which
+        would wait on itself).
+        """
+        with self._compact_lock:
+            self._recover()
+            if not self._segments((SEALED_SUFFIX,)):
+                return 0
+
+            f = open(os.path.join(self.directory, "compact.lock"), "a")
+            try:
+                deadline = time.monotonic() + FLUSH_WAIT
+                while True:
+                    try:
+                        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        break
+                    except OSError:
+                        # A merged read is open in some thread or process
+                        if not wait:
+                            return 0
+                        if getattr(self._local, "readers", 0):
+                            raise FlushError(
+                                "Cannot fold segments into SQLite during a merged read in the same "
+                                "thread; finish iterating iter_evidence/query_evidence first"
+                            )
+                        if time.monotonic() > deadline:
+                            raise FlushError(f"Merged reads held the segment lock for over {FLUSH_WAIT:g}s")
+                        time.sleep(0.05)
+
+                return sum(self._apply(name) for name in self._segments((SEALED_SUFFIX,)))
+            finally:
+                f.close()
+
+    def flush(self):
+        """
+        Seal the active segment and fold everything sealed into SQLite.
+        """
+        with self._write_lock:
+            self._seal()
+        return self.compact_segments()
+
+    def _compact_loop(self):
+        while not self._stop.wait(COMPACT_INTERVAL):
+            try:
+                with self._write_lock:
+                    if self._file is not None and time.monotonic() - self._opened >= self.max_age:
+                        self._seal()
+                self.compact_segments(wait=False)
+            except Exception as e:
+                # Keep ingesting; segments stay on disk until a pass succeeds
+                print(f"[!] Segment compaction failed: {e}", file=sys.stderr)
+
+    # =====================================
+    # Reads
+    # =====================================
+    def _pending(self, **filters):
+        """
+        Evidence rows (as Storage returns them, id None) from segments not
+        yet in SQLite that match filters, oldest first. Segment files are
+        read incrementally: only bytes appended since the last call.
+        """
+        with self._tails_lock:
+            return self._read_pending(filters)
+
+    def _read_pending(self, filters):
+        rows = []
+        names = self._segments()
+        current = set()
+
+        for name in names:
+            key = name.rsplit(".", 1)[0]
+            current.add(key)
+            offset, cached = self._tails.get(key, (0, []))
+
+            try:
+                with open(os.path.join(self.directory, name), "rb") as f:
+                    f.seek(offset)
+                    data = f.read()
+            except FileNotFoundError:
+                continue
+
+            end = data.rfind(b"\n") + 1
+            for line in data[:end].splitlines():
+                if line.strip():
+                    cached.append(self._as_row(json.loads(line)))
+            self._tails[key] = (offset + end, cached)
+
+            rows.extend(r for r in cached if _matches(r, **filters))
+
+        for key in list(self._tails):
+            if key not in current:
+                del self._tails[key]
+
+        return rows
+
+    def _as_row(self, record):
+        score, level, flags, target_type = _risk_values(record["risk"], record["target"])
+        return {
+            "id": None,
+            "case_id": record["case_id"],
+            "plugin": record["plugin"],
+            "target": record["target"],
+            "result": json.dumps(record["result"]),
+            "risk": json.dumps(record["risk"]),
+            "created_at": record["created_at"],
+            "score": score,
+            "level": level,
+            "flags": flags,
+            "target_type": target_type,
+            "prev_id": record.get("prev_id"),
+            "refreshed_at": None,
+        }
+
+    @contextmanager
+    def _reading(self):
+        self._local.readers = getattr(self._local, "readers", 0) + 1
+        try:
+            with self._locked(fcntl.LOCK_SH):
+                yield
+        finally:
+            self._local.readers -= 1
+
+    def _merged(self, rows, limit, **filters):
+        yield from rows
+
+        # Pending rows have no id to resume a page after: pages hold
+        # stored rows only (see _paging)
+        if limit is None:
+            yield from self._pending(**filters)
+
+    def _paging(self, limit):
+        """
+        Fold pending segments in before a page (limit set) is read, so
+        every row it returns has an id for --after. If merged reads
+        elsewhere block that, the page leaves the pending rows out; they
+        follow once compacted.
+        """
+        if limit is None:
+            return
+        try:
+            self.flush()
+        except FlushError:
+            pass
+
+    def iter_evidence(self, case_id, after_id=None, limit=None, chunk_size=1000):
+        """
+        Storage.iter_evidence, followed by the case's pending rows.
+        """
+        self._paging(limit)
+        with self._reading():
+            rows = self.store.iter_evidence(case_id, after_id=after_id, limit=limit, chunk_size=chunk_size)
+            yield from self._merged(rows, limit, case_id=case_id)
+
+    def query_evidence(self, after_id=None, limit=None, chunk_size=1000, **filters):
+        """
+        Storage.query_evidence, followed by matching pending rows.
+        """
+        self._paging(limit)
+        with self._reading():
+            rows = self.store.query_evidence(after_id=after_id, limit=limit, chunk_size=chunk_size, **filters)
+            yield from self._merged(rows, limit, **filters)
+
+    select_signals = _flushed("select_signals")
+    set_risk_many = _flushed("set_risk_many")
+    case_summary = _flushed("case_summary")
+    query_cases = _flushed("query_cases")
+    iter_stale = _flushed("iter_stale")
+    mark_refreshed = _flushed("mark_refreshed")
+    lookup_entity = _flushed("lookup_entity")
+    related_cases = _flushed("related_cases")
+    reindex_entities = _flushed("reindex_entities")
+    compact = _flushed("compact")
+    import_evidence = _flushed("import_evidence")
+    export_lines = _flushed("export_lines")
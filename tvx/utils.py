@@ -0,0 +1,56 @@
+import ipaddress
+import re
+from datetime import datetime, timedelta
+
+PHONE_RE = re.compile(r"^\+?[\d\s().-]{7,20}$")
+DOMAIN_RE = re.compile(r"^(?=.{1,253}$)([a-z0-9-]{1,63}\.)+[a-z]{2,63}\.?$", re.IGNORECASE)
+
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+
+
+def classify_target(target):
+    """
+    "email", "ip", "phone", "domain" or "unknown" for a raw target string.
+    """
+    target = str(target).strip()
+
+    if "@" in target:
+        return "email"
+
+    try:
+        ipaddress.ip_address(target)
+        return "ip"
+    except ValueError:
+        pass
+
+    if PHONE_RE.match(target) and sum(c.isdigit() for c in target) >= 7:
+        return "phone"
+
+    if DOMAIN_RE.match(target):
+        return "domain"
+
+    return "unknown"
+
+
+def parse_duration(text):
+    """
+    Seconds in "90s", "30m", "24h", "7d" or "2w"; a bare number is seconds.
+    Raises ValueError otherwise.
+    """
+    text = str(text).strip().lower()
+    if text[-1:] in DURATION_UNITS:
+        return float(text[:-1]) * DURATION_UNITS[text[-1]]
+    return float(text)
+
+
+def parse_since(text, now=None):
+    """
+    UTC ISO timestamp (the format stored in created_at) for a relative age
+    like "24h" or an absolute ISO date/time, which is returned normalized.
+    """
+    try:
+        seconds = parse_duration(text)
+    except ValueError:
+        return datetime.fromisoformat(str(text).strip()).isoformat()
+
+    return ((now or datetime.utcnow()) - timedelta(seconds=seconds)).isoformat()